@@ -0,0 +1,265 @@
+"""
+Benchmark du pipeline de traitement Excel.
+
+Génère des classeurs réalistes (lignes d'en-tête avant le tableau, colonne
+Period au format personnalisé, dates, montants) puis chronomètre chaque étape
+du traitement dans le processus courant : temps écoulé et pic de mémoire (RSS).
+Les résultats sont écrits en JSON pour comparer deux exécutions.
+
+Exemples :
+    python benchmark.py --rows 1000 10000 100000
+    python benchmark.py --rows 1000000 --output bench_apres.json --compare bench_avant.json
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import openpyxl
+import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+
+from src.routes.excel import (
+    find_data_start_row, read_excel_smart, detect_date_columns, detect_numeric_columns,
+    apply_rules, format_excel_file
+)
+from src.services.workbook_session import WorkbookSession, READERS
+from src.services.type_inference import infer_schema
+
+DEFAULT_ROWS = [1000, 10000, 100000]
+
+# Intervalle d'échantillonnage de la mémoire (secondes)
+RSS_SAMPLE_INTERVAL = 0.01
+
+HEADERS = [
+    'Entity', 'Period', 'Transaction Date', 'Description', 'Bank account', 'Amount CCYs',
+    'Currency', 'Rate FX', 'Amount USD', 'Nature', 'Descrip', 'Vessel', 'Service', 'Reference'
+]
+
+PERIOD_FORMATS = ['mmm-yy', 'mm/yyyy']
+
+DESCRIPTIONS = [
+    'Payment to ADVICEPRO for consulting services AE{ref}',
+    'ADVICEPRO monthly fee AE{ref}',
+    'Office supplies OFFICE 123 PARIS',
+    'Regular payment for utilities',
+    'Bank transfer for equipment',
+    'Port fees MAERSK LINE FR{ref}',
+    'Bunker supply invoice {ref}',
+    'Crew wages transfer',
+]
+
+
+def generate_workbook(filepath, rows, seed=42):
+    """Crée un classeur de test de `rows` lignes (écriture en flux)"""
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Relevé')
+
+    # Lignes d'en-tête avant le tableau
+    ws.append(['SOCIÉTÉ EXEMPLE SAS'])
+    ws.append(['Relevé des opérations bancaires'])
+    ws.append([f"Extraction du {datetime.date(2024, 6, 30).strftime('%d/%m/%Y')}"])
+    ws.append([])
+    ws.append(HEADERS)
+
+    start = datetime.datetime(2024, 1, 1)
+    for i in range(rows):
+        transaction_date = start + datetime.timedelta(days=rng.randrange(365))
+        period = WriteOnlyCell(ws, value=transaction_date.replace(day=1))
+        period.number_format = PERIOD_FORMATS[i % len(PERIOD_FORMATS)]
+        date_cell = WriteOnlyCell(ws, value=transaction_date)
+        date_cell.number_format = 'dd/mm/yyyy'
+
+        amount = round(rng.uniform(-50000, 50000), 2)
+        currency = rng.choice(['EUR', 'USD', 'GBP'])
+        rate = {'EUR': 1.08, 'USD': 1.0, 'GBP': 1.27}[currency]
+        amount_cell = WriteOnlyCell(ws, value=amount)
+        amount_cell.number_format = '#,##0.00'
+
+        description = rng.choice(DESCRIPTIONS).format(ref=rng.randrange(10 ** 12, 10 ** 13))
+        ws.append([
+            f"E{rng.randrange(1, 6)}", period, date_cell, description,
+            f"{currency}-ACCOUNT-{rng.randrange(1, 20):03d}", amount_cell, currency,
+            rate, round(amount * rate, 2), None, None, None, None, None
+        ])
+
+    wb.save(filepath)
+
+
+class PeakRSS:
+    """Mesure le pic de mémoire résidente pendant un bloc (échantillonnage de /proc)"""
+
+    def __init__(self):
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    @staticmethod
+    def current():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            # Hors Linux : pic depuis le démarrage du processus (Ko sous Linux, octets sous macOS)
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == 'darwin' else peak * 1024
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(RSS_SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def run_pipeline(filepath, output_filepath):
+    """Exécute chaque étape du pipeline et retourne {étape: mesures}"""
+    stages = {}
+
+    @contextlib.contextmanager
+    def stage(name):
+        record = {}
+        with PeakRSS() as rss:
+            started = time.perf_counter()
+            yield record
+            record['seconds'] = round(time.perf_counter() - started, 4)
+        record['peak_rss_mb'] = round(rss.peak / 1024 / 1024, 1)
+        stages[name] = record
+
+    with stage('find_data_start_row') as record:
+        record['header_row'] = find_data_start_row(filepath)
+
+    with stage('read_excel_smart') as record:
+        session = WorkbookSession(filepath)
+        df = read_excel_smart(filepath, session=session)
+        record['rows'], record['columns'] = df.shape
+        record['reader'] = session.engine
+
+    with stage('infer_schema') as record:
+        # Schéma calculé une fois et gardé dans la session, comme describe_columns
+        session.schema = infer_schema(df, previous=session.schema)
+        record['columns'] = len(session.schema)
+
+    with stage('detection') as record:
+        record['date_columns'] = detect_date_columns(df, schema=session.schema)
+        record['numeric_columns'] = detect_numeric_columns(df, schema=session.schema)
+
+    with stage('apply_rules') as record:
+        df_processed = apply_rules(df.copy())
+        record['rows'] = len(df_processed)
+
+    with stage('format_excel_file') as record:
+        format_excel_file(df_processed, output_filepath, filepath, session=session)
+        record['bytes'] = os.path.getsize(output_filepath)
+
+    return stages
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'openpyxl': openpyxl.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(previous, current):
+    """Affiche le rapport des temps entre deux exécutions (< 1 : plus rapide)"""
+    previous_runs = {run['rows']: run for run in previous['runs']}
+    print("\n📈 Comparaison avec l'exécution précédente (temps actuel / temps précédent)")
+    for run in current['runs']:
+        before = previous_runs.get(run['rows'])
+        if not before:
+            continue
+        print(f"  {run['rows']} lignes :")
+        for name, record in run['stages'].items():
+            old = before['stages'].get(name)
+            if old and old['seconds']:
+                print(f"    {name:<22} {old['seconds']:>9.3f}s → {record['seconds']:>9.3f}s  "
+                      f"(x{record['seconds'] / old['seconds']:.2f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du pipeline de traitement Excel")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="Tailles des classeurs générés (nombre de lignes)")
+    parser.add_argument('--repeat', type=int, default=1, help="Nombre d'exécutions par taille (meilleur temps)")
+    parser.add_argument('--workdir', default='benchmark_data', help="Dossier des classeurs générés")
+    parser.add_argument('--output', default='benchmark_results.json', help="Fichier JSON de résultats")
+    parser.add_argument('--compare', help="Fichier JSON d'une exécution précédente")
+    parser.add_argument('--reader', choices=[name for name, _ in READERS],
+                        help="Moteur de lecture préféré (par défaut : le plus rapide disponible)")
+    parser.add_argument('--verbose', action='store_true', help="Afficher les messages du pipeline")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    if args.reader:
+        os.environ['EXCEL_READER'] = args.reader
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = {'environment': environment(), 'runs': []}
+
+    for rows in args.rows:
+        filepath = os.path.join(args.workdir, f'bench_{rows}.xlsx')
+        if not os.path.exists(filepath):
+            print(f"🛠️ Génération de {filepath}...")
+            started = time.perf_counter()
+            generate_workbook(filepath, rows)
+            print(f"   {time.perf_counter() - started:.1f}s")
+
+        best = None
+        for _ in range(args.repeat):
+            stages = run_pipeline(filepath, os.path.join(args.workdir, f'processed_bench_{rows}.xlsx'))
+            if best is None or sum(s['seconds'] for s in stages.values()) < sum(s['seconds'] for s in best.values()):
+                best = stages
+
+        run = {
+            'rows': rows,
+            'file_bytes': os.path.getsize(filepath),
+            'total_seconds': round(sum(record['seconds'] for record in best.values()), 4),
+            'stages': best,
+        }
+        results['runs'].append(run)
+
+        print(f"📊 {rows} lignes : {run['total_seconds']:.3f}s")
+        for name, record in best.items():
+            print(f"    {name:<22} {record['seconds']:>9.3f}s  {record['peak_rss_mb']:>8.1f} Mo")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"✅ Résultats enregistrés dans {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
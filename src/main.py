@@ -1,5 +1,6 @@
 import os
 import sys
+import logging
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
@@ -8,6 +9,12 @@ from src.models.user import db
 from src.routes.user import user_bp
 from src.routes.excel import excel_bp
 
+# Niveau des messages de traitement (DEBUG pour le détail de chaque étape)
+logging.basicConfig(
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
@@ -19,8 +26,19 @@ app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(excel_bp, url_prefix='/api/excel')
 
 # uncomment if you need to use database
+os.makedirs(os.path.join(os.path.dirname(__file__), 'database'), exist_ok=True)
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Taille maximale d'un fichier uploadé (10 Mo par défaut) : réponse 413 au-delà
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+# Taille maximale d'une requête de traitement par lot (500 Mo par défaut)
+app.config['MAX_BATCH_BYTES'] = int(os.environ.get('MAX_BATCH_BYTES', 500 * 1024 * 1024))
+# Taille décompressée maximale de chaque feuille consolidée (50 Mo de XML par défaut, soit
+# environ 100 000 lignes) : la mémoire d'une consolidation est celle de la plus grande
+# feuille, traitée en entier ; la taille du fichier reçu (compressé) n'en dit rien
+app.config['MAX_CONSOLIDATION_SHEET_BYTES'] = int(os.environ.get('MAX_CONSOLIDATION_SHEET_BYTES', 50 * 1024 * 1024))
+# Nombre de processus pour le traitement des uploads (par défaut : un par cœur)
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 1))
 db.init_app(app)
 with app.app_context():
     db.create_all()
@@ -0,0 +1,52 @@
+import json
+import datetime
+from src.models.user import db
+
+# Étapes du pipeline de traitement, dans l'ordre
+JOB_STAGES = ['parse', 'infer', 'rules', 'format', 'save']
+
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    # Feuille traitée (None : feuille active, 'all' : toutes les feuilles)
+    sheet = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    stage = db.Column(db.String(20), nullable=True)
+    rows = db.Column(db.Integer, nullable=True)
+    progress = db.Column(db.Text, nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.status}>'
+
+    def progress_dict(self):
+        stages = json.loads(self.progress) if self.progress else {}
+        done = sum(1 for name in JOB_STAGES if stages.get(name, {}).get('status') == 'done')
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'rows': self.rows,
+            'percent': 100 if self.status == 'done' else int(100 * done / len(JOB_STAGES)),
+            'stages': [
+                {'name': name, **stages.get(name, {'status': 'pending'})}
+                for name in JOB_STAGES
+            ]
+        }
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'sheet': self.sheet,
+            'status': self.status,
+            'stage': self.stage,
+            'rows': self.rows,
+            'error': self.error,
+            'result': json.loads(self.result) if self.result else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
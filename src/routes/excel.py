@@ -1,231 +1,175 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app, Response, stream_with_context
 import pandas as pd
 import os
+import shutil
+import logging
 import tempfile
 from werkzeug.utils import secure_filename
-import re
+from werkzeug.exceptions import RequestEntityTooLarge
 import json
-import numpy as np
-from openpyxl import load_workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.worksheet.table import Table, TableStyleInfo
-import datetime
-from openpyxl.utils import get_column_letter
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from src.services.workbook_session import WorkbookSession, find_header, list_sheets, read_preview, PREVIEW_ROWS
+from src.services.xlsx_writer import (
+    write_formatted_workbook, write_formatted_sheets, write_consolidated_workbook, text_lengths, merge_preserved,
+    FORMAT_VERSION
+)
+from src.services.styles import HEADER, DATE, NUMERIC, BORDERED, named_style_definition
+from src.services.jobs import StageTracker, new_job_id, submit_job, json_default, inner_workers
+from src.services.json_records import to_records, iter_json, JSON_CONTENT_TYPE, NDJSON_CONTENT_TYPE
+from src.services.result_cache import ResultCache, file_sha256, cache_key
+from src.services.artifacts import ArtifactIndex
+from src.services import exports, xlsx_reader
+from src.services.xlsx_reader import UnsupportedWorkbook, SheetNotFound
+from src.services.rules import load_rules, apply_rule_set, apply_extractions
+from src.services import metrics, rule_state
+from src.services.uploads import UploadStore, UploadTooLarge
+from src.models.job import Job
+from src.models.user import db
+from src.services.type_inference import infer_schema, columns_of_type, DATE as DATE_TYPE, NUMERIC as NUMERIC_TYPE
 
 excel_bp = Blueprint('excel', __name__)
 
+logger = logging.getLogger(__name__)
+
 # Utiliser des chemins absolus pour éviter les problèmes
 UPLOAD_FOLDER = os.path.abspath('uploads')
 PROCESSED_FOLDER = os.path.abspath('processed')
 
+RESULT_CACHE_FOLDER = os.path.abspath('cache')
+
 # Créer les dossiers s'ils n'existent pas
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
+# Fichiers reçus : un dossier par job, supprimé après 24 h par défaut
+upload_store = UploadStore(
+    UPLOAD_FOLDER,
+    retention_seconds=int(os.environ.get('UPLOAD_RETENTION_SECONDS', 24 * 3600))
+)
+
+# Cache des résultats, adressé par le contenu des fichiers uploadés (500 Mo par défaut)
+result_cache = ResultCache(
+    RESULT_CACHE_FOLDER,
+    max_bytes=int(os.environ.get('RESULT_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+)
+
+# Index des fichiers traités : empreinte du contenu (ETag) calculée une fois par fichier
+artifact_index = ArtifactIndex(PROCESSED_FOLDER)
+
+# Durée de cache des téléchargements adressés par contenu (1 an par défaut)
+DOWNLOAD_MAX_AGE = int(os.environ.get('DOWNLOAD_MAX_AGE', 365 * 24 * 3600))
+
+# Nombre maximal de classeurs par lot
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', 500))
+
+# Nombre de lignes d'exemple renvoyées avec la description des colonnes
+SAMPLE_ROWS = int(os.environ.get('SAMPLE_ROWS', 3))
+
+# Nombre maximal de lignes renvoyées par /columns (rows) et /rows (limit)
+MAX_ROWS_LIMIT = int(os.environ.get('MAX_ROWS_LIMIT', 10000))
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'xlsx', 'xls'}
 
+def is_archive(filename):
+    return filename.lower().endswith('.zip')
+
+def output_options(sheet=None, default=exports.XLSX):
+    """
+    Format de sortie demandé (champ ou paramètre format) et compression gzip
+    (gzip=1) ; ValueError si le format est indisponible ou incompatible
+    """
+    output = (request.form.get('format') or request.args.get('format') or default).lower()
+    compress = (request.form.get('gzip') or request.args.get('gzip') or '0').lower() in ('1', 'true', 'yes')
+    exports.check_format(output, compress)
+    if sheet == ALL_SHEETS and output != exports.XLSX:
+        raise ValueError("Plusieurs feuilles : format xlsx seulement")
+    return output, compress
+
+def check_sheet(filepath, sheet):
+    """Vérifie que la feuille demandée existe dans le classeur reçu ; ValueError sinon"""
+    if sheet is None or sheet == ALL_SHEETS:
+        return
+    try:
+        sheet_names = list_sheets(filepath)
+    except Exception as e:
+        # Classeur illisible : l'erreur sera rapportée par le job
+        logger.warning("⚠️ Feuilles de %s non lues: %s", os.path.basename(filepath), e)
+        return
+    if sheet not in sheet_names:
+        raise ValueError(f"Feuille introuvable: {sheet} ({', '.join(sheet_names)})")
+
 def find_data_start_row(filepath):
     """Trouve la ligne où commencent vraiment les données"""
-    # Lire les premières lignes pour détecter où commencent les données
+    # Lecture en flux des premières lignes, arrêtée dès la ligne d'en-têtes trouvée
     try:
-        # Lire les 20 premières lignes sans en-têtes
-        preview_df = pd.read_excel(filepath, header=None, nrows=20)
-        
-        for idx, row in preview_df.iterrows():
-            # Chercher une ligne qui contient des en-têtes typiques
-            row_str = ' '.join([str(val) for val in row if pd.notna(val)]).lower()
-            
-            # Mots-clés indiquant des en-têtes de données
-            header_keywords = ['entity', 'date', 'transaction', 'period', 'amount', 'account', 'description', 'bank']
-            
-            if any(keyword in row_str for keyword in header_keywords):
-                print(f"✅ Données détectées à partir de la ligne {idx + 1}")
-                return idx
-        
-        # Si aucune ligne d'en-tête détectée, chercher la première ligne avec plusieurs valeurs non-nulles
-        for idx, row in preview_df.iterrows():
-            non_null_count = sum(1 for val in row if pd.notna(val) and str(val).strip() != '')
-            if non_null_count >= 3:  # Au moins 3 colonnes avec des données
-                print(f"✅ Données détectées à partir de la ligne {idx + 1} (par nombre de colonnes)")
-                return idx
-        
-        print("⚠️ Impossible de détecter le début des données, utilisation de la ligne 1")
-        return 0
+        return find_header(filepath).header_row
         
     except Exception as e:
-        print(f"⚠️ Erreur lors de la détection du début des données: {e}")
+        logger.warning("⚠️ Erreur lors de la détection du début des données: %s", e)
         return 0
 
-def read_excel_smart(filepath):
+def read_excel_smart(filepath, session=None):
     """Lit le fichier Excel en détectant automatiquement où commencent les données"""
-    start_row = find_data_start_row(filepath)
-    
-    # Lire le fichier en spécifiant la ligne de départ
-    df = pd.read_excel(filepath, header=start_row)
-    
-    # Nettoyer les noms de colonnes (enlever les espaces, caractères bizarres)
-    df.columns = [str(col).strip() if pd.notna(col) else f'Unnamed_{i}' for i, col in enumerate(df.columns)]
-    
-    # Supprimer les lignes complètement vides
-    df = df.dropna(how='all')
+    # Une session déjà ouverte évite de relire le classeur ; sinon la copie en
+    # colonnes du fichier est lue si elle existe (et créée dans le cas contraire)
+    if session is None:
+        session = WorkbookSession(filepath, cache=True)
     
-    print(f"📊 Fichier lu avec succès: {df.shape[0]} lignes, {df.shape[1]} colonnes")
-    print(f"📋 Colonnes détectées: {list(df.columns)}")
-    
-    return df
-
-def clean_data_for_json(data):
-    """Nettoie les données pour éviter les erreurs JSON avec NaN"""
-    if isinstance(data, list):
-        return [clean_data_for_json(item) for item in data]
-    elif isinstance(data, dict):
-        return {key: clean_data_for_json(value) for key, value in data.items()}
-    elif pd.isna(data) or data is np.nan:
-        return None
-    elif isinstance(data, (np.integer, np.floating)):
-        return data.item()
-    else:
-        return data
+    return session.df
 
-def detect_date_columns(df):
+def detect_date_columns(df, schema=None):
     """Détecte automatiquement les colonnes qui contiennent des dates"""
-    date_columns = []
-    
-    # Colonnes spécifiques connues pour être des dates (SAUF Period qui a un format spécial)
-    known_date_columns = ['Transaction Date', 'Date', 'date', 'transaction_date']
-    
-    for col in df.columns:
-        # Exclure explicitement la colonne Period du formatage automatique
-        if 'period' in col.lower():
-            print(f"⚠️ Colonne '{col}' exclue du formatage date (format personnalisé)")
-            continue
-            
-        # Vérifier d'abord si c'est une colonne connue pour être une date
-        if any(known_col.lower() in col.lower() for known_col in known_date_columns):
-            date_columns.append(col)
-            print(f"✅ Colonne de date identifiée par nom: '{col}'")
-            continue
-            
-        # Vérifier le type pandas
-        if df[col].dtype == 'datetime64[ns]':
-            date_columns.append(col)
-            continue
-            
-        # Pour les colonnes object, essayer de détecter automatiquement
-        elif df[col].dtype == 'object':
-            sample_values = df[col].dropna().head(10)
-            date_count = 0
-            
-            for value in sample_values:
-                if isinstance(value, str):
-                    # Patterns de dates courants
-                    date_patterns = [
-                        r'\d{4}-\d{2}-\d{2}',  # 2024-01-15
-                        r'\d{2}/\d{2}/\d{4}',  # 15/01/2024
-                        r'\d{2}-\d{2}-\d{4}',  # 15-01-2024
-                        r'\d{1,2}/\d{1,2}/\d{4}',  # 5/1/2024
-                        r'\d{1,2}-\d{1,2}-\d{4}',  # 5-1-2024
-                    ]
-                    
-                    for pattern in date_patterns:
-                        if re.match(pattern, str(value).strip()):
-                            date_count += 1
-                            break
-                    
-                    # Essayer de parser avec pandas
-                    try:
-                        pd.to_datetime(value)
-                        date_count += 1
-                    except:
-                        pass
-            
-            # Si plus de 70% des valeurs semblent être des dates
-            if len(sample_values) > 0 and date_count / len(sample_values) > 0.7:
-                date_columns.append(col)
-    
-    return date_columns
+    if schema is None:
+        schema = infer_schema(df)
+    return columns_of_type(schema, DATE_TYPE)
 
-def detect_numeric_columns(df):
+def detect_numeric_columns(df, schema=None):
     """Détecte les colonnes numériques"""
-    numeric_columns = []
-    
-    # Colonnes spécifiques connues pour être numériques
-    known_numeric_columns = ['Amount CCYs', 'Rate FX', 'Amount USD', 'amount', 'rate', 'price', 'quantity']
-    
-    for col in df.columns:
-        # Vérifier d'abord si c'est une colonne connue pour être numérique
-        if any(known_col.lower() in col.lower() for known_col in known_numeric_columns):
-            numeric_columns.append(col)
-            print(f"✅ Colonne numérique identifiée par nom: '{col}'")
-            continue
-            
-        # Vérifier le type pandas
-        if df[col].dtype in ['int64', 'float64', 'int32', 'float32']:
-            numeric_columns.append(col)
-    
-    return numeric_columns
+    if schema is None:
+        schema = infer_schema(df)
+    return columns_of_type(schema, NUMERIC_TYPE)
 
-def preserve_original_formatting(original_filepath, df, ws, data_start_row):
-    """Préserve le formatage original des cellules spéciales comme Period"""
+def preserve_original_formatting(session, df):
+    """Relève le formatage original des cellules spéciales comme Period"""
+    preserved = {}
     try:
-        # Ouvrir le fichier original avec openpyxl pour récupérer les formats
-        original_wb = load_workbook(original_filepath)
-        original_ws = original_wb.active
-        
-        # Trouver la ligne des en-têtes dans le fichier original
-        original_start_row = find_data_start_row(original_filepath)
-        original_header_row = original_start_row + 1  # +1 car find_data_start_row retourne l'index
-        
-        # Créer un mapping des colonnes
-        original_headers = []
-        for col_idx in range(1, original_ws.max_column + 1):
-            header_cell = original_ws.cell(row=original_header_row, column=col_idx)
-            if header_cell.value:
-                original_headers.append(str(header_cell.value).strip())
-        
-        # Pour chaque colonne dans le dataframe
-        for df_col_idx, col_name in enumerate(df.columns):
-            if col_name in original_headers:
-                orig_col_idx = original_headers.index(col_name) + 1  # +1 car Excel commence à 1
-                
-                # Récupérer le format de la première cellule de données dans l'original
-                sample_cell = original_ws.cell(row=original_header_row + 1, column=orig_col_idx)
-                original_format = sample_cell.number_format
+        # Les formats et valeurs d'origine ont été relevés lors de l'analyse du classeur
+        for col_name in df.columns:
+            if col_name in session.column_formats:
+                original_format = session.column_formats[col_name]
                 
                 # Si c'est la colonne Period ou une colonne avec un format personnalisé
                 if 'period' in col_name.lower() or original_format not in ['General', '@']:
-                    print(f"📋 Conservation du format original pour '{col_name}': {original_format}")
+                    logger.debug("📋 Conservation du format original pour '%s': %s", col_name, original_format)
                     
-                    # Appliquer le format original à toute la colonne dans le nouveau fichier
-                    for row_idx in range(len(df)):
-                        new_cell = ws.cell(row=data_start_row + 1 + row_idx, column=df_col_idx + 1)
-                        new_cell.number_format = original_format
-                        
-                        # Pour Period, récupérer la valeur formatée originale
-                        if 'period' in col_name.lower():
-                            orig_data_cell = original_ws.cell(row=original_header_row + 1 + row_idx, column=orig_col_idx)
-                            if orig_data_cell.value:
-                                # Utiliser la valeur telle qu'elle apparaît dans Excel
-                                new_cell.value = orig_data_cell.value
-        
-        original_wb.close()
-        print("✅ Formatage original préservé")
+                    # Pour Period, la valeur originale remplacera la valeur lue par pandas
+                    preserved[col_name] = (original_format, session.raw_columns.get(col_name))
+        
+        logger.debug("✅ Formatage original préservé")
         
     except Exception as e:
-        print(f"⚠️ Impossible de préserver le formatage original: {e}")
-
-def format_excel_file(df, filepath, original_filepath=None):
-    """Formate le fichier Excel avec des filtres, formatage des dates et mise en forme"""
-    
-    # Détecter les colonnes de dates et numériques
-    date_columns = detect_date_columns(df)
-    numeric_columns = detect_numeric_columns(df)
-    
-    print(f"Colonnes de dates détectées: {date_columns}")
-    print(f"Colonnes numériques détectées: {numeric_columns}")
+        logger.warning("⚠️ Impossible de préserver le formatage original: %s", e)
     
+    return preserved
+
+def prepare_formatting(df, session=None):
+    """
+    Prépare l'écriture d'un DataFrame : détection et conversion des colonnes de
+    dates et numériques, lignes d'en-tête et formats d'origine à conserver.
+    Retourne les paramètres de write_formatted_workbook.
+    """
+    # Détecter les colonnes de dates et numériques (seules les colonnes nouvelles
+    # ou modifiées depuis l'upload sont réexaminées)
+    schema = infer_schema(df, previous=session.schema if session is not None else None)
+    date_columns = detect_date_columns(df, schema)
+    numeric_columns = detect_numeric_columns(df, schema)
+
+    logger.debug("Colonnes de dates détectées: %s", date_columns)
+    logger.debug("Colonnes numériques détectées: %s", numeric_columns)
+
     # Convertir les colonnes de dates (SAUF Period)
     for col in date_columns:
         if 'period' not in col.lower():  # Exclure Period de la conversion
@@ -233,190 +177,615 @@ def format_excel_file(df, filepath, original_filepath=None):
                 df[col] = pd.to_datetime(df[col], errors='coerce')
             except:
                 pass
-    
+
     # Convertir les colonnes numériques
     for col in numeric_columns:
         try:
             df[col] = pd.to_numeric(df[col], errors='coerce')
         except:
             pass
-    
+
     # Détecter la ligne de départ dans le fichier original
-    start_row = 0
-    if original_filepath:
-        start_row = find_data_start_row(original_filepath)
-        print(f"📍 Données originales commencent à la ligne {start_row + 1}")
-    
-    # Créer un nouveau workbook
-    from openpyxl import Workbook
-    wb = Workbook()
-    ws = wb.active
-    
-    # Si on a un fichier original, copier les lignes d'en-tête
-    if original_filepath and start_row > 0:
-        try:
-            # Lire le fichier original pour récupérer les lignes d'en-tête
-            original_df = pd.read_excel(original_filepath, header=None, nrows=start_row)
-            
-            # Copier les lignes d'en-tête (lignes 1 à start_row)
-            for row_idx in range(start_row):
-                for col_idx in range(len(original_df.columns)):
-                    try:
-                        value = original_df.iloc[row_idx, col_idx]
-                        if pd.notna(value):
-                            ws.cell(row=row_idx + 1, column=col_idx + 1, value=value)
-                    except:
-                        pass
-            
-            print(f"✅ Lignes d'en-tête copiées (lignes 1 à {start_row})")
-        except Exception as e:
-            print(f"⚠️ Impossible de copier les lignes d'en-tête: {e}")
-    
-    # Calculer la ligne où commencer à écrire les données
-    data_start_row = start_row + 1  # +1 pour les en-têtes de colonnes
-    
-    # Écrire les en-têtes de colonnes
-    for col_idx, col_name in enumerate(df.columns):
-        cell = ws.cell(row=data_start_row, column=col_idx + 1, value=col_name)
-        # Formater les en-têtes
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Écrire les données
-    for row_idx, (_, row) in enumerate(df.iterrows()):
-        for col_idx, value in enumerate(row):
-            cell = ws.cell(row=data_start_row + 1 + row_idx, column=col_idx + 1, value=value)
-            
-            # Appliquer les formats spécifiques
-            col_name = df.columns[col_idx]
-            
-            # Format de date (SAUF Period)
-            if col_name in date_columns and 'period' not in col_name.lower() and pd.notna(value):
-                cell.number_format = 'DD/MM/YYYY'
-            
-            # Format numérique
-            elif col_name in numeric_columns and pd.notna(value):
-                cell.number_format = '#,##0.00'
-    
-    # Préserver le formatage original pour les colonnes spéciales
-    if original_filepath:
-        preserve_original_formatting(original_filepath, df, ws, data_start_row)
-    
-    # Calculer les plages pour les filtres et le tableau
-    max_col_letter = get_column_letter(len(df.columns))
-    max_row = data_start_row + len(df)
-    
-    # 1. Ajouter les filtres automatiques (seulement sur les données)
-    if len(df) > 0:
-        filter_range = f"A{data_start_row}:{max_col_letter}{max_row}"
-        ws.auto_filter.ref = filter_range
-        print(f"✅ Filtres automatiques ajoutés sur la plage: {filter_range}")
-    
-    # 2. Créer un tableau Excel formaté (seulement sur les données)
-    if len(df) > 0:
-        try:
-            table_range = f"A{data_start_row}:{max_col_letter}{max_row}"
-            table = Table(displayName="TableauDonnees", ref=table_range)
-            
-            # Style du tableau
-            style = TableStyleInfo(
-                name="TableStyleMedium9",  # Style bleu moderne
-                showFirstColumn=False,
-                showLastColumn=False,
-                showRowStripes=True,
-                showColumnStripes=False
-            )
-            table.tableStyleInfo = style
-            ws.add_table(table)
-            print(f"✅ Tableau formaté ajouté sur la plage: {table_range}")
-        except Exception as e:
-            print(f"⚠️ Impossible d'ajouter le tableau formaté: {e}")
-    
-    # 3. Ajuster la largeur des colonnes
-    for col_idx in range(1, len(df.columns) + 1):
-        max_length = 0
-        column_letter = get_column_letter(col_idx)
-        
-        # Vérifier toutes les cellules de la colonne (en-têtes inclus)
-        for row_idx in range(1, max_row + 1):
-            cell = ws.cell(row=row_idx, column=col_idx)
-            if cell.value:
-                cell_length = len(str(cell.value))
-                if cell_length > max_length:
-                    max_length = cell_length
-        
-        adjusted_width = min(max_length + 3, 50)  # Max 50 caractères
-        if adjusted_width < 10:  # Minimum 10 caractères
-            adjusted_width = 12
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # 4. Figer la ligne d'en-têtes de données
-    # ws.freeze_panes = f"A{data_start_row + 1}"
-    print(f"✅ Ligne d'en-têtes figée à la ligne {data_start_row}")
-    
-    # 5. Ajouter des bordures à toutes les données
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+    preamble_rows = []
+    preserved = {}
+    if session is not None:
+        preamble_rows = session.preamble_rows
+        logger.debug("📍 Données originales commencent à la ligne %d", session.header_row + 1)
+
+        # Préserver le formatage original pour les colonnes spéciales
+        preserved = preserve_original_formatting(session, df)
+
+    # Styles appliqués aux valeurs non vides (dates SAUF Period, puis numériques)
+    column_styles = {}
+    for col_name in df.columns:
+        if col_name in date_columns and 'period' not in col_name.lower():
+            column_styles[col_name] = DATE
+        elif col_name in numeric_columns:
+            column_styles[col_name] = NUMERIC
+
+    return {'preamble_rows': preamble_rows, 'column_styles': column_styles, 'preserved': preserved}
+
+def format_excel_file(df, filepath, original_filepath=None, session=None, progress=None):
+    """Formate le fichier Excel avec des filtres, formatage des dates et mise en forme"""
+    
+    # Analyser le fichier original une seule fois si aucune session n'est fournie
+    if session is None and original_filepath:
+        session = WorkbookSession(original_filepath, cache=True)
+    
+    tracker = progress or StageTracker()
+    
+    with tracker.stage('format') as stage:
+        layout = prepare_formatting(df, session)
+        stage['rows'], stage['columns'] = df.shape
     
-    # Bordures pour les données seulement
-    for row_idx in range(data_start_row, max_row + 1):
-        for col_idx in range(1, len(df.columns) + 1):
-            cell = ws.cell(row=row_idx, column=col_idx)
-            cell.border = thin_border
+    with tracker.stage('save') as stage:
+        # Écrire le classeur en flux : lignes d'en-tête, en-têtes, données, filtres,
+        # tableau, largeurs et bordures
+        data_start_row, max_row = write_formatted_workbook(df, filepath, **layout)
+        stage['rows'], stage['columns'] = df.shape
+        stage['bytes_out'] = os.path.getsize(filepath)
     
-    # Sauvegarder le fichier formaté
-    wb.save(filepath)
-    print(f"✅ Fichier Excel formaté sauvegardé: {filepath}")
-    print(f"📊 Structure: Lignes d'en-tête (1-{start_row}), En-têtes colonnes (ligne {data_start_row}), Données (lignes {data_start_row + 1}-{max_row})")
+    start_row = len(layout['preamble_rows'])
+    if start_row > 0:
+        logger.debug("✅ Lignes d'en-tête copiées (lignes 1 à %d)", start_row)
+    logger.info("✅ Fichier Excel formaté sauvegardé: %s", filepath)
+    logger.debug("📊 Structure: Lignes d'en-tête (1-%d), En-têtes colonnes (ligne %d), Données (lignes %d-%d)",
+                 start_row, data_start_row, data_start_row + 1, max_row)
 
-def apply_rules(df):
+# Version du moteur de règles : à incrémenter dès que leur application change
+# (le contenu du fichier de règles est pris en compte via load_rules().version)
+RULES_VERSION = 2
+
+# Valeur du paramètre sheet pour traiter toutes les feuilles du classeur
+ALL_SHEETS = 'all'
+
+# Traitement incrémental des règles (état enregistré à côté de chaque upload)
+INCREMENTAL_RULES = os.environ.get('INCREMENTAL_RULES', '1') != '0'
+
+def apply_rules(df, rule_set=None, hits=None, state_path=None):
     """
-    Applique les règles de remplissage des colonnes selon l'exemple fourni
+    Applique les règles de remplissage des colonnes définies dans le fichier
+    de règles (src/rules/default_rules.json, ou RULES_FILE).
+    Si hits est fourni, il reçoit le nombre de lignes touchées par règle et par motif d'extraction.
+    Avec state_path, le traitement est incrémental : seules les règles modifiées
+    et les lignes nouvelles ou modifiées depuis le traitement précédent sont évaluées.
     """
-    print("🔧 Application des règles de traitement...")
+    logger.debug("🔧 Application des règles de traitement...")
+    
+    rule_set = rule_set or load_rules()
+    if state_path is not None:
+        rule_hits, extraction_hits, state, stats = rule_state.apply_incremental(
+            rule_set, df, rule_state.load(state_path)
+        )
+        rule_state.save(state_path, state)
+        logger.info("♻️ Règles incrémentales : %d nouvelle(s) ligne(s) sur %d, évaluations %s",
+                    stats['new_rows'], stats['rows'], stats['rules_evaluated'] or 'aucune')
+        if hits is not None:
+            hits.update(rules=rule_hits, extractions=extraction_hits, incremental=stats)
+        return df
     
-    # RÈGLES DÉSACTIVÉES TEMPORAIREMENT
-    # Les colonnes Nature et Reference restent vides pour l'instant
+    rule_hits = apply_rule_set(rule_set, df)
+
+    # Extraction de références (ex. AE1602600010153 dans Description)
+    extraction_hits = apply_extractions(rule_set, df)
+
+    if hits is not None:
+        hits.update(rules=rule_hits, extractions=extraction_hits)
+    
+    return df
+
+def describe_columns(df, session):
+    """Informations sur les colonnes renvoyées au client (le schéma est gardé dans la session)"""
+    # Exemple de lignes : seules les lignes renvoyées sont converties pour JSON
+    sample_data = to_records(df.head(SAMPLE_ROWS))
     
-    # Règle 1 : Si "ADVICEPRO" est dans 'Description', remplir les colonnes
-    if 'Description' in df.columns:
-        mask_advicepro = df['Description'].str.contains("ADVICEPRO", case=False, na=False)
+    # Détecter les colonnes de dates et numériques pour l'info (schéma réutilisé au
+    # formatage ; celui de la copie en colonnes est repris s'il existe)
+    session.schema = infer_schema(df, previous=session.schema)
+    date_columns = detect_date_columns(df, session.schema)
+    numeric_columns = detect_numeric_columns(df, session.schema)
+    
+    return {
+        'columns': list(df.columns),
+        'shape': df.shape,
+        'empty_columns': [col for col in df.columns if df[col].isna().all()],
+        'date_columns': date_columns,
+        'numeric_columns': numeric_columns,
+        'column_types': {
+            col: {'type': column['type'], 'confidence': column['confidence']}
+            for col, column in session.schema.items()
+        },
+        'sample_data': sample_data,
+        # Moteur de lecture du classeur (xml, openpyxl, pandas ou columnar pour la copie en colonnes)
+        'reader': session.engine
+    }
+
+def process_sheet(filepath, sheet_name=None, progress=None, formatted=True):
+    """
+    Lecture, détection des types, règles et préparation du formatage d'une
+    feuille. Retourne le DataFrame traité, les paramètres d'écriture et les
+    informations renvoyées au client.
+    formatted=False : données seules (export csv, parquet, ndjson), sans préparation du formatage.
+    """
+    tracker = progress or StageTracker()
+    
+    with tracker.stage('parse') as stage:
+        # Analyser le classeur une seule fois pour toutes les étapes (copie en
+        # colonnes relue lors d'un retraitement)
+        session = WorkbookSession(filepath, sheet_name=sheet_name, cache=True)
         
-        # Créer les colonnes si elles n'existent pas (mais les laisser vides)
-        for col in ['Nature', 'Descrip', 'Vessel', 'Service', 'Reference']:
-            if col not in df.columns:
-                df[col] = ''
+        # Lire le fichier Excel intelligemment
+        df = read_excel_smart(filepath, session=session)
+        stage['rows'], stage['columns'] = df.shape
+        stage['bytes_in'] = os.path.getsize(filepath)
+    
+    with tracker.stage('infer') as stage:
+        columns_info = describe_columns(df, session)
+        session.store()
+        stage['rows'], stage['columns'] = df.shape
+    
+    with tracker.stage('rules') as stage:
+        # Appliquer les règles de traitement
+        rule_hits = {}
+        # État des règles gardé à côté du fichier : un retraitement ne réévalue que ce qui a changé
+        state_path = rule_state.state_path(filepath, sheet_name) if INCREMENTAL_RULES else None
+        # Règles appliquées en place : la feuille lue n'est plus utilisée (copie en colonnes déjà enregistrée)
+        df_processed = apply_rules(df, hits=rule_hits, state_path=state_path)
+        stage['rows'], stage['columns'] = df_processed.shape
+    
+    layout = None
+    if formatted:
+        with tracker.stage('format') as stage:
+            layout = prepare_formatting(df_processed, session)
+            stage['rows'], stage['columns'] = df_processed.shape
+    
+    return {
+        'name': sheet_name,
+        'df': df_processed,
+        'layout': layout,
+        'columns_info': columns_info,
+        'rule_hits': rule_hits,
+        'timings': tracker.timings()
+    }
+
+def _process_sheet_worker(filepath, sheet_name):
+    # Point d'entrée des workers de feuilles (fonction de module, sérialisable)
+    return process_sheet(filepath, sheet_name)
+
+def process_sheets(filepath, sheet_names, progress=None, max_workers=None):
+    """
+    Traite plusieurs feuilles en parallèle sur un pool de processus (une feuille
+    par worker) : la durée totale tend vers celle de la plus grande feuille.
+    L'étape 'parse' couvre tout le traitement parallèle ; les étapes infer,
+    rules et format reprennent la durée de la feuille la plus lente.
+    Dans un job, le pool est borné par la part de cœurs du job (inner_workers).
+    """
+    tracker = progress or StageTracker()
+    max_workers = inner_workers(len(sheet_names), max_workers or int(os.environ.get('SHEET_WORKERS', 0)) or None)
+    
+    with tracker.stage('parse') as stage:
+        if max_workers < 2:
+            sheets = [process_sheet(filepath, name) for name in sheet_names]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                sheets = list(executor.map(_process_sheet_worker, [filepath] * len(sheet_names), sheet_names))
+        stage['rows'] = sum(len(sheet['df']) for sheet in sheets)
+        stage['columns'] = max(len(sheet['df'].columns) for sheet in sheets)
+        stage['bytes_in'] = os.path.getsize(filepath)
+    
+    for name in ('infer', 'rules', 'format'):
+        records = [sheet['timings'][name] for sheet in sheets]
+        tracker.record(name, {
+            'seconds': max(record['seconds'] for record in records),
+            'rows': sum(record.get('rows') or 0 for record in records),
+            'columns': max(record.get('columns') or 0 for record in records)
+        })
+    
+    return sheets
+
+def process_upload(filepath, filename, result_key=None, sheet=None, output=exports.XLSX, compress=False, progress=None,
+                   output_folder=None):
+    """
+    Traite un fichier uploadé : lecture, détection des types, règles, formatage
+    et sauvegarde. Retourne les informations renvoyées au client.
+    sheet : nom d'une feuille, 'all' pour toutes les feuilles, None pour la feuille active.
+    output : format du fichier traité (xlsx, ou csv, parquet, ndjson écrits sans
+    mise en forme, compressés en gzip si compress pour csv et ndjson).
+    output_folder : dossier du fichier traité (PROCESSED_FOLDER par défaut, seul
+    dossier dont les fichiers sont indexés et téléchargeables).
+    Si result_key est fourni, le résultat est ajouté au cache des résultats.
+    """
+    tracker = progress or StageTracker()
+    formatted = output == exports.XLSX
+    
+    if sheet == ALL_SHEETS:
+        sheets = process_sheets(filepath, list_sheets(filepath), progress=tracker)
+        # Les feuilles vides ne sont pas recopiées
+        sheets = [item for item in sheets if item['columns_info']['columns']] or sheets[:1]
+    else:
+        sheets = [process_sheet(filepath, sheet, progress=tracker, formatted=formatted)]
+    
+    # Sauvegarder et formater le fichier traité
+    processed_filename = exports.export_filename(f"processed_{filename}", output, compress)
+    output_folder = output_folder or PROCESSED_FOLDER
+    processed_filepath = os.path.join(output_folder, processed_filename)
+    
+    # Écriture dans un fichier temporaire : deux jobs du même nom ne s'écrasent pas en cours d'écriture
+    partial_filepath = os.path.join(output_folder, f".{new_job_id()}-{processed_filename}")
+    with tracker.stage('save') as stage:
+        if formatted:
+            # Une feuille et un tableau par feuille traitée, styles partagés
+            write_formatted_sheets(partial_filepath, [
+                dict(item['layout'], df=item['df'], title=item['name'],
+                     table_name="TableauDonnees" if i == 0 else f"TableauDonnees{i + 1}")
+                for i, item in enumerate(sheets)
+            ])
+        else:
+            # Données seules, écrites depuis le DataFrame traité (sans openpyxl)
+            exports.write_export(sheets[0]['df'], partial_filepath, output, compress)
+        stage['rows'] = sum(len(item['df']) for item in sheets)
+        stage['columns'] = max(len(item['df'].columns) for item in sheets)
+        stage['bytes_out'] = os.path.getsize(partial_filepath)
+    
+    # Vérifier que le fichier a été créé
+    if not os.path.exists(partial_filepath):
+        raise Exception(f"Le fichier traité n'a pas pu être créé: {processed_filepath}")
+    os.replace(partial_filepath, processed_filepath)
+    etag = artifact_index.register(processed_filepath) if output_folder == PROCESSED_FOLDER else None
+    
+    logger.info("✅ Fichier traité et formaté créé avec succès: %s", processed_filepath)
+    
+    # Les informations de premier niveau décrivent la première feuille
+    first = sheets[0]
+    date_columns = first['columns_info']['date_columns']
+    numeric_columns = first['columns_info']['numeric_columns']
+    result = {
+        'success': True,
+        'message': 'Fichier traité avec succès',
+        'original_file': filename,
+        'processed_file': processed_filename,
+        'etag': etag,
+        'format': output,
+        'columns_info': first['columns_info'],
+        'formatting_applied': {
+            'filters': True,
+            'date_formatting': len(date_columns) > 0,
+            'date_columns': date_columns,
+            'numeric_formatting': len(numeric_columns) > 0,
+            'numeric_columns': numeric_columns,
+            'table_style': True,
+            'frozen_header': True,
+            'original_structure_preserved': True
+        },
+        'changes_applied': {
+            'rules_applied': [
+                'Remplissage automatique pour ADVICEPRO',
+                'Extraction de références',
+                'Classification USD → Import'
+            ],
+            'rule_hits': first['rule_hits']
+        },
+        'timings': tracker.timings()
+    }
+    if not formatted:
+        # Données seules : aucune mise en forme appliquée
+        result['formatting_applied'] = None
+    
+    if sheet is not None:
+        result['sheets'] = [
+            {
+                'name': item['name'],
+                'columns_info': item['columns_info'],
+                'rule_hits': item['rule_hits'],
+                'timings': item['timings']
+            }
+            for item in sheets
+        ]
+    
+    if result_key:
+        result_cache.put(result_key, processed_filepath, result)
+    
+    return result
+
+def processing_key(file_hash, sheet=None, output=exports.XLSX, compress=False):
+    """Clé du cache des résultats : contenu du fichier, versions des règles et du formatage, feuille, format"""
+    versions = [RULES_VERSION, load_rules().version, FORMAT_VERSION] + ([sheet] if sheet else [])
+    if output != exports.XLSX:
+        versions += [output, 'gzip' if compress else '']
+    return cache_key(file_hash, *versions)
+
+def process_batch_file(filepath, filename, file_hash, sheet=None, output_folder=None):
+    """
+    Traite un classeur d'un lot (résultat du cache s'il existe), fichier traité
+    écrit dans output_folder ; retourne son entrée du manifeste
+    """
+    entry = {'file': filename, 'status': 'done'}
+    try:
+        result_key = processing_key(file_hash, sheet)
+        cached = result_cache.get(result_key)
+        if cached is not None:
+            result = restore_cached_result(cached, filename, output_folder=output_folder)
+        else:
+            result = process_upload(filepath, filename, result_key, sheet, output_folder=output_folder)
+    except Exception as e:
+        # Un fichier en erreur n'interrompt pas le lot
+        logger.exception("Erreur détaillée (%s): %s", filename, e)
+        entry.update(status='error', error=f'Erreur lors du traitement: {str(e)}')
+        return entry
+    
+    entry.update(
+        processed_file=result['processed_file'],
+        shape=result['columns_info']['shape'],
+        rule_hits=result['changes_applied']['rule_hits'],
+        cached=result.get('cached', False),
+        timings=result.get('timings')
+    )
+    return entry
+
+def _init_batch_worker():
+    # Règles compilées et définitions de styles préparées une fois par worker, puis
+    # partagées par tous les classeurs qu'il traite
+    load_rules()
+    for kind in (HEADER, DATE, NUMERIC, BORDERED):
+        named_style_definition(kind)
+
+def _batch_entry(future, filename):
+    # Worker du lot arrêté brutalement : les classeurs non terminés sont en erreur, le lot continue
+    try:
+        return future.result()
+    except BrokenProcessPool as e:
+        logger.error("❌ Worker du lot arrêté avant la fin (%s): %s", filename, e)
+        return {'file': filename, 'status': 'error', 'error': f'Traitement interrompu: {str(e)}'}
+
+def process_batch(files, batch_id, sheet=None, progress=None, max_workers=None):
+    """
+    Traite un lot de classeurs en parallèle sur un pool de processus (un
+    classeur par tâche) puis regroupe les fichiers traités et le manifeste
+    dans une seule archive zip. Les fichiers traités sont écrits dans un dossier
+    propre au lot (dans le dossier d'upload du lot), supprimé une fois l'archive
+    écrite : ils ne passent pas par le dossier partagé des fichiers traités.
+    Dans un job, le pool est borné par la part de cœurs du job (inner_workers).
+    files : [(chemin, nom, empreinte SHA-256)].
+    """
+    tracker = progress or StageTracker()
+    max_workers = inner_workers(len(files), max_workers or int(os.environ.get('BATCH_WORKERS', 0)) or None)
+    
+    batch_folder = os.path.dirname(upload_store.path(batch_id, ''))
+    os.makedirs(batch_folder, exist_ok=True)
+    output_folder = tempfile.mkdtemp(dir=batch_folder, prefix='.processed-')
+    archive_name = f"processed_batch_{batch_id}.zip"
+    archive_filepath = os.path.join(PROCESSED_FOLDER, archive_name)
+    partial_filepath = os.path.join(PROCESSED_FOLDER, f".{batch_id}-{archive_name}")
+    try:
+        # L'étape 'parse' couvre le traitement parallèle de tous les classeurs, 'save' l'archive
+        with tracker.stage('parse') as stage:
+            if max_workers < 2:
+                manifest = [
+                    process_batch_file(filepath, filename, file_hash, sheet, output_folder)
+                    for filepath, filename, file_hash in files
+                ]
+            else:
+                with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_batch_worker) as executor:
+                    futures = [
+                        executor.submit(process_batch_file, filepath, filename, file_hash, sheet, output_folder)
+                        for filepath, filename, file_hash in files
+                    ]
+                    manifest = [_batch_entry(future, filename) for future, (_, filename, _) in zip(futures, files)]
+            stage['rows'] = sum(entry['shape'][0] for entry in manifest if entry['status'] == 'done')
+            stage['bytes_in'] = sum(os.path.getsize(filepath) for filepath, _, _ in files)
         
-        # SEULEMENT remplir Descrip, Vessel et Service pour ADVICEPRO
-        df.loc[mask_advicepro, 'Descrip'] = "ADVICEPRO"
-        df.loc[mask_advicepro, 'Vessel'] = "N/A"
-        df.loc[mask_advicepro, 'Service'] = "OHD"
+        done = [entry for entry in manifest if entry['status'] == 'done']
+        with tracker.stage('save') as stage:
+            # Les classeurs sont déjà compressés : archive sans recompression
+            with zipfile.ZipFile(partial_filepath, 'w', compression=zipfile.ZIP_STORED) as archive:
+                for entry in done:
+                    archive.write(os.path.join(output_folder, entry['processed_file']), entry['processed_file'])
+                archive.writestr('manifest.json', json.dumps(manifest, indent=2, default=json_default))
+            stage['rows'] = len(done)
+            stage['bytes_out'] = os.path.getsize(partial_filepath)
+        os.replace(partial_filepath, archive_filepath)
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+        if os.path.exists(partial_filepath):
+            os.remove(partial_filepath)
+    etag = artifact_index.register(archive_filepath)
+    
+    logger.info("✅ Lot traité: %d fichier(s) sur %d, archive %s", len(done), len(files), archive_name)
+    
+    return {
+        'success': True,
+        'message': f'{len(done)} fichier(s) traité(s) sur {len(files)}',
+        'batch': True,
+        'processed_file': archive_name,
+        'etag': etag,
+        'files': manifest,
+        'timings': tracker.timings()
+    }
+
+# Colonne ajoutée au tableau consolidé : fichier d'origine de chaque ligne
+SOURCE_COLUMN = 'Fichier source'
+
+# Nombre de lignes de chaque bloc mis de côté pendant une consolidation, puis relu à l'écriture
+CONSOLIDATION_CHUNK_ROWS = 50000
+
+def consolidation_size(filepath, sheet=None):
+    """
+    Taille d'une feuille à consolider : taille décompressée de son XML (voir
+    xlsx_reader.sheet_size), ou taille du fichier s'il n'est pas lu ainsi (.xls)
+    """
+    try:
+        return xlsx_reader.sheet_size(filepath, sheet)
+    except (UnsupportedWorkbook, SheetNotFound):
+        return os.path.getsize(filepath)
+
+def consolidate_files(sources, filepath, progress=None, chunk_rows=CONSOLIDATION_CHUNK_ROWS):
+    """
+    Consolide plusieurs classeurs en un seul tableau formaté. Chaque feuille est
+    traitée (lecture, règles, formatage) puis mise de côté sur disque par blocs
+    de chunk_rows lignes ; les colonnes sont alignées par nom (ordre de première
+    apparition) derrière une colonne indiquant le fichier d'origine, et le
+    tableau est écrit bloc par bloc, avec les styles et formats d'origine de
+    chaque fichier. Le traitement d'une feuille (types, règles, valeurs Period)
+    porte sur la feuille entière : la mémoire utilisée est celle de la plus
+    grande feuille, d'où la limite MAX_CONSOLIDATION_SHEET_BYTES vérifiée par
+    /consolidate ; l'écriture n'a qu'un bloc en mémoire à la fois.
+    sources : [(chemin, nom affiché, feuille ou None)]. Retourne le détail par fichier.
+    """
+    tracker = progress or StageTracker()
+    columns = [SOURCE_COLUMN]
+    max_lengths = {}
+    manifest = []
+    spill_paths = []
+    
+    spill_folder = tempfile.mkdtemp(dir=PROCESSED_FOLDER, prefix='.consolidation-')
+    try:
+        with tracker.stage('parse') as stage:
+            for i, (source_filepath, label, sheet_name) in enumerate(sources):
+                sheet = process_sheet(source_filepath, sheet_name)
+                df = sheet['df']
+                layout = sheet['layout']
+                column_count = len(df.columns)
+                df[SOURCE_COLUMN] = label
+                # Valeurs Period d'origine fusionnées avant découpage : les blocs ne gardent que les formats
+                preserved = merge_preserved(df, layout['preserved'])
+                
+                for col_name, length in text_lengths(df).items():
+                    if col_name not in columns:
+                        columns.append(col_name)
+                    max_lengths[col_name] = max(max_lengths.get(col_name, 0), length)
+                
+                for start in range(0, len(df), chunk_rows):
+                    spill_path = os.path.join(spill_folder, f"{i}-{start}.pkl")
+                    pd.to_pickle((df.iloc[start:start + chunk_rows], preserved, layout['column_styles']), spill_path)
+                    spill_paths.append(spill_path)
+                manifest.append({'file': label, 'sheet': sheet_name, 'rows': len(df), 'columns': column_count,
+                                 'rule_hits': sheet['rule_hits']})
+                del df, sheet, layout
+            stage['rows'] = sum(entry['rows'] for entry in manifest)
+            stage['columns'] = len(columns)
+            stage['bytes_in'] = sum(os.path.getsize(source_filepath) for source_filepath in {path for path, _, _ in sources})
         
-        print(f"✅ Règle ADVICEPRO appliquée à {mask_advicepro.sum()} lignes (Descrip, Vessel, Service seulement)")
+        def parts():
+            for spill_path in spill_paths:
+                df, preserved, column_styles = pd.read_pickle(spill_path)
+                # Colonnes absentes de ce fichier : cellules vides
+                yield df.reindex(columns=columns), preserved, column_styles
+        
+        with tracker.stage('save') as stage:
+            write_consolidated_workbook(
+                filepath, columns, parts(), sum(entry['rows'] for entry in manifest),
+                [max_lengths[col_name] for col_name in columns]
+            )
+            stage['rows'] = sum(entry['rows'] for entry in manifest)
+            stage['columns'] = len(columns)
+            stage['bytes_out'] = os.path.getsize(filepath)
+    finally:
+        shutil.rmtree(spill_folder, ignore_errors=True)
+    
+    return {'columns': columns, 'files': manifest}
 
-    # Règle 2 : Extraction de références - DÉSACTIVÉE
-    # La colonne Reference reste vide
-    if 'Reference' not in df.columns:
-        df['Reference'] = ''
-    print("⚠️ Extraction de références désactivée - colonne Reference reste vide")
+def process_consolidation(sources, job_id, progress=None):
+    """Job de consolidation : écrit le tableau consolidé et retourne les informations renvoyées au client"""
+    tracker = progress or StageTracker()
+    processed_filename = f"processed_consolidation_{job_id}.xlsx"
+    processed_filepath = os.path.join(PROCESSED_FOLDER, processed_filename)
+    partial_filepath = os.path.join(PROCESSED_FOLDER, f".{job_id}-{processed_filename}")
+    
+    details = consolidate_files(sources, partial_filepath, progress=tracker)
+    os.replace(partial_filepath, processed_filepath)
+    etag = artifact_index.register(processed_filepath)
+    
+    rows = sum(entry['rows'] for entry in details['files'])
+    logger.info("✅ Consolidation de %d fichier(s) créée: %s (%d lignes)", len(sources), processed_filename, rows)
+    
+    return {
+        'success': True,
+        'message': f'{len(sources)} fichier(s) consolidé(s)',
+        'processed_file': processed_filename,
+        'etag': etag,
+        'columns': details['columns'],
+        'shape': [rows, len(details['columns'])],
+        'files': details['files'],
+        'timings': tracker.timings()
+    }
 
-    # Règle 3 : USD → Import - DÉSACTIVÉE  
-    # La colonne Nature reste vide
-    if 'Nature' not in df.columns:
-        df['Nature'] = ''
-    print("⚠️ Règle USD → Import désactivée - colonne Nature reste vide")
+def restore_cached_result(cached, filename, output=exports.XLSX, compress=False, output_folder=None):
+    """Recopie un résultat du cache sous le nom attendu pour ce fichier (dans PROCESSED_FOLDER par défaut)"""
+    cached_filepath, result = cached
+    output_folder = output_folder or PROCESSED_FOLDER
+    processed_filename = exports.export_filename(f"processed_{filename}", output, compress)
+    partial_filepath = os.path.join(output_folder, f".{new_job_id()}-{processed_filename}")
+    shutil.copyfile(cached_filepath, partial_filepath)
+    processed_filepath = os.path.join(output_folder, processed_filename)
+    os.replace(partial_filepath, processed_filepath)
     
-    return df
+    result['original_file'] = filename
+    result['processed_file'] = processed_filename
+    result['etag'] = artifact_index.register(processed_filepath) if output_folder == PROCESSED_FOLDER else None
+    result['cached'] = True
+    return result
+
+def start_processing(job_id, filepath, filename, file_hash, sheet, intake, output=exports.XLSX, compress=False):
+    """
+    Crée le job d'un fichier reçu : résultat servi depuis le cache s'il a déjà
+    été traité avec les mêmes règles, sinon traitement confié au pool de workers.
+    Une feuille absente du classeur est refusée (400) et le fichier reçu supprimé.
+    """
+    try:
+        check_sheet(filepath, sheet)
+    except ValueError as e:
+        upload_store.remove(job_id)
+        return jsonify({'error': str(e)}), 400
+    
+    # Un fichier déjà traité avec les mêmes règles et le même formatage est servi depuis le cache
+    with intake.stage('cache'):
+        result_key = processing_key(file_hash, sheet, output, compress)
+        cached = result_cache.get(result_key)
+    metrics.observe_stages(intake.timings())
+    
+    if cached is not None:
+        result = restore_cached_result(cached, filename, output, compress)
+        result['timings'] = intake.timings()
+        job = Job(id=job_id, filename=filename, sheet=sheet, status='done', result=json.dumps(result))
+        db.session.add(job)
+        db.session.commit()
+        logger.info("⚡ Résultat servi depuis le cache: %s", result_key)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Fichier déjà traité, résultat servi depuis le cache',
+            'job_id': job.id,
+            'status': job.status,
+            'original_file': filename,
+            'cached': True,
+            'timings': intake.timings()
+        })
+    
+    # Créer le job puis lancer le traitement en arrière-plan
+    job = Job(id=job_id, filename=filename, sheet=sheet, status='queued')
+    db.session.add(job)
+    db.session.commit()
+    
+    submit_job(
+        current_app.config['SQLALCHEMY_DATABASE_URI'], job.id,
+        process_upload, filepath, filename, result_key, sheet, output, compress,
+        max_workers=current_app.config.get('JOB_WORKERS')
+    )
+    
+    return jsonify({
+        'success': True,
+        'message': 'Fichier reçu, traitement en cours',
+        'job_id': job.id,
+        'status': job.status,
+        'original_file': filename,
+        'timings': intake.timings()
+    }), 202
 
 @excel_bp.route('/upload', methods=['POST'])
 def upload_file():
     """
-    Endpoint pour uploader et traiter un fichier Excel
+    Endpoint pour uploader un fichier Excel : le traitement est confié au pool
+    de workers et l'identifiant du job est retourné immédiatement
     """
     try:
         if 'file' not in request.files:
@@ -428,130 +797,479 @@ def upload_file():
         
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(filepath)
-            
-            # Lire le fichier Excel intelligemment
-            df = read_excel_smart(filepath)
-            
-            # Remplacer les NaN par des chaînes vides pour éviter les problèmes JSON
-            df_clean = df.fillna('')
-            
-            # Obtenir les informations sur les colonnes
-            sample_data = df_clean.head(3).to_dict('records')
-            sample_data_cleaned = clean_data_for_json(sample_data)
-            
-            # Détecter les colonnes de dates et numériques pour l'info
-            date_columns = detect_date_columns(df)
-            numeric_columns = detect_numeric_columns(df)
-            
-            columns_info = {
-                'columns': list(df.columns),
-                'shape': df.shape,
-                'empty_columns': [col for col in df.columns if df[col].isna().all()],
-                'date_columns': date_columns,
-                'numeric_columns': numeric_columns,
-                'sample_data': sample_data_cleaned
-            }
-            
-            # Appliquer les règles de traitement
-            df_processed = apply_rules(df.copy())
-            
-            # Sauvegarder et formater le fichier traité
-            processed_filename = f"processed_{filename}"
-            processed_filepath = os.path.join(PROCESSED_FOLDER, processed_filename)
-            
-            # Utiliser la nouvelle fonction de formatage avec le fichier original
-            format_excel_file(df_processed, processed_filepath, filepath)
-            
-            # Vérifier que le fichier a été créé
-            if not os.path.exists(processed_filepath):
-                raise Exception(f"Le fichier traité n'a pas pu être créé: {processed_filepath}")
+            job_id = new_job_id()
+            # Feuille à traiter : un nom, 'all', ou la feuille active par défaut
+            sheet = request.form.get('sheet') or request.args.get('sheet') or None
+            try:
+                output, compress = output_options(sheet)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
-            print(f"✅ Fichier traité et formaté créé avec succès: {processed_filepath}")
+            # Étapes exécutées pendant la requête (les suivantes le sont par le worker)
+            intake = StageTracker()
+            try:
+                with intake.stage('receive') as stage:
+                    # Recopie par blocs dans le dossier du job, empreinte calculée au passage
+                    filepath, size, file_hash = upload_store.save(
+                        file.stream, job_id, filename,
+                        max_bytes=current_app.config.get('MAX_CONTENT_LENGTH')
+                    )
+                    stage['bytes_in'] = size
+            except UploadTooLarge as e:
+                return jsonify({'error': str(e)}), 413
+            upload_store.start_cleanup()
             
-            return jsonify({
-                'success': True,
-                'message': 'Fichier traité avec succès',
-                'original_file': filename,
-                'processed_file': processed_filename,
-                'columns_info': columns_info,
-                'formatting_applied': {
-                    'filters': True,
-                    'date_formatting': len(date_columns) > 0,
-                    'date_columns': date_columns,
-                    'numeric_formatting': len(numeric_columns) > 0,
-                    'numeric_columns': numeric_columns,
-                    'table_style': True,
-                    'frozen_header': True,
-                    'original_structure_preserved': True
-                },
-                'changes_applied': {
-                    'rules_applied': [
-                        'Remplissage automatique pour ADVICEPRO',
-                        'Extraction de références',
-                        'Classification USD → Import'
-                    ]
-                }
-            })
+            return start_processing(job_id, filepath, filename, file_hash, sheet, intake, output, compress)
         
         return jsonify({'error': 'Type de fichier non autorisé. Utilisez .xlsx ou .xls'}), 400
     
+    except RequestEntityTooLarge:
+        # Taille annoncée par la requête supérieure à MAX_CONTENT_LENGTH : rejet avant lecture
+        max_bytes = current_app.config.get('MAX_CONTENT_LENGTH') or 0
+        return jsonify({'error': str(UploadTooLarge(max_bytes))}), 413
     except Exception as e:
-        print(f"Erreur détaillée: {str(e)}")
+        logger.exception("Erreur détaillée: %s", e)
         return jsonify({'error': f'Erreur lors du traitement: {str(e)}'}), 500
 
+def unique_filename(filename, used):
+    """Nom de fichier non encore utilisé dans le lot (suffixe _2, _3... sinon)"""
+    stem, ext = os.path.splitext(filename)
+    candidate, n = filename, 1
+    while candidate.lower() in used:
+        n += 1
+        candidate = f"{stem}_{n}{ext}"
+    used.add(candidate.lower())
+    return candidate
+
+@excel_bp.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Endpoint pour uploader un lot de classeurs (plusieurs fichiers, ou des
+    archives zip) : les classeurs sont traités en parallèle par un seul job,
+    dont le résultat contient le manifeste et l'archive des fichiers traités
+    """
+    try:
+        # Limite propre au lot (la limite par fichier reste MAX_CONTENT_LENGTH)
+        request.max_content_length = current_app.config.get('MAX_BATCH_BYTES')
+        uploads = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+        if not uploads:
+            return jsonify({'error': 'Aucun fichier fourni'}), 400
+        
+        batch_id = new_job_id()
+        sheet = request.form.get('sheet') or request.args.get('sheet') or None
+        max_bytes = current_app.config.get('MAX_CONTENT_LENGTH')
+        
+        intake = StageTracker()
+        files = []
+        skipped = []
+        used_names = set()
+        try:
+            with intake.stage('receive') as stage:
+                for i, file in enumerate(uploads):
+                    filename = secure_filename(file.filename)
+                    if is_archive(filename):
+                        archive_path, _, _ = upload_store.save(
+                            file.stream, os.path.join(batch_id, f"archive{i}"), filename,
+                            max_bytes=current_app.config.get('MAX_BATCH_BYTES')
+                        )
+                        received = upload_store.extract(
+                            archive_path, os.path.join(batch_id, f"archive{i}"), allowed_file,
+                            max_bytes=max_bytes, max_files=MAX_BATCH_FILES
+                        )
+                    elif allowed_file(filename):
+                        filepath, size, file_hash = upload_store.save(
+                            file.stream, os.path.join(batch_id, f"{i:04d}"), filename, max_bytes=max_bytes
+                        )
+                        received = [(filepath, filename, size, file_hash)]
+                    else:
+                        skipped.append(file.filename)
+                        continue
+                    for filepath, name, size, file_hash in received:
+                        files.append((filepath, unique_filename(name, used_names), file_hash))
+                    if len(files) > MAX_BATCH_FILES:
+                        raise ValueError(f"Trop de fichiers dans le lot (maximum {MAX_BATCH_FILES})")
+                stage['rows'] = len(files)
+                stage['bytes_in'] = sum(os.path.getsize(filepath) for filepath, _, _ in files)
+        except UploadTooLarge as e:
+            upload_store.remove(batch_id)
+            return jsonify({'error': str(e)}), 413
+        except (ValueError, zipfile.BadZipFile) as e:
+            upload_store.remove(batch_id)
+            return jsonify({'error': f'Archive invalide: {str(e)}'}), 400
+        upload_store.start_cleanup()
+        metrics.observe_stages(intake.timings())
+        
+        if not files:
+            upload_store.remove(batch_id)
+            return jsonify({'error': 'Aucun classeur .xlsx ou .xls dans le lot', 'skipped': skipped}), 400
+        
+        # Nom affiché du job : l'archive reçue, ou « batch » pour plusieurs fichiers
+        job_filename = secure_filename(uploads[0].filename) if len(uploads) == 1 else 'batch'
+        job = Job(id=batch_id, filename=job_filename, status='queued')
+        db.session.add(job)
+        db.session.commit()
+        
+        submit_job(
+            current_app.config['SQLALCHEMY_DATABASE_URI'], job.id,
+            process_batch, files, batch_id, sheet,
+            max_workers=current_app.config.get('JOB_WORKERS')
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': f'{len(files)} fichier(s) reçu(s), traitement en cours',
+            'job_id': job.id,
+            'status': job.status,
+            'files': [filename for _, filename, _ in files],
+            'skipped': skipped,
+            'timings': intake.timings()
+        }), 202
+    
+    except RequestEntityTooLarge:
+        max_bytes = current_app.config.get('MAX_BATCH_BYTES') or 0
+        return jsonify({'error': str(UploadTooLarge(max_bytes))}), 413
+    except Exception as e:
+        logger.exception("Erreur détaillée: %s", e)
+        return jsonify({'error': f'Erreur lors du traitement: {str(e)}'}), 500
+
+@excel_bp.route('/consolidate', methods=['POST'])
+def consolidate():
+    """
+    Endpoint pour consolider les fichiers de plusieurs uploads (identifiants de
+    jobs) en un seul tableau formaté, avec une colonne indiquant le fichier d'origine
+    """
+    try:
+        payload = request.get_json(silent=True) or {}
+        job_ids = payload.get('job_ids') or request.form.getlist('job_ids')
+        if isinstance(job_ids, str):
+            job_ids = [job_ids]
+        # Champ de formulaire : identifiants éventuellement séparés par des virgules
+        job_ids = [job_id.strip() for value in job_ids for job_id in str(value).split(',') if job_id.strip()]
+        if not job_ids:
+            return jsonify({'error': 'Aucun job fourni (job_ids)'}), 400
+        
+        sources = []
+        missing = []
+        used_names = set()
+        for job_id in job_ids:
+            job = db.session.get(Job, job_id)
+            filepath = upload_store.path(job.id, job.filename) if job is not None else None
+            if filepath is None or not os.path.exists(filepath):
+                missing.append(job_id)
+                continue
+            label = unique_filename(job.filename, used_names)
+            if job.sheet == ALL_SHEETS:
+                # Toutes les feuilles du classeur, consolidées l'une après l'autre
+                sources.extend((filepath, f"{label} [{name}]", name) for name in list_sheets(filepath))
+            else:
+                sources.append((filepath, label, job.sheet))
+        if missing:
+            return jsonify({'error': 'Fichier non trouvé pour les jobs indiqués', 'missing': missing}), 404
+        
+        # Chaque feuille est traitée en entier : taille décompressée limitée pour borner la mémoire du job
+        max_bytes = current_app.config.get('MAX_CONSOLIDATION_SHEET_BYTES')
+        if max_bytes:
+            too_large = [label for filepath, label, sheet in sources if consolidation_size(filepath, sheet) > max_bytes]
+            if too_large:
+                return jsonify({
+                    'error': f'Feuille trop volumineuse pour la consolidation (maximum {max_bytes} octets décompressés)',
+                    'too_large': too_large
+                }), 413
+        
+        job = Job(id=new_job_id(), filename='consolidation', status='queued')
+        db.session.add(job)
+        db.session.commit()
+        
+        submit_job(
+            current_app.config['SQLALCHEMY_DATABASE_URI'], job.id,
+            process_consolidation, sources, job.id,
+            max_workers=current_app.config.get('JOB_WORKERS')
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': f'{len(sources)} fichier(s) à consolider, traitement en cours',
+            'job_id': job.id,
+            'status': job.status,
+            'files': [label for _, label, _ in sources]
+        }), 202
+    
+    except Exception as e:
+        logger.exception("Erreur détaillée: %s", e)
+        return jsonify({'error': f'Erreur lors du traitement: {str(e)}'}), 500
+
+@excel_bp.route('/jobs/<job_id>')
+def get_job(job_id):
+    """
+    Endpoint pour obtenir l'état d'un job et, une fois terminé, son résultat
+    """
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'error': f'Job non trouvé: {job_id}'}), 404
+    return jsonify(job.to_dict())
+
+@excel_bp.route('/jobs/<job_id>/progress')
+def get_job_progress(job_id):
+    """
+    Endpoint pour suivre l'avancement d'un job étape par étape
+    """
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'error': f'Job non trouvé: {job_id}'}), 404
+    return jsonify(job.progress_dict())
+
+@excel_bp.route('/jobs/<job_id>/reprocess', methods=['POST'])
+def reprocess_job(job_id):
+    """
+    Endpoint pour retraiter un fichier déjà reçu (ex. après modification des
+    règles) : le fichier n'est pas renvoyé et sa copie en colonnes évite de
+    relire le classeur. Un champ file facultatif apporte une nouvelle version
+    du fichier (ex. relevé complété) : seules les lignes nouvelles ou modifiées
+    passent par les règles.
+    """
+    try:
+        original = db.session.get(Job, job_id)
+        if original is None:
+            return jsonify({'error': f'Job non trouvé: {job_id}'}), 404
+        if not os.path.exists(upload_store.path(original.id, original.filename)):
+            return jsonify({'error': 'Fichier non trouvé'}), 404
+        
+        file = request.files.get('file')
+        if file is not None and not allowed_file(file.filename):
+            return jsonify({'error': 'Type de fichier non autorisé. Utilisez .xlsx ou .xls'}), 400
+        
+        sheet = request.form.get('sheet') or request.args.get('sheet') or None
+        try:
+            output, compress = output_options(sheet)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        new_id = new_job_id()
+        intake = StageTracker()
+        try:
+            with intake.stage('receive') as stage:
+                if file is not None:
+                    # Nouvelle version du fichier, avec l'état des règles du job d'origine
+                    filename = secure_filename(file.filename)
+                    filepath, stage['bytes_in'], file_hash = upload_store.save(
+                        file.stream, new_id, filename,
+                        max_bytes=current_app.config.get('MAX_CONTENT_LENGTH')
+                    )
+                    upload_store.clone(original.id, new_id, names=[rule_state.STATE_DIRNAME])
+                else:
+                    # Le nouveau job reprend le fichier et sa copie en colonnes (liens physiques)
+                    filename = original.filename
+                    upload_store.clone(original.id, new_id)
+                    filepath = upload_store.path(new_id, filename)
+                    stage['bytes_in'] = os.path.getsize(filepath)
+                    file_hash = file_sha256(filepath)
+        except UploadTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        
+        return start_processing(new_id, filepath, filename, file_hash, sheet, intake, output, compress)
+    
+    except RequestEntityTooLarge:
+        max_bytes = current_app.config.get('MAX_CONTENT_LENGTH') or 0
+        return jsonify({'error': str(UploadTooLarge(max_bytes))}), 413
+    except Exception as e:
+        logger.exception("Erreur détaillée: %s", e)
+        return jsonify({'error': f'Erreur lors du traitement: {str(e)}'}), 500
+
+@excel_bp.route('/metrics')
+def get_metrics():
+    """
+    Endpoint des métriques (format texte Prometheus) : histogrammes de durée,
+    lignes, colonnes et octets par étape du traitement
+    """
+    return Response(metrics.render(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+def send_artifact(artifact, immutable=False):
+    """
+    Réponse de téléchargement d'un fichier traité : ETag fort (empreinte du
+    contenu), If-None-Match (304) et Range (206) gérés par send_file. Une URL
+    adressée par contenu (immutable) peut être gardée en cache longtemps, les
+    autres sont revalidées à chaque téléchargement. Les fichiers texte sont
+    servis compressés (copie gzip, ETag distinct) si Accept-Encoding le permet.
+    """
+    if artifact.size == 0:
+        return jsonify({'error': 'Le fichier est vide'}), 500
+    
+    compressed = artifact.gzip_path is not None and request.accept_encodings.quality('gzip') > 0
+    response = send_file(
+        artifact.gzip_path if compressed else artifact.path,
+        as_attachment=True,
+        download_name=artifact.name,
+        mimetype='application/zip' if is_archive(artifact.name) else exports.content_type(artifact.name),
+        etag=f'{artifact.etag}-gzip' if compressed else artifact.etag,
+        last_modified=artifact.mtime,
+        max_age=DOWNLOAD_MAX_AGE if immutable else None,
+        conditional=True
+    )
+    if compressed:
+        response.content_encoding = 'gzip'
+    if artifact.gzip_path is not None:
+        response.vary.add('Accept-Encoding')
+    # Reprise des téléchargements interrompus
+    response.accept_ranges = 'bytes'
+    if immutable:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
 @excel_bp.route('/download/<filename>')
 def download_file(filename):
     """
-    Endpoint pour télécharger le fichier traité
+    Endpoint pour télécharger le fichier traité. Paramètre v facultatif :
+    empreinte du contenu (etag du résultat du job), l'URL est alors mise en
+    cache durablement tant que le fichier n'a pas été remplacé
     """
     try:
-        filepath = os.path.join(PROCESSED_FOLDER, filename)
+        artifact = artifact_index.get(filename)
+        if artifact is None:
+            logger.warning("Fichier non trouvé: %s", filename)
+            return jsonify({'error': f'Fichier non trouvé: {filename}'}), 404
         
-        print(f"Tentative de téléchargement: {filepath}")
-        print(f"Le fichier existe: {os.path.exists(filepath)}")
+        logger.debug("Téléchargement: %s (%d octets, etag %s)", artifact.path, artifact.size, artifact.etag)
+        return send_artifact(artifact, immutable=request.args.get('v') == artifact.etag)
+    
+    except Exception as e:
+        logger.exception("Erreur lors du téléchargement: %s", e)
+        return jsonify({'error': f'Erreur lors du téléchargement: {str(e)}'}), 500
+
+@excel_bp.route('/jobs/<job_id>/download')
+def download_job(job_id):
+    """
+    Endpoint pour télécharger le fichier traité d'un job : 410 si un traitement
+    plus récent du même nom l'a remplacé
+    """
+    try:
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return jsonify({'error': f'Job non trouvé: {job_id}'}), 404
+        result = json.loads(job.result) if job.result else None
+        if job.status != 'done' or not result or not result.get('processed_file'):
+            return jsonify({'error': f'Aucun fichier traité pour ce job (statut: {job.status})'}), 409
         
-        if os.path.exists(filepath):
-            file_size = os.path.getsize(filepath)
-            print(f"Taille du fichier: {file_size} bytes")
-            
-            if file_size == 0:
-                return jsonify({'error': 'Le fichier est vide'}), 500
-            
-            return send_file(
-                filepath, 
-                as_attachment=True, 
-                download_name=filename,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-        else:
-            print(f"Fichier non trouvé: {filepath}")
-            print(f"Contenu du dossier processed: {os.listdir(PROCESSED_FOLDER) if os.path.exists(PROCESSED_FOLDER) else 'Dossier inexistant'}")
-            return jsonify({'error': f'Fichier non trouvé: {filename}'}), 404
-            
+        artifact = artifact_index.get(result['processed_file'])
+        if artifact is None:
+            return jsonify({'error': f"Fichier non trouvé: {result['processed_file']}"}), 404
+        etag = result.get('etag')
+        if etag is not None and etag != artifact.etag:
+            return jsonify({'error': 'Fichier remplacé par un traitement plus récent', 'processed_file': artifact.name}), 410
+        
+        # Contenu propre au job : l'URL peut être gardée en cache
+        return send_artifact(artifact, immutable=etag is not None)
+    
     except Exception as e:
-        print(f"Erreur lors du téléchargement: {str(e)}")
+        logger.exception("Erreur lors du téléchargement: %s", e)
         return jsonify({'error': f'Erreur lors du téléchargement: {str(e)}'}), 500
 
+@excel_bp.route('/export/<job_id>')
+def export_job(job_id):
+    """
+    Endpoint pour exporter les données traitées d'un upload : format=csv (par
+    défaut), ndjson ou parquet, gzip=1 pour csv et ndjson. Le fichier est
+    retraité (copie en colonnes et état des règles repris) et les données sont
+    envoyées en flux depuis le DataFrame traité, sans passer par openpyxl.
+    format=xlsx renvoie le classeur formaté du job.
+    """
+    try:
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return jsonify({'error': f'Job non trouvé: {job_id}'}), 404
+        filepath = upload_store.path(job.id, job.filename)
+        if not os.path.exists(filepath):
+            return jsonify({'error': 'Fichier non trouvé'}), 404
+        
+        sheet = request.args.get('sheet') or None
+        try:
+            output, compress = output_options(sheet, default=exports.CSV)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if output == exports.XLSX:
+            # Le classeur formaté est le fichier traité du job
+            result = json.loads(job.result) if job.result else {}
+            if result.get('format', exports.XLSX) != exports.XLSX:
+                return jsonify({'error': f"Job traité au format {result['format']} : retraiter le job avec format=xlsx"}), 409
+            return download_job(job_id)
+        
+        item = process_sheet(filepath, sheet, formatted=False)
+        download_name = exports.export_filename(f"processed_{job.filename}", output, compress)
+        logger.info("📤 Export %s de %s: %d lignes", output, job.filename, len(item['df']))
+        return Response(
+            stream_with_context(exports.iter_export(item['df'], output, compress)),
+            mimetype=exports.content_type(download_name),
+            headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
+        )
+    
+    except Exception as e:
+        logger.exception("Erreur lors de l'export: %s", e)
+        return jsonify({'error': f"Erreur lors de l'export: {str(e)}"}), 500
+
+def find_upload(filename, job_id=None):
+    """Chemin du fichier uploadé : celui du job indiqué, sinon du dernier job portant ce nom"""
+    if job_id is None:
+        job = Job.query.filter_by(filename=filename).order_by(Job.created_at.desc()).first()
+        if job is None:
+            return None
+        job_id = job.id
+    return upload_store.path(secure_filename(job_id), secure_filename(filename))
+
 @excel_bp.route('/columns/<filename>')
 def get_columns(filename):
     """
     Endpoint pour obtenir les colonnes d'un fichier uploadé
     """
     try:
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        if os.path.exists(filepath):
-            df = read_excel_smart(filepath)
-            df_clean = df.fillna('')
-            sample_data = clean_data_for_json(df_clean.head(5).to_dict('records'))
+        filepath = find_upload(filename, request.args.get('job_id'))
+        if filepath is not None and os.path.exists(filepath):
+            # Lecture partielle : en-têtes + quelques lignes, dimensions issues des métadonnées
+            nrows = request.args.get('rows', PREVIEW_ROWS, type=int)
+            preview = read_preview(filepath, nrows=min(max(nrows, 0), MAX_ROWS_LIMIT))
             
             return jsonify({
-                'columns': list(df.columns),
-                'shape': df.shape,
-                'sample_data': sample_data
+                'columns': preview.columns,
+                'shape': preview.shape,
+                'sample_data': to_records(preview.df)
             })
         else:
             return jsonify({'error': 'Fichier non trouvé'}), 404
+    except Exception as e:
+        return jsonify({'error': f'Erreur lors de la lecture: {str(e)}'}), 500
+
+@excel_bp.route('/rows/<filename>')
+def get_rows(filename):
+    """
+    Endpoint pour obtenir les lignes d'un fichier uploadé, envoyées en flux :
+    tableau JSON (format=json) ou une ligne JSON par ligne (format=ndjson).
+    offset et limit délimitent les lignes renvoyées (toutes par défaut, limit
+    ramené à MAX_ROWS_LIMIT).
+    """
+    try:
+        filepath = find_upload(filename, request.args.get('job_id'))
+        if filepath is None or not os.path.exists(filepath):
+            return jsonify({'error': 'Fichier non trouvé'}), 404
+        
+        output_format = request.args.get('format', 'json')
+        if output_format not in ('json', 'ndjson'):
+            return jsonify({'error': 'Format non pris en charge (json ou ndjson)'}), 400
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = request.args.get('limit', type=int)
+        if limit is not None:
+            limit = min(max(limit, 0), MAX_ROWS_LIMIT)
+        
+        if limit is not None and offset == 0:
+            # Premières lignes seulement : lecture partielle du classeur
+            df = read_preview(filepath, nrows=limit).df
+        else:
+            df = read_excel_smart(filepath)
+            df = df.iloc[offset:offset + limit] if limit is not None else df.iloc[offset:]
+        
+        ndjson = output_format == 'ndjson'
+        return Response(
+            stream_with_context(iter_json(df, ndjson=ndjson)),
+            mimetype=NDJSON_CONTENT_TYPE if ndjson else JSON_CONTENT_TYPE
+        )
     except Exception as e:
         return jsonify({'error': f'Erreur lors de la lecture: {str(e)}'}), 500
\ No newline at end of file
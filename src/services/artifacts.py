@@ -0,0 +1,154 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from src.services import exports
+from src.services.result_cache import file_sha256, HASH_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Dossier des empreintes, à côté des fichiers traités
+INDEX_DIRNAME = '.artifacts'
+
+# Nombre d'empreintes gardées en mémoire
+INDEX_SIZE = 1024
+
+# Taille minimale d'un fichier texte pour en garder une copie compressée
+GZIP_MIN_SIZE = 1024
+
+# Fichier traité servi au téléchargement : etag = empreinte SHA-256 du contenu,
+# gzip_path = copie compressée gzip (fichiers texte) ou None
+Artifact = namedtuple('Artifact', ['name', 'path', 'size', 'mtime', 'etag', 'gzip_path'])
+
+
+def _signature(stat):
+    """Identifie une version d'un fichier : remplacé par os.replace, il change d'inode"""
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+def _compressible(name):
+    """Fichier texte (csv, ndjson) : servi compressé aux clients qui acceptent gzip"""
+    return os.path.splitext(name)[1].lstrip('.') in exports.TEXT_FORMATS
+
+
+class ArtifactIndex:
+    """
+    Index des fichiers traités (dossier processed/), par nom.
+
+    L'empreinte du contenu de chaque fichier est calculée une seule fois,
+    par le worker qui l'écrit (register) ou à défaut au premier téléchargement,
+    et enregistrée dans <dossier>/.artifacts/<nom>.json avec la signature du
+    fichier (inode, taille, date) : un fichier remplacé est réindexé. Les
+    dernières empreintes sont aussi gardées en mémoire. Les fichiers texte ont
+    en plus une copie compressée gzip (<dossier>/.artifacts/<nom>.gz), écrite
+    avec l'empreinte : pas de nom en conflit avec les exports déjà en .gz.
+    """
+
+    def __init__(self, folder, max_entries=INDEX_SIZE):
+        self.folder = folder
+        self.index_folder = os.path.join(folder, INDEX_DIRNAME)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.index_folder, exist_ok=True)
+
+    def _index_path(self, name):
+        return os.path.join(self.index_folder, f"{name}.json")
+
+    def _gzip_path(self, name):
+        return os.path.join(self.index_folder, f"{name}.gz")
+
+    def _write_gzip(self, name, path, size):
+        """
+        Copie compressée d'un fichier texte, gardée seulement si elle est plus
+        petite ; une copie d'une version précédente du fichier est supprimée
+        """
+        gzip_path = self._gzip_path(name)
+        if _compressible(name) and size >= GZIP_MIN_SIZE:
+            tmp_path = f"{gzip_path}.{os.getpid()}.tmp"
+            try:
+                with open(path, 'rb') as source, open(tmp_path, 'wb') as target:
+                    for chunk in exports.gzip_chunks(iter(lambda: source.read(HASH_CHUNK_SIZE), b'')):
+                        target.write(chunk)
+                if os.path.getsize(tmp_path) < size:
+                    os.replace(tmp_path, gzip_path)
+                    return
+                os.remove(tmp_path)
+            except OSError as e:
+                logger.warning("⚠️ Copie compressée de %s non enregistrée: %s", name, e)
+        try:
+            os.remove(gzip_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("⚠️ Copie compressée de %s non supprimée: %s", name, e)
+
+    def _read_etag(self, name, signature):
+        try:
+            with open(self._index_path(name), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry.get('etag') if entry.get('signature') == signature else None
+
+    def _write_etag(self, name, signature, etag):
+        index_path = self._index_path(name)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'signature': signature, 'etag': etag}, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            logger.warning("⚠️ Empreinte de %s non enregistrée: %s", name, e)
+
+    def _remember(self, name, signature, etag):
+        with self._lock:
+            self._entries[name] = (signature, etag)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def register(self, path):
+        """Indexe un fichier qui vient d'être écrit ; retourne son empreinte"""
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        signature = _signature(stat)
+        etag = file_sha256(path)
+        # Copie compressée écrite avant l'empreinte : une empreinte à jour a sa copie à jour
+        self._write_gzip(name, path, stat.st_size)
+        self._write_etag(name, signature, etag)
+        self._remember(name, signature, etag)
+        return etag
+
+    def get(self, name):
+        """Fichier traité de ce nom, ou None (absent ou fichier interne)"""
+        if not name or name.startswith('.') or os.path.basename(name) != name:
+            return None
+        path = os.path.join(self.folder, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        signature = _signature(stat)
+        with self._lock:
+            cached = self._entries.get(name)
+            if cached is not None and cached[0] == signature:
+                self._entries.move_to_end(name)
+                etag = cached[1]
+            else:
+                etag = None
+        if etag is None:
+            etag = self._read_etag(name, signature)
+            if etag is None:
+                # Fichier non indexé (ex. écrit par une version précédente) : empreinte calculée une fois
+                etag = file_sha256(path)
+                self._write_gzip(name, path, stat.st_size)
+                self._write_etag(name, signature, etag)
+            self._remember(name, signature, etag)
+
+        gzip_path = self._gzip_path(name) if _compressible(name) else None
+        if gzip_path is not None and not os.path.exists(gzip_path):
+            gzip_path = None
+        return Artifact(name, path, stat.st_size, stat.st_mtime, etag, gzip_path)
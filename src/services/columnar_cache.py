@@ -0,0 +1,208 @@
+import os
+import pickle
+import shutil
+import hashlib
+import logging
+import tempfile
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pyarrow est facultatif : repli sur pickle
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Version du format des copies en colonnes : à incrémenter si leur contenu change
+COLUMNAR_VERSION = 2
+
+# Dossier des copies en colonnes, à côté du fichier uploadé
+CACHE_DIRNAME = '.columns'
+
+META_FILENAME = 'meta.pkl'
+RAW_FILENAME = 'raw.pkl'
+ARROW_FILENAME = 'data.arrow'
+PICKLE_FILENAME = 'data.pkl'
+
+# Attributs de WorkbookSession enregistrés avec les données
+META_FIELDS = ('header_row', 'preamble_rows', 'header_names', 'column_formats', 'schema')
+
+
+def _source_signature(filepath):
+    stat = os.stat(filepath)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def sheet_key(sheet_name=None):
+    """Nom de fichier d'une feuille : 'active', ou empreinte de son nom"""
+    return hashlib.sha256(str(sheet_name).encode('utf-8')).hexdigest()[:12] if sheet_name is not None else 'active'
+
+
+def cache_dir(filepath, sheet_name=None):
+    """Dossier de la copie en colonnes d'une feuille : <dossier du fichier>/.columns/<fichier>-<feuille>"""
+    return os.path.join(os.path.dirname(filepath), CACHE_DIRNAME, f"{os.path.basename(filepath)}-{sheet_key(sheet_name)}")
+
+
+def _write_arrow(df, path):
+    """Écrit le DataFrame au format Arrow IPC (non compressé : lisible par projection mémoire)"""
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_arrow(path, nrows=None, writable=True):
+    """
+    Lit la copie Arrow par projection mémoire. Seuls les lots de lignes
+    couvrant les nrows premières lignes sont lus ; les colonnes sont converties
+    une à une (split_blocks, self_destruct : pas de bloc consolidé en double)
+    et les chaînes restent en mémoire Arrow (string[pyarrow], sans copie).
+    writable : colonnes numériques projetées (lecture seule) recopiées, pour
+    un DataFrame modifiable en place.
+    """
+    with pa.memory_map(path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        batches = []
+        total_rows = 0
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if nrows is None or total_rows < nrows:
+                batches.append(batch)
+            total_rows += batch.num_rows
+        table = pa.Table.from_batches(batches, schema=reader.schema)
+        if nrows is not None:
+            table = table.slice(0, nrows)
+
+        # Chaînes Arrow reprises telles quelles, hors de la conversion (qui en ferait des objets Python)
+        metadata = table.schema.pandas_metadata
+        fields = [field for field in metadata['columns'] if field['field_name'] not in metadata['index_columns']]
+        strings = [
+            (position, field['name'], pd.arrays.ArrowStringArray(table.column(field['field_name'])))
+            for position, field in enumerate(fields) if field['numpy_type'] == 'string'
+        ]
+        table = table.drop_columns([fields[position]['field_name'] for position, _, _ in strings])
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+
+    for position, name, values in strings:
+        df.insert(position, name, values, allow_duplicates=True)
+    if writable:
+        for i in range(len(df.columns)):
+            column = df.iloc[:, i]
+            if isinstance(column.dtype, np.dtype) and not column.to_numpy().flags.writeable:
+                df.isetitem(i, column.copy())
+    return df, total_rows
+
+
+def save(filepath, sheet_name, df, raw_columns, meta):
+    """
+    Enregistre la feuille analysée : DataFrame en colonnes (Arrow IPC si pyarrow
+    est installé et si toutes les colonnes sont convertibles, pickle sinon),
+    valeurs brutes des colonnes conservées et métadonnées (ligne d'en-têtes,
+    préambule, formats, schéma).
+    """
+    directory = cache_dir(filepath, sheet_name)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+
+    # Écrire dans un dossier temporaire puis le renommer : une copie est complète ou absente
+    tmp_directory = tempfile.mkdtemp(dir=os.path.dirname(directory), prefix='.tmp-')
+    try:
+        data_format = None
+        if pa is not None:
+            try:
+                _write_arrow(df, os.path.join(tmp_directory, ARROW_FILENAME))
+                data_format = 'arrow'
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+                # Colonnes de types mélangés : non représentables en Arrow
+                logger.debug("Copie Arrow impossible (%s), repli sur pickle", e)
+        if data_format is None:
+            df.to_pickle(os.path.join(tmp_directory, PICKLE_FILENAME))
+            data_format = 'pickle'
+
+        with open(os.path.join(tmp_directory, RAW_FILENAME), 'wb') as f:
+            pickle.dump(raw_columns, f, protocol=pickle.HIGHEST_PROTOCOL)
+        _write_meta(tmp_directory, dict(meta, format=data_format,
+                                        version=COLUMNAR_VERSION, source=_source_signature(filepath)))
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(tmp_directory, directory)
+    except OSError as e:
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        logger.warning("⚠️ Copie en colonnes non enregistrée: %s", e)
+        return False
+
+    logger.debug("💾 Copie en colonnes enregistrée (%s): %s", data_format, directory)
+    return True
+
+
+def _write_meta(directory, meta):
+    tmp_filepath = os.path.join(directory, f".{META_FILENAME}")
+    with open(tmp_filepath, 'wb') as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_filepath, os.path.join(directory, META_FILENAME))
+
+
+def _read_meta(filepath, sheet_name):
+    directory = cache_dir(filepath, sheet_name)
+    try:
+        with open(os.path.join(directory, META_FILENAME), 'rb') as f:
+            meta = pickle.load(f)
+        source = _source_signature(filepath)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None, None
+    # Copie obsolète (fichier modifié) ou d'une autre version du format
+    if meta.get('version') != COLUMNAR_VERSION or meta.get('source') != source:
+        return None, None
+    if meta.get('format') == 'arrow' and pa is None:
+        return None, None
+    return directory, meta
+
+
+def load(filepath, sheet_name=None, with_raw=True):
+    """Retourne (DataFrame, valeurs brutes, métadonnées) depuis la copie en colonnes, ou None"""
+    directory, meta = _read_meta(filepath, sheet_name)
+    if directory is None:
+        return None
+    try:
+        if meta['format'] == 'arrow':
+            df, _ = _read_arrow(os.path.join(directory, ARROW_FILENAME))
+        else:
+            df = pd.read_pickle(os.path.join(directory, PICKLE_FILENAME))
+        raw_columns = {}
+        if with_raw:
+            with open(os.path.join(directory, RAW_FILENAME), 'rb') as f:
+                raw_columns = pickle.load(f)
+    except Exception as e:
+        logger.warning("⚠️ Copie en colonnes illisible, relecture du classeur: %s", e)
+        return None
+    return df, raw_columns, meta
+
+
+def preview(filepath, sheet_name=None, nrows=5):
+    """Retourne (premières lignes, nombre total de lignes) depuis la copie en colonnes, ou None"""
+    directory, meta = _read_meta(filepath, sheet_name)
+    if directory is None:
+        return None
+    try:
+        if meta['format'] == 'arrow':
+            return _read_arrow(os.path.join(directory, ARROW_FILENAME), nrows, writable=False)
+        df = pd.read_pickle(os.path.join(directory, PICKLE_FILENAME))
+    except Exception as e:
+        logger.warning("⚠️ Copie en colonnes illisible: %s", e)
+        return None
+    return df.head(nrows), len(df)
+
+
+def update_meta(filepath, sheet_name, **values):
+    """Met à jour les métadonnées d'une copie existante (ex. schéma calculé après lecture)"""
+    directory, meta = _read_meta(filepath, sheet_name)
+    if directory is None:
+        return False
+    meta.update(values)
+    try:
+        _write_meta(directory, meta)
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,74 @@
+import logging
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = 'string[pyarrow]'
+except ImportError:  # pyarrow est facultatif : les textes variés restent en object
+    STRING_DTYPE = None
+
+logger = logging.getLogger(__name__)
+
+# Représentation compacte des colonnes d'un DataFrame :
+# - textes peu variés (devises, comptes, entités) : catégories
+# - autres textes : chaînes Arrow si pyarrow est installé
+# - nombres : plus petit type qui conserve exactement les valeurs
+
+# Part maximale de valeurs distinctes pour qu'une colonne texte devienne une catégorie
+CATEGORY_MAX_RATIO = 0.5
+
+
+def is_text(series):
+    """Colonne de texte, quelle que soit sa représentation (object, catégorie, chaînes Arrow)"""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return dtype.categories.dtype == object or isinstance(dtype.categories.dtype, pd.StringDtype)
+    return dtype == object or isinstance(dtype, pd.StringDtype)
+
+
+def object_values(series):
+    """Valeurs d'une colonne en tableau object, valeurs manquantes en NaN (jamais pd.NA)"""
+    if isinstance(series.dtype, pd.StringDtype):
+        return series.to_numpy(dtype=object, na_value=np.nan)
+    return series.to_numpy(dtype=object)
+
+
+def compact_column(series):
+    """Même colonne dans sa représentation la plus compacte (ou inchangée)"""
+    dtype = series.dtype
+
+    if pd.api.types.is_bool_dtype(dtype) or not isinstance(dtype, np.dtype):
+        return series
+
+    if pd.api.types.is_integer_dtype(dtype):
+        return pd.to_numeric(series, downcast='integer')
+
+    if pd.api.types.is_float_dtype(dtype):
+        # float32 seulement si toutes les valeurs y sont représentées exactement
+        if dtype != np.float32 and len(series):
+            narrow = series.astype(np.float32)
+            if ((narrow.astype(dtype) == series) | series.isna()).all():
+                return narrow
+        return series
+
+    if dtype == object and len(series) and pd.api.types.infer_dtype(series, skipna=True) == 'string':
+        if series.nunique(dropna=True) <= len(series) * CATEGORY_MAX_RATIO:
+            return series.astype('category')
+        if STRING_DTYPE is not None:
+            return series.astype(STRING_DTYPE)
+
+    return series
+
+
+def compact_frame(df):
+    """Convertit chaque colonne du DataFrame (modifié en place) dans sa représentation la plus compacte"""
+    before = df.memory_usage(deep=True).sum() if logger.isEnabledFor(logging.DEBUG) else None
+    for i in range(len(df.columns)):
+        compacted = compact_column(df.iloc[:, i])
+        if compacted.dtype != df.dtypes.iloc[i]:
+            df.isetitem(i, compacted)
+    if before is not None:
+        logger.debug("🗜️ Représentation compacte: %.1f Mo -> %.1f Mo",
+                     before / 1024 / 1024, df.memory_usage(deep=True).sum() / 1024 / 1024)
+    return df
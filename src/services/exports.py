@@ -0,0 +1,131 @@
+import io
+import os
+import zlib
+import logging
+import pandas as pd
+from src.services.json_records import iter_json, NDJSON_CONTENT_TYPE
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:  # pyarrow est facultatif : export Parquet indisponible sans lui
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Formats de sortie du fichier traité : classeur formaté (openpyxl) ou données
+# seules, écrites directement depuis le DataFrame traité, sans mise en forme
+XLSX = 'xlsx'
+CSV = 'csv'
+PARQUET = 'parquet'
+NDJSON = 'ndjson'
+# Parquet proposé seulement si pyarrow est installé
+FORMATS = (XLSX, CSV, NDJSON) + ((PARQUET,) if PARQUET_AVAILABLE else ())
+
+# Formats texte : écrits par blocs de lignes, compression gzip possible
+TEXT_FORMATS = (CSV, NDJSON)
+
+# Nombre de lignes converties et écrites à la fois
+EXPORT_CHUNK_ROWS = 10000
+
+# Niveau de compression gzip (celui de gzip par défaut)
+GZIP_LEVEL = 6
+
+CONTENT_TYPES = {
+    XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    CSV: 'text/csv',
+    PARQUET: 'application/vnd.apache.parquet',
+    NDJSON: NDJSON_CONTENT_TYPE
+}
+GZIP_CONTENT_TYPE = 'application/gzip'
+
+
+def check_format(output, compress=False):
+    """Vérifie un format demandé ; ValueError (message destiné au client) sinon"""
+    if output == PARQUET and not PARQUET_AVAILABLE:
+        raise ValueError("Format parquet indisponible : pyarrow n'est pas installé")
+    if output not in FORMATS:
+        raise ValueError(f"Format non pris en charge: {output} ({', '.join(FORMATS)})")
+    if compress and output not in TEXT_FORMATS:
+        raise ValueError(f"Compression gzip disponible pour {' et '.join(TEXT_FORMATS)} seulement")
+
+
+def export_filename(filename, output, compress=False):
+    """Nom du fichier exporté : même nom, extension du format (.gz si compressé)"""
+    if output == XLSX:
+        return filename
+    name = f"{os.path.splitext(filename)[0]}.{output}"
+    return f"{name}.gz" if compress else name
+
+
+def content_type(filename):
+    """Type MIME d'un fichier exporté, d'après son extension"""
+    if filename.endswith('.gz'):
+        return GZIP_CONTENT_TYPE
+    return CONTENT_TYPES.get(os.path.splitext(filename)[1].lstrip('.'), 'application/octet-stream')
+
+
+def _csv_chunks(df, chunk_rows):
+    for start in range(0, max(len(df), 1), chunk_rows):
+        buffer = io.StringIO()
+        df.iloc[start:start + chunk_rows].to_csv(buffer, index=False, header=start == 0)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _ndjson_chunks(df, chunk_rows):
+    for text in iter_json(df, ndjson=True, chunk_rows=chunk_rows):
+        yield text.encode('utf-8')
+
+
+def _parquet_frame(df):
+    """DataFrame accepté par pyarrow : noms de colonnes en texte, colonnes de types mélangés en texte"""
+    frame = df.copy(deep=False)
+    frame.columns = [str(col_name) for col_name in df.columns]
+    for i in range(len(frame.columns)):
+        series = frame.iloc[:, i]
+        if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) not in (
+                'string', 'empty', 'integer', 'floating', 'boolean', 'datetime', 'date'):
+            frame.isetitem(i, series.map(str, na_action='ignore'))
+    return frame
+
+
+def gzip_chunks(chunks):
+    """Compression gzip en flux d'une suite de blocs d'octets"""
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(df, output, compress=False, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Contenu du DataFrame dans un format de données (csv, ndjson, parquet), en
+    blocs d'octets : les formats texte sont convertis par blocs de chunk_rows
+    lignes, le fichier Parquet (pied de fichier écrit à la fin) d'un seul tenant.
+    """
+    check_format(output, compress)
+    if output == CSV:
+        chunks = _csv_chunks(df, chunk_rows)
+    elif output == NDJSON:
+        chunks = _ndjson_chunks(df, chunk_rows)
+    elif output == PARQUET:
+        chunks = iter([_parquet_frame(df).to_parquet(index=False)])
+    else:
+        raise ValueError(f"Format non exportable en flux: {output}")
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def write_export(df, filepath, output, compress=False, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Écrit le DataFrame dans un format de données ; retourne la taille du fichier"""
+    if output == PARQUET:
+        check_format(output, compress)
+        _parquet_frame(df).to_parquet(filepath, index=False)
+    else:
+        with open(filepath, 'wb') as f:
+            for chunk in iter_export(df, output, compress, chunk_rows):
+                f.write(chunk)
+    size = os.path.getsize(filepath)
+    logger.debug("📤 Export %s%s: %d lignes, %d octets", output, ' (gzip)' if compress else '', len(df), size)
+    return size
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import logging
+import uuid
+import datetime
+import threading
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import create_engine
+from werkzeug.http import http_date
+from src.models.job import Job
+from src.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Mesures conservées par étape dans la réponse (timings) et les métriques
+TIMING_KEYS = ('seconds', 'rows', 'columns', 'bytes_in', 'bytes_out')
+
+_executor = None
+_executor_lock = threading.Lock()
+_engines = {}
+
+# Taille du pool de jobs, connue dans ses workers (None hors du pool)
+_job_pool_size = None
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def get_executor(max_workers=None):
+    """Pool de processus partagé par toutes les requêtes (créé à la première utilisation)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = max_workers or os.cpu_count() or 1
+            _executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_job_worker,
+                                            initargs=(max_workers,))
+        return _executor
+
+
+def _init_job_worker(pool_size):
+    global _job_pool_size
+    _job_pool_size = pool_size
+
+
+def inner_workers(tasks, requested=None):
+    """
+    Nombre de workers d'un pool ouvert par un job (feuilles d'un classeur,
+    classeurs d'un lot) : au plus la part de cœurs du job (cœurs // JOB_WORKERS),
+    pour ne pas lancer plus de processus que de cœurs quand tous les jobs
+    tournent. Retourne 1 (traitement en série) en dessous de 2.
+    """
+    cpus = os.cpu_count() or 1
+    share = max(1, cpus // _job_pool_size) if _job_pool_size else cpus
+    workers = min(tasks, requested or share, share)
+    return workers if workers >= 2 else 1
+
+
+def reset_executor(executor):
+    """Abandonne un pool cassé (worker arrêté brutalement) : le suivant est recréé à la demande"""
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            return
+        _executor = None
+    logger.warning("⚠️ Pool de workers cassé, il sera recréé au prochain job")
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _engine(db_uri):
+    # Un moteur par processus : les workers n'ont pas de contexte Flask
+    if db_uri not in _engines:
+        _engines[db_uri] = create_engine(db_uri)
+    return _engines[db_uri]
+
+
+def update_job(db_uri, job_id, **values):
+    """Met à jour une ligne de la table job depuis n'importe quel processus"""
+    values['updated_at'] = datetime.datetime.utcnow()
+    table = Job.__table__
+    with _engine(db_uri).begin() as conn:
+        conn.execute(table.update().where(table.c.id == job_id).values(**values))
+
+
+def json_default(value):
+    """Sérialise les dates comme le fait jsonify"""
+    if isinstance(value, datetime.date):
+        return http_date(value)
+    return str(value)
+
+
+class StageTracker:
+    """Suit les étapes d'un traitement : durée et nombre de lignes de chacune"""
+
+    def __init__(self):
+        self.stages = {}
+        self.current = None
+
+    @contextmanager
+    def stage(self, name):
+        record = {'status': 'running', 'rows': None}
+        self.stages[name] = record
+        self.current = name
+        self._changed()
+        started = time.perf_counter()
+        try:
+            yield record
+        except Exception:
+            record['status'] = 'error'
+            raise
+        else:
+            record['status'] = 'done'
+        finally:
+            record['seconds'] = round(time.perf_counter() - started, 3)
+            self._changed()
+
+    def record(self, name, values):
+        """Enregistre une étape déjà terminée (ex. mesurée dans un autre processus)"""
+        self.stages[name] = dict(values, status='done')
+        self.current = name
+        self._changed()
+
+    def _changed(self):
+        pass
+
+    def timings(self):
+        """Durée, lignes, colonnes et octets de chaque étape terminée"""
+        return {
+            name: {key: record[key] for key in TIMING_KEYS if record.get(key) is not None}
+            for name, record in self.stages.items()
+        }
+
+
+class JobProgress(StageTracker):
+    """StageTracker qui enregistre chaque changement d'étape dans la table job"""
+
+    def __init__(self, db_uri, job_id):
+        super().__init__()
+        self.db_uri = db_uri
+        self.job_id = job_id
+
+    def _changed(self):
+        record = self.stages[self.current]
+        update_job(
+            self.db_uri, self.job_id,
+            status='running',
+            stage=self.current,
+            rows=record['rows'],
+            progress=json.dumps(self.stages)
+        )
+
+
+def run_job(db_uri, job_id, func, args):
+    """
+    Exécute func(*args, progress=...) dans un worker et enregistre le résultat.
+    Retourne le statut et les mesures des étapes au processus principal.
+    """
+    progress = JobProgress(db_uri, job_id)
+    try:
+        result = func(*args, progress=progress)
+        update_job(db_uri, job_id, status='done', result=json.dumps(result, default=json_default))
+        status = 'done'
+    except Exception as e:
+        logger.exception("Erreur détaillée (job %s): %s", job_id, e)
+        update_job(db_uri, job_id, status='error', error=f'Erreur lors du traitement: {str(e)}')
+        status = 'error'
+    return {'status': status, 'timings': progress.timings()}
+
+
+def _job_finished(db_uri, job_id, executor, future):
+    # Exécuté dans le processus principal, qui expose les métriques
+    try:
+        outcome = future.result()
+    except Exception as e:
+        # Worker arrêté avant la fin (ex. tué) : run_job n'a pas pu enregistrer l'erreur
+        logger.exception("Le worker s'est arrêté avant la fin du job %s", job_id)
+        metrics.JOBS.inc('error')
+        try:
+            update_job(db_uri, job_id, status='error', error=f'Traitement interrompu: {str(e) or type(e).__name__}')
+        except Exception:
+            logger.exception("Job %s non marqué en erreur", job_id)
+        if isinstance(e, BrokenProcessPool):
+            reset_executor(executor)
+        return
+    metrics.observe_stages(outcome['timings'])
+    metrics.JOBS.inc(outcome['status'])
+
+
+def submit_job(db_uri, job_id, func, *args, max_workers=None):
+    """
+    Envoie le traitement au pool de processus et rend la main immédiatement.
+    Un pool cassé est recréé une fois ; si l'envoi échoue, le job est marqué en erreur.
+    """
+    try:
+        executor = get_executor(max_workers)
+        try:
+            future = executor.submit(run_job, db_uri, job_id, func, args)
+        except (BrokenProcessPool, RuntimeError):
+            # Pool cassé par un worker arrêté (ou abandonné entre-temps) : nouveau pool
+            reset_executor(executor)
+            executor = get_executor(max_workers)
+            future = executor.submit(run_job, db_uri, job_id, func, args)
+    except Exception as e:
+        update_job(db_uri, job_id, status='error', error=f'Traitement non lancé: {str(e)}')
+        raise
+    future.add_done_callback(partial(_job_finished, db_uri, job_id, executor))
+    return future
@@ -0,0 +1,115 @@
+import json
+import math
+import datetime
+import numpy as np
+import pandas as pd
+
+# Sérialisation JSON des lignes d'un DataFrame : les valeurs sont converties
+# colonne par colonne (NaN/NaT et infinis -> null, scalaires numpy -> valeurs
+# Python, dates -> ISO 8601), et seules les lignes renvoyées sont converties.
+
+# Nombre de lignes converties et envoyées à la fois dans une réponse en flux
+JSON_CHUNK_ROWS = 5000
+
+JSON_CONTENT_TYPE = 'application/json'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def json_scalar(value):
+    """Valeur isolée sérialisable en JSON (colonnes de types mélangés)"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        # NaN et ±inf n'existent pas en JSON
+        return value if math.isfinite(value) else None
+    if isinstance(value, (datetime.date, datetime.time)):
+        return None if value is pd.NaT else value.isoformat()
+    if value is pd.NA:
+        return None
+    return str(value)
+
+
+def _fill_missing(values, mask):
+    """Remplace par None les positions manquantes d'une liste de valeurs"""
+    for i in np.flatnonzero(mask):
+        values[i] = None
+    return values
+
+
+def column_values(series):
+    """Liste des valeurs d'une colonne, sérialisables en JSON, convertie d'un seul tenant"""
+    dtype = series.dtype
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Catégories converties une seule fois, puis lues par leur code
+        categories = column_values(pd.Series(dtype.categories))
+        categories.append(None)
+        return [categories[code] for code in series.cat.codes.to_numpy()]
+
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        mask = series.isna().to_numpy()
+        if getattr(dtype, 'tz', None) is None:
+            # Dates sans fuseau : conversion vectorisée, microsecondes seulement si
+            # elles sont non nulles (comme isoformat)
+            values = series.to_numpy()
+            seconds = values.astype('datetime64[s]')
+            microseconds = values.astype('datetime64[us]')
+            text = np.where(microseconds != seconds,
+                            np.datetime_as_string(microseconds, unit='us'),
+                            np.datetime_as_string(seconds, unit='s'))
+        else:
+            text = series.map(lambda value: value.isoformat(), na_action='ignore').to_numpy()
+        return _fill_missing(text.tolist(), mask)
+
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_float_dtype(dtype):
+        mask = series.isna().to_numpy()
+        if pd.api.types.is_float_dtype(dtype):
+            # NaN et ±inf n'existent pas en JSON
+            mask = mask | np.isinf(series.to_numpy(dtype='float64', na_value=np.nan))
+        if not isinstance(dtype, np.dtype):
+            # Types pandas nullables (Int64, boolean, Float64) : valeurs manquantes masquées
+            values = series.to_numpy(dtype=object, na_value=None).tolist()
+        else:
+            values = series.to_numpy().tolist()
+        return _fill_missing(values, mask)
+
+    values = series.to_numpy(dtype=object)
+    mask = pd.isna(values)
+    if pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+        return _fill_missing(values.tolist(), mask)
+    # Colonne de types mélangés : conversion valeur par valeur des seules valeurs présentes
+    result = [None] * len(values)
+    for i in np.flatnonzero(~mask):
+        result[i] = json_scalar(values[i])
+    return result
+
+
+def to_records(df):
+    """Lignes du DataFrame sous forme de dictionnaires sérialisables en JSON"""
+    names = [str(col_name) for col_name in df.columns]
+    columns = [column_values(df.iloc[:, i]) for i in range(len(names))]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def iter_json(df, ndjson=False, chunk_rows=JSON_CHUNK_ROWS):
+    """
+    Texte JSON des lignes du DataFrame, produit par blocs de chunk_rows lignes :
+    un tableau JSON, ou une ligne JSON par ligne du DataFrame (NDJSON).
+    """
+    if not ndjson:
+        yield '['
+    first = True
+    for start in range(0, len(df), chunk_rows):
+        lines = [
+            json.dumps(record, ensure_ascii=False, allow_nan=False)
+            for record in to_records(df.iloc[start:start + chunk_rows])
+        ]
+        if ndjson:
+            yield '\n'.join(lines) + '\n'
+        else:
+            yield ('' if first else ',') + ','.join(lines)
+        first = False
+    if not ndjson:
+        yield ']'
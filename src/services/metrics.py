@@ -0,0 +1,101 @@
+import math
+import threading
+
+# Bornes des histogrammes (la borne +Inf est ajoutée automatiquement)
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+ROWS_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+COLUMNS_BUCKETS = (5, 10, 20, 50, 100)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Histogram:
+    """Histogramme cumulatif par étiquette, au format Prometheus"""
+
+    def __init__(self, name, description, buckets, label='stage'):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.setdefault(label_value, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, series in sorted(self._series.items()):
+                label = f'{self.label}="{label_value}"'
+                for bound, count in zip(self.buckets, series['counts']):
+                    lines.append(f'{self.name}_bucket{{{label},le="{_format_value(bound)}"}} {count}')
+                lines.append(f'{self.name}_sum{{{label}}} {_format_value(series["sum"])}')
+                lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return lines
+
+
+class Counter:
+    """Compteur par étiquette, au format Prometheus"""
+
+    def __init__(self, name, description, label):
+        self.name = name
+        self.description = description
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_value, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value}')
+        return lines
+
+
+# Mesures enregistrées pour chaque étape, par clé du relevé de l'étape
+STAGE_HISTOGRAMS = {
+    'seconds': Histogram('excel_stage_duration_seconds', "Durée des étapes du traitement", DURATION_BUCKETS),
+    'rows': Histogram('excel_stage_rows', "Lignes traitées par étape", ROWS_BUCKETS),
+    'columns': Histogram('excel_stage_columns', "Colonnes traitées par étape", COLUMNS_BUCKETS),
+    'bytes_in': Histogram('excel_stage_bytes_in', "Octets lus par étape", BYTES_BUCKETS),
+    'bytes_out': Histogram('excel_stage_bytes_out', "Octets écrits par étape", BYTES_BUCKETS),
+}
+
+JOBS = Counter('excel_jobs_total', "Traitements terminés par statut", label='status')
+
+
+def observe_stages(stages):
+    """Enregistre les relevés d'un StageTracker ({étape: {seconds, rows, ...}})"""
+    for name, record in stages.items():
+        for key, histogram in STAGE_HISTOGRAMS.items():
+            if record.get(key) is not None:
+                histogram.observe(name, record[key])
+
+
+def render():
+    """Toutes les mesures au format texte Prometheus"""
+    lines = []
+    for histogram in STAGE_HISTOGRAMS.values():
+        lines.extend(histogram.render())
+    lines.extend(JOBS.render())
+    return '\n'.join(lines) + '\n'
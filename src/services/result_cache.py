@@ -0,0 +1,114 @@
+import os
+import logging
+import json
+import shutil
+import hashlib
+import tempfile
+from src.services.jobs import json_default
+
+logger = logging.getLogger(__name__)
+
+# Taille des blocs lus pour le calcul des empreintes
+HASH_CHUNK_SIZE = 1024 * 1024
+
+RESULT_FILENAME = 'result.json'
+# Fichier traité d'une entrée : processed + extension du format (.xlsx, .csv.gz...)
+OUTPUT_STEM = 'processed'
+
+
+def file_sha256(filepath):
+    """Empreinte SHA-256 d'un fichier, lue par blocs"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def output_filename(processed_filepath):
+    """Nom du fichier traité dans une entrée : extension du format conservée (.csv.gz compris)"""
+    stem, ext = os.path.splitext(os.path.basename(processed_filepath))
+    if ext == '.gz':
+        ext = os.path.splitext(stem)[1] + ext
+    return OUTPUT_STEM + ext
+
+
+def cache_key(file_hash, *versions):
+    """Clé d'un résultat : contenu du fichier + versions des règles et du formatage"""
+    version = hashlib.sha256('|'.join(str(v) for v in versions).encode('utf-8')).hexdigest()[:12]
+    return f"{file_hash}-{version}"
+
+
+class ResultCache:
+    """
+    Cache des fichiers traités, adressé par contenu.
+
+    Chaque entrée est un dossier <clé>/ contenant le fichier traité et le JSON
+    retourné au client. La date de modification du dossier sert d'horodatage
+    LRU : les entrées les moins récemment utilisées sont supprimées dès que la
+    taille totale dépasse max_bytes.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.folder, key)
+
+    def get(self, key):
+        """Retourne (chemin du fichier traité, résultat) ou None"""
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, RESULT_FILENAME), encoding='utf-8') as f:
+                result = json.load(f)
+            output_names = [name for name in os.listdir(entry) if name.startswith(OUTPUT_STEM + '.')]
+            os.utime(entry)  # Marquer l'entrée comme récemment utilisée
+        except (OSError, ValueError):
+            return None
+        if not output_names:
+            return None
+        return os.path.join(entry, output_names[0]), result
+
+    def put(self, key, processed_filepath, result):
+        """Enregistre un résultat puis applique la limite de taille"""
+        entry = self._entry(key)
+        if os.path.isdir(entry):
+            return
+
+        # Écrire dans un dossier temporaire puis le renommer : une entrée est complète ou absente
+        tmp_entry = tempfile.mkdtemp(dir=self.folder, prefix='.tmp-')
+        try:
+            shutil.copyfile(processed_filepath, os.path.join(tmp_entry, output_filename(processed_filepath)))
+            with open(os.path.join(tmp_entry, RESULT_FILENAME), 'w', encoding='utf-8') as f:
+                json.dump(result, f, default=json_default)
+            os.rename(tmp_entry, entry)
+        except OSError:
+            # Une autre requête a enregistré la même entrée entre-temps
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de max_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.folder):
+            entry = self._entry(name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            try:
+                size = sum(entry_file.stat().st_size for entry_file in os.scandir(entry))
+                entries.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                continue
+            total += size
+
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logger.info("🗑️ Entrée de cache supprimée: %s", os.path.basename(entry))
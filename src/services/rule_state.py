@@ -0,0 +1,170 @@
+import os
+import pickle
+import logging
+import numpy as np
+import pandas as pd
+from src.services.columnar_cache import sheet_key
+from src.services.rules import evaluate_rules, assign_rules, assign_extraction, empty_column
+
+logger = logging.getLogger(__name__)
+
+# Version du format de l'état : à incrémenter si son contenu change
+STATE_VERSION = 1
+
+# Dossier des états, à côté du fichier uploadé (indépendant du nom du fichier :
+# une nouvelle version du relevé reprend l'état de la précédente)
+STATE_DIRNAME = '.rules'
+
+# Combinaison des empreintes de colonnes en une empreinte de ligne
+_HASH_SEED = np.uint64(3430008)
+_HASH_MULTIPLIER = np.uint64(1000003)
+
+# État du traitement incrémental d'une feuille :
+# - columns : colonnes du DataFrame lu (état ignoré si elles changent)
+# - keys : empreintes (triées, uniques) du contenu des lignes
+# - rules : {règle: (version, masque aligné sur keys)}
+# - extractions : {extraction: (version, empreintes de la colonne source,
+#   valeurs extraites, numéro du motif trouvé)}
+
+
+def state_path(filepath, sheet_name=None):
+    """Fichier de l'état d'une feuille : <dossier du fichier>/.rules/<feuille>.pkl"""
+    return os.path.join(os.path.dirname(filepath), STATE_DIRNAME, f"{sheet_key(sheet_name)}.pkl")
+
+
+def load(path):
+    """État enregistré, ou None (absent, illisible ou d'une autre version)"""
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+        return None
+    return state
+
+
+def save(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Remplacement (et non réécriture) : les liens physiques d'un retraitement restent intacts
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("⚠️ État des règles non enregistré: %s", e)
+        return False
+    return True
+
+
+def column_hashes(series):
+    """Empreinte (uint64) de chaque valeur d'une colonne, type compris pour les colonnes mélangées"""
+    hashes = pd.util.hash_pandas_object(series, index=False).to_numpy()
+    if series.dtype == object and pd.api.types.infer_dtype(series, skipna=False) != 'string':
+        # 1 et '1' ont la même représentation texte mais pas le même résultat
+        types = pd.util.hash_array(series.map(lambda value: type(value).__name__).to_numpy(dtype=object))
+        hashes = hashes ^ (types * _HASH_MULTIPLIER)
+    return hashes
+
+
+def row_hashes(df):
+    """Empreinte (uint64) du contenu de chaque ligne"""
+    hashes = np.full(len(df), _HASH_SEED, dtype=np.uint64)
+    for i in range(len(df.columns)):
+        hashes = (hashes ^ column_hashes(df.iloc[:, i])) * _HASH_MULTIPLIER
+    return hashes
+
+
+def _lookup(known_keys, keys):
+    """Position de chaque empreinte dans known_keys (triées) et masque des empreintes connues"""
+    if len(known_keys) == 0:
+        return np.zeros(len(keys), dtype=np.intp), np.zeros(len(keys), dtype=bool)
+    positions = np.minimum(np.searchsorted(known_keys, keys), len(known_keys) - 1)
+    return positions, known_keys[positions] == keys
+
+
+def apply_incremental(rule_set, df, state=None):
+    """
+    Applique les règles et les extractions (DataFrame modifié en place) en
+    reprenant les résultats de l'état précédent : une règle n'est évaluée que
+    si sa version a changé, et seulement sur les lignes nouvelles ou modifiées.
+    Retourne (lignes par règle, lignes par motif d'extraction, nouvel état, statistiques).
+    """
+    columns = list(df.columns)
+    if state is not None and state.get('columns') != columns:
+        state = None
+    state = state or {'keys': np.empty(0, dtype=np.uint64), 'rules': {}, 'extractions': {}}
+
+    keys, first, inverse = np.unique(row_hashes(df), return_index=True, return_inverse=True)
+    positions, known = _lookup(state['keys'], keys)
+    stats = {'rows': len(df), 'new_rows': int((~known[inverse]).sum()), 'rules_evaluated': {}}
+
+    # Règles : masques repris pour les lignes connues des règles inchangées
+    key_masks = {}
+    pending = {}
+    for rule in rule_set.rules:
+        if not rule.applies_to(df):
+            continue
+        cached = state['rules'].get(rule.name)
+        key_masks[rule.name] = np.zeros(len(keys), dtype=bool)
+        if cached is not None and cached[0] == rule.version:
+            key_masks[rule.name][known] = cached[1][positions[known]]
+            if not known.all():
+                pending[rule.name] = ~known
+        else:
+            pending[rule.name] = np.ones(len(keys), dtype=bool)
+
+    if pending:
+        # Une seule évaluation (lignes distinctes) pour toutes les règles à recalculer
+        needed = np.flatnonzero(np.logical_or.reduce(list(pending.values())))
+        masks = evaluate_rules(rule_set, df.iloc[first[needed]], names=set(pending))
+        for name in pending:
+            key_masks[name][needed] = masks[name]
+            stats['rules_evaluated'][name] = len(needed)
+
+    rule_hits = assign_rules(rule_set, df, {name: key_mask[inverse] for name, key_mask in key_masks.items()})
+    new_state = {
+        'version': STATE_VERSION,
+        'columns': columns,
+        'keys': keys,
+        'rules': {rule.name: (rule.version, key_masks[rule.name]) for rule in rule_set.rules if rule.name in key_masks},
+        'extractions': {}
+    }
+
+    # Extractions : résultats repris par valeur de la colonne source (après les règles)
+    extraction_hits = {}
+    for extraction in rule_set.extractions:
+        if not extraction.enabled or extraction.column not in df.columns:
+            continue
+        if extraction.target not in df.columns:
+            df[extraction.target] = empty_column(df)
+
+        series = df[extraction.column]
+        value_keys, value_first, value_inverse = np.unique(column_hashes(series), return_index=True, return_inverse=True)
+        values = np.full(len(value_keys), np.nan, dtype=object)
+        matched_pattern = np.full(len(value_keys), -1, dtype=np.int8)
+
+        cached = state['extractions'].get(extraction.name)
+        if cached is not None and cached[0] == extraction.version:
+            value_positions, value_known = _lookup(cached[1], value_keys)
+            values[value_known] = cached[2][value_positions[value_known]]
+            matched_pattern[value_known] = cached[3][value_positions[value_known]]
+        else:
+            value_known = np.zeros(len(value_keys), dtype=bool)
+
+        needed = np.flatnonzero(~value_known)
+        if len(needed):
+            needed_values, needed_patterns = extraction.match(series.iloc[value_first[needed]])
+            values[needed] = needed_values.to_numpy()
+            matched_pattern[needed] = needed_patterns
+            stats['rules_evaluated'][extraction.name] = len(needed)
+
+        row_pattern = matched_pattern[value_inverse]
+        pattern_hits = extraction.hits(row_pattern)
+        assign_extraction(extraction, df, pd.Series(values[value_inverse], index=df.index),
+                          row_pattern >= 0, pattern_hits)
+        extraction_hits[extraction.name] = pattern_hits
+        new_state['extractions'][extraction.name] = (extraction.version, value_keys, values, matched_pattern)
+
+    return rule_hits, extraction_hits, new_state, stats
@@ -0,0 +1,460 @@
+import os
+import logging
+import re
+import json
+import hashlib
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.services.compact import is_text
+from src.services.jobs import inner_workers
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:  # pyahocorasick est facultatif : repli sur une expression réunissant les mots-clés
+    AHOCORASICK_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pyarrow est facultatif : pas de colonnes string[pyarrow] sans lui
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Fichier de règles utilisé par défaut (surchargeable par la variable RULES_FILE)
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'rules', 'default_rules.json')
+
+# Évaluation par blocs sur un pool de processus (RULE_WORKERS) : à partir de ce nombre de lignes
+PARALLEL_MIN_ROWS = 200000
+
+# Taille des blocs de lignes envoyés aux workers
+CHUNK_ROWS = 100000
+
+# Séparateur des valeurs parcourues ensemble par l'automate des mots-clés
+SEPARATOR = '\x00'
+
+
+class Condition:
+    """
+    Condition sur une colonne. Types pris en charge :
+    contains (texte, insensible à la casse), regex, equals, min/max (montants).
+    """
+
+    def __init__(self, definition):
+        self.column = definition['column']
+        self.case_sensitive = definition.get('case_sensitive', False)
+        self.contains = definition.get('contains')
+        self.equals = definition.get('equals')
+        self.min = definition.get('min')
+        self.max = definition.get('max')
+        self.regex = None
+        if definition.get('regex') is not None:
+            flags = 0 if self.case_sensitive else re.IGNORECASE
+            self.regex = re.compile(definition['regex'], flags)
+
+        if (self.contains is None and self.regex is None and self.equals is None
+                and self.min is None and self.max is None):
+            raise ValueError(f"Condition sans critère sur la colonne {self.column}")
+
+    def evaluate(self, series, keyword_masks):
+        """Masque booléen (numpy) des lignes qui vérifient la condition"""
+        mask = np.ones(len(series), dtype=bool)
+        if self.contains is not None:
+            mask &= keyword_masks[(self.column, self.contains, self.case_sensitive)]
+        if self.regex is not None:
+            codes, values = _distinct(series)
+            matched = pd.Series(values, dtype=object).str.contains(self.regex, na=False).to_numpy(dtype=bool)
+            mask &= _per_row(matched, codes, False)
+        if self.equals is not None:
+            mask &= (series == self.equals).to_numpy(dtype=bool, na_value=False)
+        if self.min is not None or self.max is not None:
+            amounts = _amounts(series)
+            if self.min is not None:
+                mask &= (amounts >= self.min).to_numpy(dtype=bool, na_value=False)
+            if self.max is not None:
+                mask &= (amounts <= self.max).to_numpy(dtype=bool, na_value=False)
+        return mask
+
+
+def definition_version(definition):
+    """Version d'une définition (règle, extraction ou fichier entier) : empreinte de son contenu"""
+    canonical = json.dumps(definition, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]
+
+
+class Rule:
+    """Règle : si toutes les conditions sont vérifiées, les colonnes cibles reçoivent une valeur"""
+
+    def __init__(self, definition):
+        self.name = definition['name']
+        self.version = definition_version(definition)
+        self.enabled = definition.get('enabled', True)
+        self.conditions = [Condition(condition) for condition in definition.get('when', [])]
+        self.create_columns = definition.get('create_columns', [])
+        self.values = definition.get('set', {})
+        if not self.conditions:
+            raise ValueError(f"La règle {self.name} n'a aucune condition")
+
+    @property
+    def columns(self):
+        return {condition.column for condition in self.conditions}
+
+    def applies_to(self, df):
+        return self.enabled and self.columns.issubset(df.columns)
+
+
+class KeywordMatcher:
+    """
+    Recherche simultanée de plusieurs mots-clés dans une colonne.
+
+    Chaque valeur distincte de la colonne n'est examinée qu'une fois, puis son
+    résultat est recopié sur ses lignes. Avec pyahocorasick (facultatif), un
+    automate d'Aho-Corasick trouve tous les mots-clés d'une valeur en un seul
+    passage ; sans lui, une expression réunissant tous les mots-clés repère les
+    valeurs candidates, puis chaque mot-clé n'est testé que sur celles-ci.
+    Les colonnes string[pyarrow] (textes variés) sont parcourues par les
+    fonctions de recherche d'Arrow, sans conversion en objets Python.
+    """
+
+    def __init__(self, keywords, case_sensitive=False):
+        self.keywords = sorted(set(keywords), key=len, reverse=True)
+        self.case_sensitive = case_sensitive
+        self.automaton = None
+        if AHOCORASICK_AVAILABLE and all(self.keywords) and not any(SEPARATOR in k for k in self.keywords):
+            # Sans la casse : mots-clés et valeurs comparés en minuscules ; plusieurs
+            # mots-clés peuvent alors donner le même mot de l'automate
+            words = list(dict.fromkeys(self._fold(keyword) for keyword in self.keywords))
+            self.word_of = np.array([words.index(self._fold(keyword)) for keyword in self.keywords], dtype=np.intp)
+            self.automaton = ahocorasick.Automaton()
+            for i, word in enumerate(words):
+                self.automaton.add_word(word, i)
+            self.automaton.make_automaton()
+        else:
+            flags = 0 if case_sensitive else re.IGNORECASE
+            self.pattern = re.compile('|'.join(re.escape(keyword) for keyword in self.keywords), flags)
+
+    def _fold(self, text):
+        return text if self.case_sensitive else text.lower()
+
+    def match(self, series):
+        """Retourne {mot-clé: masque booléen numpy}"""
+        strings = _arrow_strings(series)
+        if strings is not None:
+            return {
+                keyword: pc.match_substring(strings, keyword, ignore_case=not self.case_sensitive)
+                .fill_null(False).to_numpy(zero_copy_only=False)
+                for keyword in self.keywords
+            }
+
+        codes, values = _distinct(series)
+        # Une ligne de plus, toujours fausse : valeurs manquantes (code -1)
+        found = np.zeros((len(values) + 1, len(self.keywords)), dtype=bool)
+        if self.automaton is not None:
+            found[:-1] = self._search(values)
+        elif len(values):
+            text = pd.Series(values, dtype=object)
+            candidates = np.flatnonzero(text.str.contains(self.pattern, na=False).to_numpy(dtype=bool))
+            candidate_text = text.iloc[candidates]
+            for j, keyword in enumerate(self.keywords):
+                found[candidates, j] = candidate_text.str.contains(
+                    keyword, case=self.case_sensitive, regex=False, na=False
+                ).to_numpy(dtype=bool)
+
+        rows = found[codes]
+        return {keyword: rows[:, j] for j, keyword in enumerate(self.keywords)}
+
+    def _search(self, values):
+        """
+        Parcourt toutes les valeurs distinctes en un seul passage de l'automate :
+        valeurs réunies par un séparateur absent des mots-clés, chaque occurrence
+        rattachée à sa valeur par sa position de fin.
+        """
+        texts = [self._fold(value) if isinstance(value, str) else '' for value in values]
+        separators = np.cumsum(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)) + 1) - 1
+        hits = np.array(list(self.automaton.iter(SEPARATOR.join(texts))), dtype=np.int64).reshape(-1, 2)
+        found_words = np.zeros((len(values), len(self.automaton)), dtype=bool)
+        found_words[np.searchsorted(separators, hits[:, 0]), hits[:, 1]] = True
+        return found_words[:, self.word_of]
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(regex, case_sensitive=False):
+    """Compile un motif une seule fois par processus ; le motif entier sert de groupe s'il n'en a pas"""
+    flags = 0 if case_sensitive else re.IGNORECASE
+    pattern = re.compile(regex, flags)
+    if pattern.groups == 0:
+        pattern = re.compile(f'({regex})', flags)
+    return pattern
+
+
+class Extraction:
+    """
+    Extraction d'une valeur (ex. référence) d'une colonne texte vers une colonne cible.
+
+    Les motifs sont essayés par ordre de priorité sur les valeurs distinctes de
+    la colonne : chaque motif n'est appliqué qu'aux valeurs où les motifs
+    précédents n'ont rien trouvé, si bien que le coût total reste proche d'un
+    seul passage sur ces valeurs. Le résultat est recopié sur les lignes.
+    """
+
+    def __init__(self, definition):
+        self.name = definition['name']
+        self.version = definition_version(definition)
+        self.enabled = definition.get('enabled', True)
+        self.column = definition['column']
+        self.target = definition['target']
+        case_sensitive = definition.get('case_sensitive', False)
+        self.patterns = [
+            (pattern.get('name', pattern['regex']), compile_pattern(pattern['regex'], case_sensitive))
+            for pattern in definition['patterns']
+        ]
+
+    def match(self, series):
+        """Retourne (valeurs extraites, numéro du motif trouvé par ligne ou -1)"""
+        codes, distinct = _distinct(series)
+        text = pd.Series(distinct, dtype=object)
+        values = np.full(len(distinct), np.nan, dtype=object)
+        matched_pattern = np.full(len(distinct), -1, dtype=np.int8)
+
+        for i, (_, pattern) in enumerate(self.patterns):
+            remaining = np.flatnonzero(matched_pattern < 0)
+            extracted = text.iloc[remaining].str.extract(pattern, expand=True).iloc[:, 0]
+            matched = extracted.notna().to_numpy(dtype=bool)
+            positions = remaining[matched]
+            values[positions] = extracted[matched].to_numpy()
+            matched_pattern[positions] = i
+
+        return (pd.Series(_per_row(values, codes, np.nan), index=series.index, dtype=object),
+                _per_row(matched_pattern, codes, -1))
+
+    def hits(self, matched_pattern):
+        """Nombre de lignes trouvées par motif"""
+        counts = np.bincount(matched_pattern[matched_pattern >= 0], minlength=len(self.patterns))
+        return {name: int(count) for (name, _), count in zip(self.patterns, counts)}
+
+    def extract(self, series):
+        """Retourne (valeurs extraites, masque des lignes trouvées, nombre de lignes par motif)"""
+        values, matched_pattern = self.match(series)
+        return values, matched_pattern >= 0, self.hits(matched_pattern)
+
+
+class RuleSet:
+    """Ensemble de règles compilé une seule fois à partir de sa définition"""
+
+    def __init__(self, definition):
+        self.definition = definition
+        self.rules = [Rule(rule) for rule in definition.get('rules', [])]
+        self.extractions = [Extraction(extraction) for extraction in definition.get('extract', [])]
+        self.columns = definition.get('columns', [])
+        self.version = definition_version(definition)
+
+        # Un seul matcher par (colonne, sensibilité à la casse) pour tous les mots-clés
+        keywords = {}
+        for rule in self.rules:
+            for condition in rule.conditions:
+                if condition.contains is not None:
+                    keywords.setdefault((condition.column, condition.case_sensitive), []).append(condition.contains)
+        self.matchers = {
+            key: KeywordMatcher(words, case_sensitive=key[1]) for key, words in keywords.items()
+        }
+
+    def evaluate(self, df, names=None):
+        """
+        Calcule le masque de chaque règle applicable : {nom: masque booléen numpy}.
+        names limite l'évaluation à certaines règles.
+        """
+        rules = [rule for rule in self.rules if names is None or rule.name in names]
+        used_matchers = {
+            (condition.column, condition.case_sensitive)
+            for rule in rules for condition in rule.conditions if condition.contains is not None
+        }
+        keyword_masks = {}
+        for (column, case_sensitive), matcher in self.matchers.items():
+            if column in df.columns and (column, case_sensitive) in used_matchers:
+                for keyword, mask in matcher.match(df[column]).items():
+                    keyword_masks[(column, keyword, case_sensitive)] = mask
+
+        masks = {}
+        for rule in rules:
+            if not rule.applies_to(df):
+                continue
+            mask = np.ones(len(df), dtype=bool)
+            for condition in rule.conditions:
+                mask &= condition.evaluate(df[condition.column], keyword_masks)
+            masks[rule.name] = mask
+        return masks
+
+
+def _arrow_strings(series):
+    """Tableau Arrow d'une colonne string[pyarrow] (sans copie), None pour les autres colonnes"""
+    if pa is None or not isinstance(series.dtype, pd.StringDtype) or series.dtype.storage != 'pyarrow':
+        return None
+    strings = pa.array(series.array)
+    return strings.combine_chunks() if isinstance(strings, pa.ChunkedArray) else strings
+
+
+def _distinct(series):
+    """
+    (codes, valeurs distinctes en tableau object) d'une colonne texte, sans
+    convertir la colonne : catégories et codes d'une colonne de catégories,
+    dictionnaire Arrow d'une colonne string[pyarrow]. Code -1 : valeur manquante.
+    Une colonne non texte n'a aucune valeur (ne correspond à aucun motif).
+    """
+    if not is_text(series):
+        return np.full(len(series), -1, dtype=np.intp), np.empty(0, dtype=object)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories.to_numpy(dtype=object)
+    strings = _arrow_strings(series)
+    if strings is not None:
+        encoded = pc.dictionary_encode(strings)
+        return (encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False),
+                encoded.dictionary.to_numpy(zero_copy_only=False))
+    codes, values = pd.factorize(series)
+    return codes, np.asarray(values, dtype=object)
+
+
+def _per_row(values, codes, missing):
+    """Recopie le résultat de chaque valeur distincte sur ses lignes (code -1 : missing)"""
+    return np.append(values, np.array([missing], dtype=values.dtype))[codes]
+
+
+def _amounts(series):
+    """Montants d'une colonne (textes convertis une fois par valeur distincte, NaN si non numériques)"""
+    if not is_text(series):
+        return pd.to_numeric(series, errors='coerce')
+    codes, values = _distinct(series)
+    amounts = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+    return pd.Series(_per_row(amounts, codes, np.nan), index=series.index)
+
+
+def empty_column(df):
+    """Colonne de sortie vide : catégorie '' (les valeurs écrites par les règles s'y ajoutent)"""
+    return pd.Series('', index=df.index, dtype='category')
+
+
+def load_rules(path=None):
+    """Charge et compile le fichier de règles (JSON, ou YAML si PyYAML est installé)"""
+    path = path or os.environ.get('RULES_FILE', DEFAULT_RULES_FILE)
+    return _load_rules(path, os.stat(path).st_mtime_ns)
+
+
+@lru_cache(maxsize=8)
+def _load_rules(path, mtime_ns):
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yml', '.yaml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("PyYAML est requis pour lire un fichier de règles YAML")
+            definition = yaml.safe_load(f)
+        else:
+            definition = json.load(f)
+    return RuleSet(definition)
+
+
+def _evaluate_chunk(rule_set, chunk, names=None):
+    return rule_set.evaluate(chunk, names)
+
+
+def evaluate_rules(rule_set, df, names=None, max_workers=None):
+    """
+    Évalue les règles (toutes, ou celles de names) sur le DataFrame. Par défaut
+    dans le processus courant (le job tourne déjà dans un worker du pool de
+    jobs). Si RULE_WORKERS (ou max_workers) est fourni, les DataFrames d'au
+    moins PARALLEL_MIN_ROWS lignes sont découpés en blocs évalués sur un pool
+    de processus, borné par la part de cœurs du job et fermé à la fin de l'appel.
+    """
+    max_workers = max_workers or int(os.environ.get('RULE_WORKERS', 0))
+    if not max_workers or len(df) < PARALLEL_MIN_ROWS:
+        return rule_set.evaluate(df, names)
+    max_workers = inner_workers(-(-len(df) // CHUNK_ROWS), max_workers)
+    if max_workers < 2:
+        return rule_set.evaluate(df, names)
+
+    # N'envoyer aux workers que les colonnes utilisées par les règles
+    columns = [col for col in df.columns if any(col in rule.columns for rule in rule_set.rules)]
+    chunks = [df[columns].iloc[start:start + CHUNK_ROWS] for start in range(0, len(df), CHUNK_ROWS)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_evaluate_chunk, [rule_set] * len(chunks), chunks, [names] * len(chunks)))
+
+    return {name: np.concatenate([result[name] for result in results]) for name in results[0]}
+
+
+def _assign(df, mask, col, value):
+    if not mask.any():
+        return
+    if isinstance(value, (str, pd.Series)) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+        if df[col].isna().all():
+            # Colonne vide lue comme float (NaN) : catégorie, comme les colonnes créées
+            df[col] = df[col].astype(object).astype('category')
+        elif df[col].dtype != 'object':
+            df[col] = df[col].astype(object)
+    if isinstance(df[col].dtype, pd.CategoricalDtype):
+        # Valeurs écrites ajoutées aux catégories de la colonne
+        new_values = value.dropna().unique() if isinstance(value, pd.Series) else [value]
+        missing = pd.Index(new_values).difference(df[col].cat.categories)
+        if len(missing):
+            df[col] = df[col].cat.add_categories(missing)
+    df.loc[mask, col] = value
+
+
+def apply_rule_set(rule_set, df):
+    """Applique les règles au DataFrame (modifié en place) et retourne le nombre de lignes par règle"""
+    return assign_rules(rule_set, df, evaluate_rules(rule_set, df))
+
+
+def assign_rules(rule_set, df, masks):
+    """Écrit les valeurs des règles dans les lignes de leur masque (dans l'ordre des règles)"""
+    counts = {}
+
+    for rule in rule_set.rules:
+        if not rule.enabled:
+            logger.debug("⚠️ Règle %s désactivée", rule.name)
+            continue
+        if rule.name not in masks:
+            continue
+
+        # Créer les colonnes si elles n'existent pas (mais les laisser vides)
+        for col in rule.create_columns:
+            if col not in df.columns:
+                df[col] = empty_column(df)
+
+        mask = masks[rule.name]
+        for col, value in rule.values.items():
+            _assign(df, mask, col, value)
+
+        counts[rule.name] = int(mask.sum())
+        logger.info("✅ Règle %s appliquée à %d lignes (%s)", rule.name, counts[rule.name], ', '.join(rule.values))
+
+    for col in rule_set.columns:
+        if col not in df.columns:
+            df[col] = empty_column(df)
+
+    return counts
+
+
+def apply_extractions(rule_set, df):
+    """Applique les extractions (modifie le DataFrame en place) et retourne le nombre de lignes par motif"""
+    hits = {}
+    for extraction in rule_set.extractions:
+        if not extraction.enabled:
+            logger.debug("⚠️ Extraction %s désactivée", extraction.name)
+            continue
+        if extraction.column not in df.columns:
+            continue
+        if extraction.target not in df.columns:
+            df[extraction.target] = empty_column(df)
+
+        values, found, pattern_hits = extraction.extract(df[extraction.column])
+        assign_extraction(extraction, df, values, found, pattern_hits)
+        hits[extraction.name] = pattern_hits
+    return hits
+
+
+def assign_extraction(extraction, df, values, found, pattern_hits):
+    """Écrit les valeurs extraites dans la colonne cible"""
+    _assign(df, found, extraction.target, values[found])
+    logger.info("✅ Extraction %s : %d lignes (%s)", extraction.name, int(found.sum()), pattern_hits)
@@ -0,0 +1,67 @@
+from functools import lru_cache
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
+
+# Types de styles utilisés dans les fichiers générés
+HEADER = 'header'
+DATE = 'date'
+NUMERIC = 'numeric'
+BORDERED = 'bordered'
+PRESERVED = 'preserved'
+
+DATE_FORMAT = 'DD/MM/YYYY'
+NUMERIC_FORMAT = '#,##0.00'
+
+THIN_BORDER = Border(
+    left=Side(style='thin'),
+    right=Side(style='thin'),
+    top=Side(style='thin'),
+    bottom=Side(style='thin')
+)
+
+
+@lru_cache(maxsize=None)
+def named_style_definition(kind, number_format=None):
+    """
+    Définition d'un style nommé, construite une seule fois par processus.
+    Les objets Font/Fill/Border sont partagés ; chaque classeur crée son propre NamedStyle.
+    """
+    if kind == HEADER:
+        return dict(
+            name='En-tête tableau',
+            font=Font(bold=True, color="FFFFFF"),
+            fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center"),
+            border=THIN_BORDER
+        )
+    if kind == DATE:
+        return dict(name='Date bordée', font=DEFAULT_FONT, border=THIN_BORDER, number_format=DATE_FORMAT)
+    if kind == NUMERIC:
+        return dict(name='Nombre bordé', font=DEFAULT_FONT, border=THIN_BORDER, number_format=NUMERIC_FORMAT)
+    if kind == BORDERED:
+        return dict(name='Bordure', font=DEFAULT_FONT, border=THIN_BORDER)
+    if kind == PRESERVED:
+        # Un style par format d'origine (ex. format personnalisé de Period)
+        return dict(name=f'Format original {number_format}', font=DEFAULT_FONT, border=THIN_BORDER,
+                    number_format=number_format)
+    raise ValueError(f"Type de style inconnu: {kind}")
+
+
+class WorkbookStyles:
+    """
+    Registre des styles nommés d'un classeur : chaque style est enregistré
+    une fois puis les cellules le référencent par son identifiant.
+    """
+
+    def __init__(self, wb):
+        self.wb = wb
+        self._arrays = {}
+
+    def style_array(self, kind, number_format=None):
+        """Retourne le tableau d'identifiants (StyleArray) du style demandé"""
+        key = (kind, number_format)
+        if key not in self._arrays:
+            style = NamedStyle(**named_style_definition(kind, number_format))
+            self.wb.add_named_style(style)
+            self._arrays[key] = style.as_tuple()
+        return self._arrays[key]
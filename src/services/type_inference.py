@@ -0,0 +1,142 @@
+import datetime
+import re
+from functools import lru_cache
+import pandas as pd
+from src.services.compact import is_text, object_values
+
+# Nombre de valeurs non vides examinées par colonne
+SAMPLE_SIZE = 100
+
+# Part minimale de valeurs reconnues pour classer une colonne object en date
+DATE_THRESHOLD = 0.7
+
+DATE = 'date'
+NUMERIC = 'numeric'
+TEXT = 'text'
+
+# Colonnes spécifiques connues pour être des dates (SAUF Period qui a un format spécial)
+KNOWN_DATE_COLUMNS = ['Transaction Date', 'Date', 'date', 'transaction_date']
+
+# Colonnes spécifiques connues pour être numériques
+KNOWN_NUMERIC_COLUMNS = ['Amount CCYs', 'Rate FX', 'Amount USD', 'amount', 'rate', 'price', 'quantity']
+
+# Formats de dates reconnus dans les colonnes texte : (motif, format pandas)
+DATE_FORMATS = [
+    (r'\d{4}-\d{2}-\d{2}', 'ISO8601'),  # 2024-01-15, 2024-01-15 10:30:00
+    (r'\d{1,2}/\d{1,2}/\d{4}$', '%d/%m/%Y'),  # 15/01/2024, 5/1/2024
+    (r'\d{1,2}-\d{1,2}-\d{4}$', '%d-%m-%Y'),  # 15-01-2024, 5-1-2024
+]
+
+
+@lru_cache(maxsize=None)
+def _date_patterns():
+    """Motifs de dates compilés une seule fois par processus"""
+    return [(re.compile(pattern), date_format) for pattern, date_format in DATE_FORMATS]
+
+
+def _matches_known(col_name, known_columns):
+    return any(known_col.lower() in col_name.lower() for known_col in known_columns)
+
+
+def _sample(series, sample_size):
+    """Premières valeurs non vides de la colonne (catégories et chaînes Arrow en object)"""
+    sample = series[series.notna()].head(sample_size)
+    if is_text(sample) and sample.dtype != 'object':
+        sample = pd.Series(object_values(sample), index=sample.index)
+    return sample
+
+
+def _date_score(sample):
+    """Part des valeurs de l'échantillon reconnues comme dates et format détecté"""
+    if len(sample) == 0:
+        return 0.0, None
+
+    is_str = sample.map(lambda value: isinstance(value, str))
+    is_date = sample.map(lambda value: isinstance(value, (datetime.date, pd.Timestamp)))
+    strings = sample[is_str].str.strip()
+
+    best_count, best_format = 0, None
+    for pattern, date_format in _date_patterns():
+        candidates = strings[strings.str.match(pattern)]
+        if len(candidates) == 0:
+            continue
+        parsed = pd.to_datetime(candidates, format=date_format, errors='coerce').notna().sum()
+        if parsed > best_count:
+            best_count, best_format = int(parsed), date_format
+
+    return (int(is_date.sum()) + best_count) / len(sample), best_format
+
+
+def _numeric_score(series, sample):
+    """Part des valeurs de l'échantillon convertibles en nombre"""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return 1.0
+    if not is_text(series) or len(sample) == 0:
+        return 0.0
+    return float(pd.to_numeric(sample, errors='coerce').notna().mean())
+
+
+def infer_column(col_name, series, sample_size=SAMPLE_SIZE):
+    """Détermine le type d'une colonne avec un score de confiance"""
+    sample = _sample(series, sample_size)
+    is_period = 'period' in col_name.lower()
+
+    date_score, date_format = 0.0, None
+    if pd.api.types.is_datetime64_any_dtype(series):
+        date_score = 1.0
+    elif is_text(series):
+        date_score, date_format = _date_score(sample)
+    numeric_score = _numeric_score(series, sample)
+
+    column = {
+        'dtype': str(series.dtype),
+        'non_null': int(series.count()),
+        'type': TEXT,
+        # Les codes numériques (comptes, références) restent du texte
+        'confidence': round(1.0 - date_score, 3),
+        'date_score': round(date_score, 3),
+        'numeric_score': round(numeric_score, 3),
+        'date_format': date_format,
+        'by_name': False,
+    }
+
+    # Exclure explicitement la colonne Period du formatage date (format personnalisé)
+    if not is_period:
+        if _matches_known(col_name, KNOWN_DATE_COLUMNS):
+            column.update(type=DATE, confidence=1.0, by_name=True)
+            return column
+        if pd.api.types.is_datetime64_any_dtype(series) or date_score > DATE_THRESHOLD:
+            column.update(type=DATE, confidence=round(date_score, 3))
+            return column
+
+    if _matches_known(col_name, KNOWN_NUMERIC_COLUMNS):
+        column.update(type=NUMERIC, confidence=1.0, by_name=True)
+    elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        column.update(type=NUMERIC, confidence=1.0)
+
+    return column
+
+
+def infer_schema(df, sample_size=SAMPLE_SIZE, previous=None):
+    """
+    Infère le type de toutes les colonnes du DataFrame.
+
+    Les colonnes déjà présentes dans `previous` avec le même dtype et le même
+    nombre de valeurs renseignées sont reprises telles quelles : seules les
+    colonnes nouvelles ou modifiées (ex. sorties des règles) sont réexaminées.
+    """
+    schema = {}
+    for col_name in df.columns:
+        series = df[col_name]
+        cached = previous.get(col_name) if previous else None
+        if (cached is not None and cached['dtype'] == str(series.dtype)
+                and cached['non_null'] == series.count()):
+            schema[col_name] = cached
+        else:
+            schema[col_name] = infer_column(col_name, series, sample_size)
+    return schema
+
+
+def columns_of_type(schema, column_type):
+    """Liste des colonnes d'un type donné, dans l'ordre du DataFrame"""
+    return [col_name for col_name, column in schema.items() if column['type'] == column_type]
@@ -0,0 +1,159 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+import zipfile
+import threading
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+# Taille des blocs recopiés depuis la requête
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Suffixe des fichiers en cours de réception
+PARTIAL_SUFFIX = '.part'
+
+
+class UploadTooLarge(Exception):
+    """Le fichier reçu dépasse la taille maximale autorisée"""
+
+    def __init__(self, max_bytes):
+        if max_bytes >= 1024 * 1024:
+            limit = f"{max_bytes / (1024 * 1024):.3g} Mo"
+        else:
+            limit = f"{max_bytes / 1024:.3g} Ko"
+        super().__init__(f"Fichier trop volumineux (maximum {limit})")
+        self.max_bytes = max_bytes
+
+
+class UploadStore:
+    """
+    Fichiers reçus, un dossier par job : <dossier>/<id du job>/<nom du fichier>.
+
+    Le contenu est recopié par blocs depuis la requête (jamais entièrement en
+    mémoire) et son empreinte SHA-256 est calculée au passage. Les dossiers
+    plus anciens que retention_seconds sont supprimés périodiquement par un
+    thread de nettoyage.
+    """
+
+    def __init__(self, folder, retention_seconds, cleanup_interval=3600):
+        self.folder = folder
+        self.retention_seconds = retention_seconds
+        self.cleanup_interval = cleanup_interval
+        self._cleanup_thread = None
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, upload_id, filename):
+        return os.path.join(self.folder, upload_id, filename)
+
+    def save(self, stream, upload_id, filename, max_bytes=None):
+        """Recopie le flux dans le dossier du job ; retourne (chemin, taille, empreinte SHA-256)"""
+        filepath = self.path(upload_id, filename)
+        upload_dir = os.path.dirname(filepath)
+        os.makedirs(upload_dir)  # Identifiant unique : le dossier ne doit pas exister
+
+        digest = hashlib.sha256()
+        size = 0
+        partial_filepath = filepath + PARTIAL_SUFFIX
+        try:
+            with open(partial_filepath, 'wb') as f:
+                for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise UploadTooLarge(max_bytes)
+                    digest.update(chunk)
+                    f.write(chunk)
+            os.rename(partial_filepath, filepath)
+        except BaseException:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            raise
+
+        return filepath, size, digest.hexdigest()
+
+    def extract(self, archive_path, upload_id, accept, max_bytes=None, max_files=None):
+        """
+        Extrait d'une archive zip les fichiers dont le nom est accepté, chacun
+        dans son sous-dossier <id>/<n> ; les chemins contenus dans l'archive sont
+        ignorés et la taille de chaque fichier est vérifiée pendant la copie.
+        Retourne [(chemin, nom, taille, empreinte SHA-256)].
+        """
+        extracted = []
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                filename = secure_filename(os.path.basename(member.filename))
+                if member.is_dir() or not filename or member.filename.startswith('__MACOSX/') or not accept(filename):
+                    continue
+                if max_files is not None and len(extracted) >= max_files:
+                    raise ValueError(f"Trop de fichiers dans l'archive (maximum {max_files})")
+                with archive.open(member) as stream:
+                    filepath, size, digest = self.save(
+                        stream, os.path.join(upload_id, f"{len(extracted):04d}"), filename, max_bytes=max_bytes
+                    )
+                extracted.append((filepath, filename, size, digest))
+        return extracted
+
+    def clone(self, upload_id, new_upload_id, names=None):
+        """
+        Reprend le dossier d'un job pour un nouveau job (retraitement) : liens
+        physiques vers le fichier reçu et sa copie en colonnes, sans recopie.
+        names limite la reprise à certaines entrées du dossier (ex. l'état des
+        règles, pour une nouvelle version du fichier déjà reçue dans le dossier du job).
+        """
+        upload_dir = os.path.join(self.folder, upload_id)
+        new_upload_dir = os.path.join(self.folder, new_upload_id)
+
+        def link(src, dst):
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copy2(src, dst)
+
+        if names is None:
+            shutil.copytree(upload_dir, new_upload_dir, copy_function=link)
+            return new_upload_dir
+
+        for name in names:
+            src = os.path.join(upload_dir, name)
+            if os.path.isdir(src):
+                shutil.copytree(src, os.path.join(new_upload_dir, name), copy_function=link, dirs_exist_ok=True)
+            elif os.path.exists(src):
+                link(src, os.path.join(new_upload_dir, name))
+        return new_upload_dir
+
+    def remove(self, upload_id):
+        """Supprime le dossier d'un job (ex. lot refusé)"""
+        shutil.rmtree(os.path.join(self.folder, upload_id), ignore_errors=True)
+
+    def cleanup(self):
+        """Supprime les dossiers de jobs plus anciens que la durée de conservation"""
+        limit = time.time() - self.retention_seconds
+        removed = 0
+        for entry in os.scandir(self.folder):
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < limit:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info("🗑️ %d dossier(s) d'upload supprimé(s)", removed)
+        return removed
+
+    def start_cleanup(self):
+        """Lance le nettoyage périodique (une seule fois par processus)"""
+        with self._lock:
+            if self._cleanup_thread is not None:
+                return
+            self._cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
+            self._cleanup_thread.start()
+
+    def _cleanup_loop(self):
+        while True:
+            try:
+                self.cleanup()
+            except Exception:
+                logger.exception("Erreur lors du nettoyage des uploads")
+            time.sleep(self.cleanup_interval)
@@ -0,0 +1,526 @@
+import os
+import re
+import zipfile
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+import pandas as pd
+import numpy as np
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+from src.services import columnar_cache, xlsx_reader
+from src.services.compact import compact_frame
+from src.services.xlsx_reader import UnsupportedWorkbook, SheetNotFound
+
+logger = logging.getLogger(__name__)
+
+# Nombre de lignes examinées pour détecter la ligne d'en-têtes
+HEADER_SCAN_ROWS = 20
+
+# Nombre de lignes de données lues pour un aperçu
+PREVIEW_ROWS = 5
+
+# Mots-clés indiquant des en-têtes de données
+HEADER_KEYWORDS = ['entity', 'date', 'transaction', 'period', 'amount', 'account', 'description', 'bank']
+
+# Tous les mots-clés en une seule expression, testée une fois par ligne
+HEADER_PATTERN = re.compile('|'.join(re.escape(keyword) for keyword in HEADER_KEYWORDS))
+
+# Nombre de résultats de détection gardés en mémoire (par fichier et feuille)
+HEADER_INDEX_SIZE = 256
+
+# Valeurs lues comme manquantes et booléens reconnus, comme pandas.read_excel (valeurs par défaut)
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+TRUE_VALUES = frozenset(['True', 'TRUE', 'true'])
+FALSE_VALUES = frozenset(['False', 'FALSE', 'false'])
+
+# Ligne d'en-têtes d'une feuille, lignes de préambule (cellules vides : None) et noms des en-têtes
+HeaderInfo = namedtuple('HeaderInfo', ['header_row', 'preamble_rows', 'header_names'])
+
+_header_index = OrderedDict()
+_header_index_lock = threading.Lock()
+
+
+class HeaderDetector:
+    """
+    Détection de la ligne d'en-têtes ligne par ligne : la première ligne
+    contenant un mot-clé l'emporte (fin de la recherche) ; à défaut, la première
+    ligne d'au moins 3 valeurs, une fois les lignes examinées.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.header_row = None
+        self.fallback_row = None
+
+    def feed(self, row):
+        """Examine la ligne suivante ; retourne True dès que la ligne d'en-têtes est trouvée"""
+        idx = len(self.rows)
+        values = [val for val in row if val is not None and val == val and val != '']
+        self.rows.append(row)
+        if HEADER_PATTERN.search(' '.join(str(val) for val in values).lower()):
+            logger.debug("✅ Données détectées à partir de la ligne %d", idx + 1)
+            self.header_row = idx
+            return True
+        if self.fallback_row is None and sum(1 for val in values if str(val).strip() != '') >= 3:
+            self.fallback_row = idx
+        return False
+
+    def result(self):
+        """HeaderInfo des lignes examinées"""
+        header_row = self.header_row
+        if header_row is None:
+            if self.fallback_row is not None:
+                header_row = self.fallback_row
+                logger.debug("✅ Données détectées à partir de la ligne %d (par nombre de colonnes)", header_row + 1)
+            else:
+                logger.warning("⚠️ Impossible de détecter le début des données, utilisation de la ligne 1")
+                header_row = 0
+        preamble_rows = [[val if val != '' else None for val in row] for row in self.rows[:header_row]]
+        header_names = [str(val).strip() for val in self.rows[header_row]] if header_row < len(self.rows) else []
+        return HeaderInfo(header_row, preamble_rows, header_names)
+
+
+def detect_header(rows):
+    """Détecte la ligne d'en-têtes parmi les HEADER_SCAN_ROWS premières lignes brutes"""
+    detector = HeaderDetector()
+    for row in rows[:HEADER_SCAN_ROWS]:
+        if detector.feed(row):
+            break
+    return detector.result()
+
+
+def detect_header_row(rows):
+    """Trouve, parmi des lignes brutes, l'index de la ligne d'en-têtes"""
+    return detect_header(rows).header_row
+
+
+def _scan_rows(filepath, sheet_name=None):
+    """
+    Lignes brutes de la feuille, lues en flux (lecteur XML, openpyxl, puis
+    pandas). Si le lecteur XML échoue en cours de lecture, openpyxl reprend
+    après les lignes déjà fournies : aucune ligne n'est fournie deux fois.
+    """
+    done = 0
+    try:
+        for values, _ in xlsx_reader.iter_rows(filepath, sheet_name, format_rows=-1):
+            yield values
+            done += 1
+        return
+    except UnsupportedWorkbook as e:
+        if done:
+            logger.debug("Lecteur XML en échec après %d lignes (%s), suite avec openpyxl", done, e)
+
+    try:
+        wb = load_workbook(filepath, read_only=True, data_only=True, keep_links=False)
+    except Exception:
+        # .xls : lecture des premières lignes par pandas
+        sheet = sheet_name if sheet_name is not None else 0
+        raw_df = pd.read_excel(filepath, header=None, sheet_name=sheet, nrows=HEADER_SCAN_ROWS)
+        yield from raw_df.astype(object).where(raw_df.notna(), '').values.tolist()[done:]
+        return
+    try:
+        if sheet_name is None:
+            ws = wb.active
+        elif sheet_name in wb.sheetnames:
+            ws = wb[sheet_name]
+        else:
+            raise SheetNotFound(sheet_name)
+        ws.reset_dimensions()
+        for i, row in enumerate(ws.rows):
+            if i >= done:
+                yield _convert_row(row)
+    finally:
+        wb.close()
+
+
+def _header_key(filepath, sheet_name):
+    # Un fichier modifié (date ou taille) est réexaminé
+    stat = os.stat(filepath)
+    return filepath, stat.st_mtime_ns, stat.st_size, sheet_name
+
+
+def remember_header(filepath, sheet_name, info):
+    """Garde en mémoire la ligne d'en-têtes d'une feuille déjà analysée (lue en entier)"""
+    key = _header_key(filepath, sheet_name)
+    with _header_index_lock:
+        _header_index[key] = info
+        _header_index.move_to_end(key)
+        while len(_header_index) > HEADER_INDEX_SIZE:
+            _header_index.popitem(last=False)
+
+
+def find_header(filepath, sheet_name=None):
+    """
+    Ligne d'en-têtes, préambule et noms des en-têtes d'une feuille (HeaderInfo).
+    La feuille est lue en flux et la lecture s'arrête dès la ligne d'en-têtes
+    trouvée (au plus HEADER_SCAN_ROWS lignes) ; le résultat est gardé en mémoire
+    par fichier (chemin, date de modification et taille) et par feuille, avec
+    ceux des feuilles analysées par WorkbookSession.
+    """
+    key = _header_key(filepath, sheet_name)
+    with _header_index_lock:
+        if key in _header_index:
+            _header_index.move_to_end(key)
+            return _header_index[key]
+
+    detector = HeaderDetector()
+    rows = _scan_rows(filepath, sheet_name)
+    try:
+        for row in rows:
+            if detector.feed(row) or len(detector.rows) >= HEADER_SCAN_ROWS:
+                break
+    finally:
+        rows.close()
+    info = detector.result()
+    remember_header(filepath, sheet_name, info)
+    return info
+
+
+def _convert_cell(cell):
+    """Convertit une cellule openpyxl comme le fait pandas.read_excel"""
+    if cell.value is None:
+        return ''
+    elif cell.data_type == TYPE_ERROR:
+        return np.nan
+    elif cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        if val == cell.value:
+            return val
+        return float(cell.value)
+    return cell.value
+
+
+def _convert_row(row):
+    """Convertit une ligne et supprime les cellules vides en fin de ligne"""
+    converted_row = [_convert_cell(cell) for cell in row]
+    while converted_row and converted_row[-1] == '':
+        converted_row.pop()
+    return converted_row
+
+
+def _booleans(values):
+    """Colonne de booléens (NaN pour les valeurs manquantes), ou None si une valeur n'en est pas un"""
+    result = np.empty(len(values), dtype=object)
+    has_na = False
+    for i, value in enumerate(values):
+        if isinstance(value, bool):
+            result[i] = value
+        elif isinstance(value, str) and value in TRUE_VALUES:
+            result[i] = True
+        elif isinstance(value, str) and value in FALSE_VALUES:
+            result[i] = False
+        elif value is None or (isinstance(value, float) and value != value):
+            result[i] = np.nan
+            has_na = True
+        else:
+            return None
+    return result if has_na else result.astype(bool)
+
+
+def _parse_column(values):
+    """
+    Convertit une colonne de valeurs brutes comme TextParser : valeurs
+    manquantes en NaN, puis nombres ou booléens, sinon objets.
+    """
+    values = np.array(values, dtype=object)
+    if not len(values):
+        return values
+    values[pd.Series(values, dtype=object).isin(NA_VALUES).to_numpy()] = np.nan
+    try:
+        return pd.to_numeric(values)
+    except (ValueError, TypeError):
+        pass
+    # Valeurs égales de types différents ramenées à la première rencontrée (0 et
+    # False, 1 et 1.0...), comme TextParser ; rien à faire pour une colonne de texte
+    if pd.api.types.infer_dtype(values, skipna=True) != 'string':
+        present = ~pd.isna(values)
+        codes, uniques = pd.factorize(values[present])
+        values[present] = uniques[codes]
+    booleans = _booleans(values)
+    return values if booleans is None else booleans
+
+
+def _frame(columns, header_row):
+    """
+    DataFrame des colonnes brutes (voir xlsx_reader.to_columns), en-têtes sur la
+    ligne header_row : chaque colonne est convertie d'un bloc, sans repasser par
+    des lignes. Noms des colonnes comme TextParser (Unnamed, doublons numérotés).
+    """
+    if not columns or len(columns[0]) <= header_row:
+        return pd.DataFrame()
+    header = [column[header_row] for column in columns]
+    names = TextParser([header, [0] * len(header)], header=0, skip_blank_lines=False).read().columns
+    df = pd.DataFrame({i: _parse_column(column[header_row + 1:]) for i, column in enumerate(columns)})
+    df.columns = names
+    return df
+
+
+def _clean_columns(df):
+    """Nettoie les noms de colonnes (enlever les espaces, caractères bizarres)"""
+    df.columns = [str(col).strip() if pd.notna(col) else f'Unnamed_{i}' for i, col in enumerate(df.columns)]
+    return df
+
+
+class WorkbookPreview:
+    """Colonnes, dimensions et premières lignes d'un classeur, sans le lire en entier"""
+
+    def __init__(self, columns, shape, df):
+        self.columns = columns
+        self.shape = shape
+        self.df = df
+
+
+def read_preview(filepath, nrows=PREVIEW_ROWS):
+    """
+    Aperçu d'un classeur : la feuille est lue en flux et la lecture s'arrête
+    après la ligne d'en-têtes et nrows lignes de données. Seul l'aperçu de
+    PREVIEW_ROWS lignes est mis en cache (tant que le fichier n'est pas
+    modifié) ; les aperçus plus longs sont relus à chaque appel. Si la feuille
+    a déjà été analysée, l'aperçu est lu dans sa copie en colonnes.
+    """
+    # Feuille déjà analysée : lecture de la copie en colonnes
+    cached = columnar_cache.preview(filepath, nrows=nrows)
+    if cached is not None:
+        df, total_rows = cached
+        return WorkbookPreview(list(df.columns), (total_rows, len(df.columns)), df)
+
+    if nrows > PREVIEW_ROWS:
+        return _read_preview(filepath, nrows)
+
+    stat = os.stat(filepath)
+    preview = _cached_preview(filepath, stat.st_mtime_ns, stat.st_size)
+    if nrows == PREVIEW_ROWS:
+        return preview
+    return WorkbookPreview(preview.columns, preview.shape, preview.df.head(nrows))
+
+
+@lru_cache(maxsize=128)
+def _cached_preview(filepath, mtime_ns, size):
+    """Aperçu de taille fixe (PREVIEW_ROWS lignes), clé : chemin, date et taille du fichier"""
+    return _read_preview(filepath, PREVIEW_ROWS)
+
+
+def _read_preview(filepath, nrows):
+    if not zipfile.is_zipfile(filepath):
+        # Format non lu en flux (.xls) : lecture complète
+        session = WorkbookSession(filepath)
+        return WorkbookPreview(list(session.df.columns), session.df.shape, session.df.head(nrows))
+
+    # Ligne d'en-têtes : lecture arrêtée dès qu'elle est trouvée (résultat gardé en mémoire)
+    header_row = find_header(filepath).header_row
+
+    rows = []
+    data_rows = 0
+    exhausted = True
+    scan = _scan_rows(filepath)
+    try:
+        for i, row in enumerate(scan):
+            rows.append(row)
+            if i > header_row and row:
+                data_rows += 1
+            # Au moins HEADER_SCAN_ROWS lignes lues, comme pour la détection des en-têtes
+            if i + 1 >= max(header_row + 1, HEADER_SCAN_ROWS) and data_rows >= nrows:
+                exhausted = False
+                break
+    finally:
+        scan.close()
+
+    # Nombre de lignes : exact si la feuille a été lue en entier, sinon lignes non
+    # vides comptées dans le XML (sans lire les cellules), comme le compte de /upload
+    total_rows = sum(1 for r in rows[header_row + 1:] if r)
+    if not exhausted:
+        try:
+            filled_rows = xlsx_reader.row_count(filepath)
+        except UnsupportedWorkbook:
+            filled_rows = None
+        if filled_rows is not None:
+            total_rows = max(filled_rows - sum(1 for r in rows[:header_row + 1] if r), total_rows)
+
+    df = _clean_columns(_frame(xlsx_reader.to_columns(rows), header_row)).dropna(how='all').head(nrows)
+
+    return WorkbookPreview(list(df.columns), (total_rows, len(df.columns)), df)
+
+
+def list_sheets(filepath):
+    """Noms des feuilles de calcul du classeur, dans l'ordre"""
+    try:
+        # Lecture de workbook.xml seulement (openpyxl parcourt les feuilles sans dimensions)
+        return xlsx_reader.sheet_names(filepath)
+    except Exception:
+        pass
+    try:
+        wb = load_workbook(filepath, read_only=True, keep_links=False)
+    except Exception:
+        # .xls : liste fournie par pandas
+        return pd.ExcelFile(filepath).sheet_names
+    try:
+        return [ws.title for ws in wb.worksheets]
+    finally:
+        wb.close()
+
+
+class WorkbookSession:
+    """
+    Analyse un fichier Excel une seule fois et met en cache tout ce dont le
+    pipeline a besoin : ligne d'en-têtes, lignes de préambule, DataFrame et
+    formats numériques d'origine de chaque colonne.
+    """
+
+    def __init__(self, filepath, sheet_name=None, cache=False, engine=None):
+        self.filepath = filepath
+        # Feuille analysée (None : feuille active du classeur)
+        self.sheet_name = sheet_name
+        self.header_row = 0
+        self.preamble_rows = []
+        self.header_names = []
+        self.column_formats = {}
+        self.raw_columns = {}
+        self.df = None
+        # Schéma des colonnes (types et scores), calculé une fois par upload
+        self.schema = None
+        # Moteur de lecture préféré (les suivants de READERS servent de repli) et moteur utilisé
+        engine = engine or os.environ.get('EXCEL_READER') or READERS[0][0]
+        names = [name for name, _ in READERS]
+        if engine not in names:
+            raise ValueError(f"Moteur de lecture inconnu: {engine}")
+        self.engines = names[names.index(engine):]
+        self.engine = None
+        # Copie en colonnes à côté du fichier : lue si elle est à jour, écrite sinon
+        self.cache = cache
+        self.from_cache = False
+        self._stored = False
+        if not (cache and self._load_cached()):
+            self._load()
+            if cache:
+                self.store()
+
+    def _load_cached(self):
+        cached = columnar_cache.load(self.filepath, self.sheet_name)
+        if cached is None:
+            return False
+        self.df, self.raw_columns, meta = cached
+        for field in columnar_cache.META_FIELDS:
+            setattr(self, field, meta[field])
+        self.from_cache = self._stored = True
+        self.engine = 'columnar'
+        logger.info("📊 Fichier lu depuis la copie en colonnes: %d lignes, %d colonnes", *self.df.shape)
+        return True
+
+    def store(self):
+        """Enregistre la feuille analysée (et son schéma s'il est connu) dans la copie en colonnes"""
+        if self._stored:
+            return columnar_cache.update_meta(self.filepath, self.sheet_name, schema=self.schema)
+        meta = {field: getattr(self, field) for field in columnar_cache.META_FIELDS}
+        self._stored = columnar_cache.save(self.filepath, self.sheet_name, self.df, self.raw_columns, meta)
+        return self._stored
+
+    def _read_columns(self):
+        """
+        Lit toute la feuille en un seul passage, rangée par colonne (voir
+        xlsx_reader.to_columns) : lecteur XML rapide, puis openpyxl pour les
+        classeurs qu'il ne sait pas lire, puis pandas pour les formats non pris
+        en charge par openpyxl (.xls). Le moteur utilisé est noté dans self.engine.
+        """
+        for engine, reader in READERS:
+            if engine not in self.engines:
+                continue
+            try:
+                columns, formats = reader(self)
+            except UnsupportedWorkbook as e:
+                logger.debug("Lecteur %s indisponible (%s)", engine, e)
+                continue
+            self.engine = engine
+            return columns, formats
+        raise UnsupportedWorkbook(f"Aucun lecteur disponible pour {os.path.basename(self.filepath)}")
+
+    def _read_columns_xml(self):
+        try:
+            return xlsx_reader.read_columns(self.filepath, self.sheet_name, format_rows=HEADER_SCAN_ROWS)
+        except (UnsupportedWorkbook, SheetNotFound):
+            raise
+        except Exception as e:
+            # Fichier inattendu pour le lecteur rapide : openpyxl prend le relais
+            logger.warning("⚠️ Lecteur XML en échec, lecture avec openpyxl: %s", e)
+            raise UnsupportedWorkbook(str(e))
+
+    def _read_columns_openpyxl(self):
+        formats = []
+        try:
+            wb = load_workbook(self.filepath, read_only=True, data_only=True, keep_links=False)
+        except Exception as e:
+            raise UnsupportedWorkbook(str(e))
+
+        def values(ws):
+            for row_number, row in enumerate(ws.rows):
+                if row_number <= HEADER_SCAN_ROWS:
+                    formats.append([cell.number_format for cell in row])
+                yield _convert_row(row)
+
+        try:
+            if self.sheet_name is None:
+                ws = wb.active
+            elif self.sheet_name in wb.sheetnames:
+                ws = wb[self.sheet_name]
+            else:
+                raise SheetNotFound(self.sheet_name)
+            ws.reset_dimensions()
+            columns = xlsx_reader.to_columns(values(ws))
+        finally:
+            wb.close()
+        return columns, formats
+
+    def _read_columns_pandas(self):
+        # Format non pris en charge par openpyxl (.xls) : passer par pandas, sans formats
+        sheet = self.sheet_name if self.sheet_name is not None else 0
+        raw_df = pd.read_excel(self.filepath, header=None, sheet_name=sheet)
+        raw_df = raw_df.astype(object).where(raw_df.notna(), '')
+        return xlsx_reader.to_columns(raw_df.values.tolist()), []
+
+    def _load(self):
+        columns, formats = self._read_columns()
+        height = len(columns[0]) if columns else 0
+
+        # Détection sur les premières lignes seulement (largeur de la feuille)
+        head = [[column[i] for column in columns] for i in range(min(height, HEADER_SCAN_ROWS))]
+        info = detect_header(head)
+        self.header_row, self.preamble_rows, self.header_names = info
+        # Aperçus et détections suivantes de cette feuille : sans relire le fichier
+        remember_header(self.filepath, self.sheet_name, info)
+
+        # Formats de la première ligne de données et valeurs brutes des colonnes Period
+        data_row = self.header_row + 1
+        for col_idx, name in enumerate(self.header_names):
+            if not name:
+                continue
+            if data_row < len(formats) and col_idx < len(formats[data_row]):
+                self.column_formats[name] = formats[data_row][col_idx] or 'General'
+            if 'period' in name.lower():
+                self.raw_columns[name] = [val if val != '' else None for val in columns[col_idx][data_row:]]
+
+        df = _frame(columns, self.header_row)
+        del columns
+
+        # Nettoyer les noms de colonnes (enlever les espaces, caractères bizarres)
+        df = _clean_columns(df)
+
+        # Supprimer les lignes complètement vides, puis représentation compacte des
+        # colonnes (catégories, chaînes Arrow, nombres réduits)
+        self.df = compact_frame(df.dropna(how='all'))
+
+        logger.info("📊 Fichier lu avec succès: %d lignes, %d colonnes (lecteur %s)", *self.df.shape, self.engine)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📋 Colonnes détectées: %s", list(self.df.columns))
+
+
+# Lecteurs essayés dans l'ordre : (nom du moteur, méthode de lecture)
+READERS = [
+    ('xml', WorkbookSession._read_columns_xml),
+    ('openpyxl', WorkbookSession._read_columns_openpyxl),
+    ('pandas', WorkbookSession._read_columns_pandas),
+]
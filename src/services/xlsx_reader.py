@@ -0,0 +1,385 @@
+import re
+import math
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from openpyxl.reader.strings import read_string_table
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+
+# Lecteur XLSX rapide : la feuille est lue en flux (iterparse) directement dans
+# l'archive, sans créer d'objets cellule. Les valeurs obtenues sont celles que
+# produit la lecture openpyxl de WorkbookSession (_convert_row).
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+DOC_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+SHEET_DATA_TAG = f'{MAIN_NS}sheetData'
+ROW_TAG = f'{MAIN_NS}row'
+CELL_TAG = f'{MAIN_NS}c'
+VALUE_TAG = f'{MAIN_NS}v'
+INLINE_STRING_TAG = f'{MAIN_NS}is'
+TEXT_TAG = f'{MAIN_NS}t'
+RICH_TEXT_TAG = f'{MAIN_NS}r'
+
+WORKSHEET_REL = '/worksheet'
+STYLES_REL = '/styles'
+SHARED_STRINGS_REL = '/sharedStrings'
+
+# Numéro du premier format personnalisé (les précédents sont prédéfinis)
+BUILTIN_FORMATS_MAX_SIZE = 164
+
+DIGITS = '0123456789'
+
+# Début d'une ligne (préfixe d'espace de noms éventuel) et valeur de cellule
+ROW_START = re.compile(rb'<(?:\w+:)?row\b')
+CELL_VALUE = re.compile(rb'<(?:\w+:)?(?:v|is)\b')
+
+# Taille des blocs décompressés lus pour compter les lignes
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+# Fin de bloc reportée sur le suivant quand il ne contient pas de ligne (balise coupée)
+SCAN_OVERLAP = 64
+
+
+class UnsupportedWorkbook(Exception):
+    """Classeur que ce lecteur ne sait pas lire : la lecture openpyxl prend le relais"""
+
+
+class SheetNotFound(ValueError):
+    """Feuille demandée absente du classeur"""
+
+    def __init__(self, sheet_name):
+        super().__init__(f"Feuille introuvable: {sheet_name}")
+
+
+def _rels(archive, part):
+    """Relations d'une partie de l'archive : {identifiant: (type, chemin)}"""
+    folder, name = posixpath.split(part)
+    rels_part = posixpath.join(folder, '_rels', f'{name}.rels')
+    if rels_part not in archive.namelist():
+        return {}
+    rels = {}
+    for rel in ET.fromstring(archive.read(rels_part)).iter(f'{REL_NS}Relationship'):
+        target = rel.get('Target')
+        if target.startswith('/'):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join(folder, target))
+        rels[rel.get('Id')] = (rel.get('Type'), target)
+    return rels
+
+
+def _workbook_part(archive):
+    for rel_type, target in _rels(archive, '').values():
+        if rel_type.endswith('/officeDocument'):
+            return target
+    return 'xl/workbook.xml'
+
+
+def _rel_target(rels, rel_type):
+    for target_type, target in rels.values():
+        if target_type.endswith(rel_type):
+            return target
+    return None
+
+
+def _number_formats(archive, styles_part):
+    """Format numérique de chaque style de cellule (numéro s des cellules)"""
+    if styles_part is None or styles_part not in archive.namelist():
+        return []
+    root = ET.fromstring(archive.read(styles_part))
+    custom = {}
+    num_fmts = root.find(f'{MAIN_NS}numFmts')
+    if num_fmts is not None:
+        for num_fmt in num_fmts.iter(f'{MAIN_NS}numFmt'):
+            custom[int(num_fmt.get('numFmtId'))] = num_fmt.get('formatCode')
+    formats = []
+    cell_xfs = root.find(f'{MAIN_NS}cellXfs')
+    if cell_xfs is not None:
+        for xf in cell_xfs.iter(f'{MAIN_NS}xf'):
+            num_fmt_id = int(xf.get('numFmtId', 0))
+            if num_fmt_id in custom:
+                formats.append(custom[num_fmt_id])
+            elif num_fmt_id < BUILTIN_FORMATS_MAX_SIZE:
+                formats.append(BUILTIN_FORMATS.get(num_fmt_id, 'General'))
+            else:
+                formats.append('General')
+    return formats
+
+
+def _inline_string(cell):
+    inline = cell.find(INLINE_STRING_TAG)
+    if inline is None:
+        return ''
+    snippets = [inline.findtext(TEXT_TAG) or '']
+    for run in inline.iter(RICH_TEXT_TAG):
+        snippets.append(run.findtext(TEXT_TAG) or '')
+    return ''.join(snippets)
+
+
+def _open_sheet(archive, sheet_name):
+    """Chemin de la feuille demandée (None : feuille active) et calendrier du classeur"""
+    workbook_part = _workbook_part(archive)
+    root = ET.fromstring(archive.read(workbook_part))
+    rels = _rels(archive, workbook_part)
+
+    workbook_pr = root.find(f'{MAIN_NS}workbookPr')
+    epoch = CALENDAR_WINDOWS_1900
+    if workbook_pr is not None and workbook_pr.get('date1904') in ('1', 'true'):
+        epoch = CALENDAR_MAC_1904
+
+    sheets = [
+        (sheet.get('name'), sheet.get(f'{DOC_REL_NS}id'))
+        for sheet in root.iter(f'{MAIN_NS}sheet')
+    ]
+    if sheet_name is None:
+        view = root.find(f'{MAIN_NS}bookViews/{MAIN_NS}workbookView')
+        index = int(view.get('activeTab', 0)) if view is not None else 0
+        if index >= len(sheets):
+            raise UnsupportedWorkbook("Feuille active introuvable")
+        rel_id = sheets[index][1]
+    else:
+        rel_ids = [rel_id for name, rel_id in sheets if name == sheet_name]
+        if not rel_ids:
+            raise SheetNotFound(sheet_name)
+        rel_id = rel_ids[0]
+
+    rel_type, sheet_part = rels.get(rel_id, ('', None))
+    if not rel_type.endswith(WORKSHEET_REL):
+        raise UnsupportedWorkbook("La feuille n'est pas une feuille de calcul")
+    return sheet_part, rels, epoch
+
+
+def sheet_names(filepath):
+    """Noms des feuilles de calcul du classeur, dans l'ordre, lus dans workbook.xml seulement"""
+    try:
+        archive = zipfile.ZipFile(filepath)
+    except zipfile.BadZipFile as e:
+        raise UnsupportedWorkbook(str(e))
+
+    with archive:
+        workbook_part = _workbook_part(archive)
+        root = ET.fromstring(archive.read(workbook_part))
+        rels = _rels(archive, workbook_part)
+    return [
+        sheet.get('name') for sheet in root.iter(f'{MAIN_NS}sheet')
+        if rels.get(sheet.get(f'{DOC_REL_NS}id'), ('', None))[0].endswith(WORKSHEET_REL)
+    ]
+
+
+def sheet_size(filepath, sheet_name=None):
+    """
+    Taille décompressée (octets) du XML de la feuille et de la table des chaînes
+    partagées, lue dans le répertoire de l'archive sans rien décompresser : ordre
+    de grandeur de la mémoire nécessaire pour lire la feuille
+    """
+    try:
+        archive = zipfile.ZipFile(filepath)
+    except zipfile.BadZipFile as e:
+        raise UnsupportedWorkbook(str(e))
+
+    with archive:
+        sheet_part, rels, _ = _open_sheet(archive, sheet_name)
+        parts = [sheet_part, _rel_target(rels, SHARED_STRINGS_REL)]
+        names = set(archive.namelist())
+        return sum(archive.getinfo(part).file_size for part in parts if part in names)
+
+
+def row_count(filepath, sheet_name=None):
+    """
+    Nombre de lignes de la feuille contenant au moins une valeur, sans analyser
+    les cellules : le XML de la feuille est parcouru par blocs d'octets. Les
+    dimensions déclarées (<dimension>) ne sont pas utilisées : elles comptent
+    les lignes vides de fin de feuille et les lignes seulement mises en forme.
+    """
+    try:
+        archive = zipfile.ZipFile(filepath)
+    except zipfile.BadZipFile as e:
+        raise UnsupportedWorkbook(str(e))
+
+    with archive:
+        sheet_part, _, _ = _open_sheet(archive, sheet_name)
+        filled = 0
+        tail = b''
+        with archive.open(sheet_part) as source:
+            for chunk in iter(lambda: source.read(SCAN_CHUNK_SIZE), b''):
+                buffer = tail + chunk
+                # Une ligne s'étend jusqu'au début de la suivante ; la dernière,
+                # peut-être coupée en fin de bloc, est reprise au bloc suivant
+                starts = [match.start() for match in ROW_START.finditer(buffer)]
+                for start, end in zip(starts, starts[1:]):
+                    if CELL_VALUE.search(buffer, start, end):
+                        filled += 1
+                tail = buffer[starts[-1]:] if starts else buffer[-SCAN_OVERLAP:]
+        if ROW_START.match(tail) and CELL_VALUE.search(tail):
+            filled += 1
+    return filled
+
+
+def read_rows(filepath, sheet_name=None, format_rows=20):
+    """
+    Lit toutes les lignes d'une feuille (valeurs converties, cellules vides en
+    fin de ligne supprimées) et les formats numériques des format_rows + 1
+    premières lignes. Retourne (lignes, formats).
+    """
+    rows = []
+    formats = []
+    for values, row_formats in iter_rows(filepath, sheet_name, format_rows):
+        rows.append(values)
+        if row_formats is not None:
+            formats.append(row_formats)
+    return rows, formats
+
+
+def to_columns(rows):
+    """
+    Range des lignes de largeurs diverses en colonnes (une liste de valeurs par
+    colonne), au fil de la lecture : cellules absentes '' et lignes vides de fin
+    de feuille supprimées. Aucune liste par ligne n'est gardée.
+    """
+    columns = []
+    height = 0
+    filled = 0
+    for values in rows:
+        # Nouvelle colonne : vide sur les lignes déjà lues
+        for _ in range(len(columns), len(values)):
+            columns.append([''] * height)
+        for column, value in zip(columns, values):
+            column.append(value)
+        for column in columns[len(values):]:
+            column.append('')
+        height += 1
+        if values:
+            filled = height
+    for column in columns:
+        del column[filled:]
+    return columns
+
+
+def read_columns(filepath, sheet_name=None, format_rows=20):
+    """
+    Comme read_rows, mais les valeurs sont rangées par colonne au fil de la
+    lecture (voir to_columns). Retourne (colonnes, formats).
+    """
+    formats = []
+
+    def values():
+        for row_values, row_formats in iter_rows(filepath, sheet_name, format_rows):
+            if row_formats is not None:
+                formats.append(row_formats)
+            yield row_values
+
+    return to_columns(values()), formats
+
+
+def iter_rows(filepath, sheet_name=None, format_rows=20):
+    """
+    Lignes de la feuille lues en flux, une à une : (valeurs, formats numériques
+    ou None au-delà des format_rows + 1 premières lignes). Interrompre
+    l'itération arrête la lecture de la feuille.
+    """
+    try:
+        archive = zipfile.ZipFile(filepath)
+    except zipfile.BadZipFile as e:
+        raise UnsupportedWorkbook(str(e))
+
+    with archive:
+        sheet_part, rels, epoch = _open_sheet(archive, sheet_name)
+
+        # Table des chaînes partagées, lue une seule fois
+        strings_part = _rel_target(rels, SHARED_STRINGS_REL)
+        shared_strings = []
+        if strings_part is not None and strings_part in archive.namelist():
+            with archive.open(strings_part) as source:
+                shared_strings = read_string_table(source)
+
+        number_formats = _number_formats(archive, _rel_target(rels, STYLES_REL))
+        date_styles = {i for i, fmt in enumerate(number_formats) if is_date_format(fmt)}
+        timedelta_styles = {i for i, fmt in enumerate(number_formats) if is_timedelta_format(fmt)}
+
+        row_count = 0
+        row_counter = 0
+        sheet_data = None
+        with archive.open(sheet_part) as source:
+            for event, element in ET.iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == SHEET_DATA_TAG:
+                        sheet_data = element
+                    continue
+                if element.tag != ROW_TAG:
+                    continue
+
+                row_ref = element.get('r')
+                row_index = int(float(row_ref)) if row_ref else row_counter + 1
+
+                # Lignes absentes du fichier : lignes vides, comme openpyxl
+                while row_count + 1 < row_index:
+                    yield [], ([] if row_count <= format_rows else None)
+                    row_count += 1
+                row_counter = row_index
+                if row_count + 1 > row_index:
+                    raise UnsupportedWorkbook(f"Ligne {row_index} dans le désordre")
+
+                values = []
+                row_formats = [] if row_count <= format_rows else None
+                col_counter = 0
+                for cell in element.iter(CELL_TAG):
+                    ref = cell.get('r')
+                    if ref:
+                        col_counter = column_index_from_string(ref.rstrip(DIGITS))
+                    else:
+                        col_counter += 1
+                    if col_counter > len(values) + 1:
+                        values.extend([''] * (col_counter - len(values) - 1))
+                        if row_formats is not None:
+                            row_formats.extend([None] * (col_counter - len(row_formats) - 1))
+                    elif col_counter <= len(values):
+                        raise UnsupportedWorkbook(f"Cellule {ref} dans le désordre")
+
+                    style = cell.get('s')
+                    style_id = int(style) if style else 0
+                    data_type = cell.get('t', 'n')
+
+                    if data_type == 'inlineStr':
+                        value = _inline_string(cell)
+                    else:
+                        value = cell.findtext(VALUE_TAG) or None
+                        if value is None:
+                            value = ''
+                        elif data_type == 'n':
+                            number = float(value) if ('.' in value or 'E' in value or 'e' in value) else int(value)
+                            if style_id in date_styles:
+                                try:
+                                    value = from_excel(number, epoch, timedelta=style_id in timedelta_styles)
+                                except (OverflowError, ValueError):
+                                    value = math.nan
+                            elif isinstance(number, float) and number == int(number):
+                                value = int(number)
+                            else:
+                                value = number
+                        elif data_type == 's':
+                            value = shared_strings[int(value)]
+                        elif data_type == 'b':
+                            value = bool(int(value))
+                        elif data_type == 'e':
+                            value = math.nan
+                        elif data_type == 'd':
+                            value = from_ISO8601(value)
+
+                    values.append(value)
+                    if row_formats is not None:
+                        row_formats.append(number_formats[style_id] if style_id < len(number_formats) else 'General')
+
+                # Ligne lue vidée et retirée de <sheetData> : l'arbre ne grandit pas avec la feuille
+                element.clear()
+                if sheet_data is not None:
+                    sheet_data.remove(element)
+
+                # Supprimer les cellules vides en fin de ligne
+                while values and values[-1] == '':
+                    values.pop()
+                yield values, row_formats
+                row_count += 1
@@ -0,0 +1,300 @@
+import logging
+import warnings
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import Cell
+from openpyxl.worksheet.table import Table, TableStyleInfo
+from openpyxl.utils import get_column_letter
+from src.services.styles import WorkbookStyles, HEADER, BORDERED, PRESERVED
+from src.services.compact import object_values
+
+logger = logging.getLogger(__name__)
+
+# Version du formatage : à incrémenter dès que le fichier généré change
+FORMAT_VERSION = 2
+
+# Nombre de lignes converties en cellules à la fois
+CHUNK_ROWS = 10000
+
+# Au-delà, la largeur des colonnes est calculée sur un échantillon de lignes
+WIDTH_SAMPLE_ROWS = 100000
+
+
+def _styled_cell(ws, value, style_array):
+    """Cellule write_only qui référence un style déjà enregistré"""
+    # Ligne et colonne sont fixées par ws.append
+    return Cell(ws, row=1, column=1, value=value, style_array=style_array)
+
+
+def _truthy(values):
+    """Masque des valeurs « vraies » (ni vides, ni None, ni zéro), comme un test if value"""
+    return np.frompyfunc(bool, 1, 1)(values).astype(bool)
+
+
+def _merge_preserved(df, preserved):
+    """
+    Fusionne, en un seul passage par colonne, les valeurs d'origine (Period)
+    dans les valeurs du DataFrame. Retourne {colonne: tableau numpy}.
+    """
+    merged = {}
+    positions = df.index.to_numpy()
+    for col_name, (_, raw_values) in preserved.items():
+        if raw_values is None or col_name not in df.columns:
+            continue
+        raw = np.empty(len(raw_values), dtype=object)
+        raw[:] = raw_values
+
+        # Les lignes sont repérées par leur index dans la feuille d'origine
+        in_range = positions < len(raw)
+        source = np.full(len(df), None, dtype=object)
+        source[in_range] = raw[positions[in_range]]
+        replace = _truthy(source)
+
+        values = object_values(df[col_name]).copy()
+        values[replace] = source[replace]
+        merged[col_name] = values
+    return merged
+
+
+def merge_preserved(df, preserved):
+    """
+    Remplace dans df (en place) les colonnes Period par leurs valeurs d'origine
+    fusionnées ; retourne preserved réduit aux formats (valeurs d'origine à None),
+    pour écrire ensuite df par blocs de lignes quelconques.
+    """
+    preserved = preserved or {}
+    for col_name, values in _merge_preserved(df, preserved).items():
+        df[col_name] = values
+    return {col_name: (number_format, None) for col_name, (number_format, _) in preserved.items()}
+
+
+def _chunk_columns(df, merged, start, end):
+    """Retourne les valeurs d'un bloc de lignes, colonne par colonne"""
+    return [
+        merged[col][start:end].tolist() if col in merged else _chunk_values(df[col].iloc[start:end])
+        for col in df.columns
+    ]
+
+
+def _chunk_values(series):
+    # Chaînes Arrow : valeurs manquantes en NaN (cellule vide) plutôt que pd.NA
+    if isinstance(series.dtype, pd.StringDtype):
+        return object_values(series).tolist()
+    return series.tolist()
+
+
+def _max_length(values, sample_rows):
+    """Longueur du plus long texte parmi les valeurs renseignées d'une colonne"""
+    values = np.asarray(values, dtype=object)
+    if len(values) > sample_rows:
+        # Très grandes feuilles : échantillon fixe de lignes
+        positions = np.random.default_rng(0).choice(len(values), sample_rows, replace=False)
+        values = values[positions]
+    values = values[values.astype(bool)]  # Mêmes valeurs que « if value »
+    if len(values) == 0:
+        return 0
+    return int(pd.Series(values, dtype=object).astype(str).str.len().max())
+
+
+def _max_lengths(df, preamble_rows, merged, sample_rows=WIDTH_SAMPLE_ROWS):
+    """Longueur du plus long texte de chaque colonne (lignes d'en-tête et en-têtes inclus)"""
+    max_lengths = [0] * len(df.columns)
+
+    for row in preamble_rows:
+        for col_idx, value in enumerate(row[:len(max_lengths)]):
+            if pd.notna(value) and value:
+                max_lengths[col_idx] = max(max_lengths[col_idx], len(str(value)))
+
+    for col_idx, col_name in enumerate(df.columns):
+        if col_name:
+            max_lengths[col_idx] = max(max_lengths[col_idx], len(str(col_name)))
+
+    # Une réduction vectorisée par colonne
+    for col_idx, col_name in enumerate(df.columns):
+        values = merged[col_name] if col_name in merged else object_values(df[col_name])
+        max_lengths[col_idx] = max(max_lengths[col_idx], _max_length(values, sample_rows))
+
+    return max_lengths
+
+
+def _widths(max_lengths):
+    widths = []
+    for max_length in max_lengths:
+        adjusted_width = min(max_length + 3, 50)  # Max 50 caractères
+        if adjusted_width < 10:  # Minimum 10 caractères
+            adjusted_width = 12
+        widths.append(adjusted_width)
+    return widths
+
+
+def _column_widths(df, preamble_rows, merged, sample_rows=WIDTH_SAMPLE_ROWS):
+    """Calcule la largeur de chaque colonne avant l'écriture (lignes d'en-tête et en-têtes inclus)"""
+    return _widths(_max_lengths(df, preamble_rows, merged, sample_rows))
+
+
+def write_formatted_workbook(df, filepath, preamble_rows=None, column_styles=None,
+                             preserved=None, table_name="TableauDonnees", chunk_rows=CHUNK_ROWS):
+    """
+    Écrit le DataFrame dans un classeur en mode write_only, par blocs de lignes.
+
+    - preamble_rows : lignes recopiées au-dessus des en-têtes
+    - column_styles : style (DATE, NUMERIC) appliqué aux valeurs non vides d'une colonne
+    - preserved : {colonne: (format, valeurs brutes ou None)} issus du fichier original,
+      le format s'applique à toute la colonne
+    """
+    sheet = dict(df=df, preamble_rows=preamble_rows, column_styles=column_styles,
+                 preserved=preserved, table_name=table_name)
+    return write_formatted_sheets(filepath, [sheet], chunk_rows=chunk_rows)[0]
+
+
+def write_formatted_sheets(filepath, sheets, chunk_rows=CHUNK_ROWS):
+    """
+    Écrit plusieurs DataFrames dans un même classeur, une feuille et un tableau
+    par DataFrame. Chaque élément de sheets est un dict avec les clés df, title
+    (facultatif), preamble_rows, column_styles, preserved et table_name.
+    Les styles nommés sont partagés par toutes les feuilles.
+    Retourne (première ligne des en-têtes, dernière ligne) pour chaque feuille.
+    """
+    wb = Workbook(write_only=True)
+    styles = WorkbookStyles(wb)
+    positions = []
+    for sheet in sheets:
+        ws = wb.create_sheet(title=sheet.get('title'))
+        positions.append(_write_sheet(
+            ws, styles, sheet['df'],
+            preamble_rows=sheet.get('preamble_rows'),
+            column_styles=sheet.get('column_styles'),
+            preserved=sheet.get('preserved'),
+            table_name=sheet.get('table_name', "TableauDonnees"),
+            chunk_rows=chunk_rows
+        ))
+    wb.save(filepath)
+    return positions
+
+
+def text_lengths(df, preserved=None, sample_rows=WIDTH_SAMPLE_ROWS):
+    """Longueur du plus long texte de chaque colonne, en-tête compris : {colonne: longueur}"""
+    merged = _merge_preserved(df, preserved or {})
+    return dict(zip(df.columns, _max_lengths(df, [], merged, sample_rows)))
+
+
+def write_consolidated_workbook(filepath, columns, parts, row_count, max_lengths,
+                                table_name="TableauConsolide", chunk_rows=CHUNK_ROWS):
+    """
+    Écrit un seul tableau à partir de blocs de lignes fournis l'un après l'autre
+    par l'itérable parts ((df, preserved, column_styles), colonnes alignées sur
+    columns) : un seul bloc est en mémoire à la fois. Styles et formats d'origine
+    (preserved) sont ceux du bloc : chaque fichier consolidé garde les siens.
+    La taille du tableau (row_count) et la longueur maximale du texte de chaque
+    colonne (max_lengths) doivent être connues avant la première ligne.
+    Retourne (ligne des en-têtes, dernière ligne).
+    """
+    wb = Workbook(write_only=True)
+    styles = WorkbookStyles(wb)
+    ws = wb.create_sheet()
+    columns = list(columns)
+    _start_sheet(ws, styles, columns, row_count, _widths(max_lengths), [], {}, {}, table_name)
+    for df, preserved, column_styles in parts:
+        preserved = preserved or {}
+        formats = {col_name: number_format for col_name, (number_format, _) in preserved.items()}
+        column_arrays = _column_arrays(styles, columns, column_styles or {}, formats)
+        _append_rows(ws, df, _merge_preserved(df, preserved), column_arrays, chunk_rows)
+    wb.save(filepath)
+    return 1, 1 + row_count
+
+
+def _write_sheet(ws, styles, df, preamble_rows=None, column_styles=None, preserved=None,
+                 table_name="TableauDonnees", chunk_rows=CHUNK_ROWS):
+    preamble_rows = preamble_rows or []
+    column_styles = column_styles or {}
+    preserved = preserved or {}
+
+    # Valeurs d'origine fusionnées une fois pour toutes dans les colonnes à écrire
+    merged = _merge_preserved(df, preserved)
+
+    widths = _column_widths(df, preamble_rows, merged)
+    formats = {col_name: number_format for col_name, (number_format, _) in preserved.items()}
+    column_arrays = _start_sheet(ws, styles, list(df.columns), len(df), widths, preamble_rows,
+                                 column_styles, formats, table_name)
+    _append_rows(ws, df, merged, column_arrays, chunk_rows)
+
+    data_start_row = len(preamble_rows) + 1
+    return data_start_row, data_start_row + len(df)
+
+
+def _start_sheet(ws, styles, columns, row_count, widths, preamble_rows, column_styles, formats, table_name):
+    """
+    Largeurs, filtres, tableau, lignes d'en-tête et en-têtes d'une feuille dont
+    les données (row_count lignes) seront ajoutées ensuite par _append_rows.
+    Retourne les styles (valeur renseignée, valeur vide) de chaque colonne.
+    """
+    data_start_row = len(preamble_rows) + 1
+    max_row = data_start_row + row_count
+    max_col_letter = get_column_letter(len(columns))
+
+    # 1. Largeurs de colonnes (doivent être définies avant la première ligne)
+    for col_idx, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+    # 2. Filtres automatiques et tableau (seulement sur les données)
+    if row_count > 0:
+        filter_range = f"A{data_start_row}:{max_col_letter}{max_row}"
+        ws.auto_filter.ref = filter_range
+        logger.debug("✅ Filtres automatiques ajoutés sur la plage: %s", filter_range)
+
+        try:
+            table = Table(displayName=table_name, ref=filter_range)
+            table.tableStyleInfo = TableStyleInfo(
+                name="TableStyleMedium9",  # Style bleu moderne
+                showFirstColumn=False,
+                showLastColumn=False,
+                showRowStripes=True,
+                showColumnStripes=False
+            )
+            # En mode write_only, les colonnes du tableau doivent être nommées à la main
+            table._initialise_columns()
+            for table_column, col_name in zip(table.tableColumns, columns):
+                table_column.name = str(col_name)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                ws.add_table(table)
+            logger.debug("✅ Tableau formaté ajouté sur la plage: %s", filter_range)
+        except Exception as e:
+            logger.warning("⚠️ Impossible d'ajouter le tableau formaté: %s", e)
+
+    # 3. Lignes d'en-tête du fichier original
+    for row in preamble_rows:
+        ws.append([value if pd.notna(value) else None for value in row])
+
+    # 4. En-têtes de colonnes
+    header_style = styles.style_array(HEADER)
+    ws.append([_styled_cell(ws, col_name, header_style) for col_name in columns])
+
+    return _column_arrays(styles, columns, column_styles, formats)
+
+
+def _column_arrays(styles, columns, column_styles, formats):
+    """Chaque colonne a un style pour les valeurs renseignées et un pour les vides"""
+    bordered = styles.style_array(BORDERED)
+    column_arrays = []
+    for col_name in columns:
+        if col_name in formats:
+            preserved_style = styles.style_array(PRESERVED, formats[col_name])
+            column_arrays.append((preserved_style, preserved_style))
+        elif col_name in column_styles:
+            column_arrays.append((styles.style_array(column_styles[col_name]), bordered))
+        else:
+            column_arrays.append((bordered, bordered))
+    return column_arrays
+
+
+def _append_rows(ws, df, merged, column_arrays, chunk_rows=CHUNK_ROWS):
+    """5. Données, écrites bloc par bloc à partir des colonnes"""
+    for start in range(0, len(df), chunk_rows):
+        columns = _chunk_columns(df, merged, start, start + chunk_rows)
+        for values in zip(*columns):
+            ws.append([
+                _styled_cell(ws, value, filled if pd.notna(value) else empty)
+                for value, (filled, empty) in zip(values, column_arrays)
+            ])
@@ -19,6 +19,7 @@ const topLogo = document.getElementById('topLogo'); // Nouveau élément
 
 // Variables globales
 let currentProcessedFile = null;
+let currentProcessedEtag = null;
 
 // Initialisation
 document.addEventListener('DOMContentLoaded', function() {
@@ -97,6 +98,15 @@ function handleFile(file) {
     uploadFile(file);
 }
 
+// Libellés des étapes du traitement côté serveur
+const STAGE_LABELS = {
+    parse: 'Lecture du fichier...',
+    infer: 'Analyse des colonnes...',
+    rules: 'Application des règles...',
+    format: 'Mise en forme...',
+    save: 'Enregistrement du fichier...'
+};
+
 // Upload et traitement du fichier
 async function uploadFile(file) {
     showProgress();
@@ -105,24 +115,20 @@ async function uploadFile(file) {
     formData.append('file', file);
     
     try {
-        // Simulation de progression
-        updateProgress(20, 'Upload du fichier...');
+        updateProgress(10, 'Upload du fichier...');
         
         const response = await fetch(`${API_BASE_URL}/upload`, {
             method: 'POST',
             body: formData
         });
         
-        updateProgress(60, 'Analyse des colonnes...');
-        
         if (!response.ok) {
             const errorData = await response.json();
             throw new Error(errorData.error || 'Erreur lors de l\'upload');
         }
         
-        updateProgress(80, 'Application des règles...');
-        
-        const result = await response.json();
+        const job = await response.json();
+        const result = await waitForJob(job.job_id);
         
         updateProgress(100, 'Traitement terminé !');
         
@@ -136,6 +142,33 @@ async function uploadFile(file) {
     }
 }
 
+// Suivi de l'avancement du job jusqu'à la fin du traitement
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`${API_BASE_URL}/jobs/${jobId}/progress`);
+        if (!response.ok) {
+            throw new Error('Impossible de suivre le traitement');
+        }
+        
+        const progress = await response.json();
+        
+        if (progress.status === 'done' || progress.status === 'error') {
+            const jobResponse = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+            const job = await jobResponse.json();
+            if (job.status === 'error') {
+                throw new Error(job.error || 'Erreur lors du traitement');
+            }
+            return job.result;
+        }
+        
+        const label = STAGE_LABELS[progress.stage] || 'En attente de traitement...';
+        const rows = progress.rows ? ` (${progress.rows} lignes)` : '';
+        updateProgress(Math.max(10, progress.percent), label + rows);
+        
+        await new Promise(resolve => setTimeout(resolve, 500));
+    }
+}
+
 // Affichage des sections
 function showProgress() {
     hideAllSections();
@@ -153,6 +186,7 @@ function showResults(data) {
     
     // Stocker le fichier traité
     currentProcessedFile = data.processed_file;
+    currentProcessedEtag = data.etag || null;
     
     // Remplir les informations
     document.getElementById('fileName').textContent = data.original_file;
@@ -255,7 +289,9 @@ async function downloadFile() {
     }
     
     try {
-        const response = await fetch(`${API_BASE_URL}/download/${currentProcessedFile}`);
+        // URL adressée par contenu : les téléchargements suivants sont servis par le cache du navigateur
+        const version = currentProcessedEtag ? `?v=${currentProcessedEtag}` : '';
+        const response = await fetch(`${API_BASE_URL}/download/${currentProcessedFile}${version}`);
         
         if (!response.ok) {
             throw new Error('Erreur lors du téléchargement');
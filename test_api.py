@@ -1,5 +1,6 @@
 import requests
 import os
+import time
 
 # Configuration
 API_URL = 'http://localhost:5001/api/excel'
@@ -26,9 +27,23 @@ def test_upload():
             files = {'file': f}
             response = requests.post(f'{API_URL}/upload', files=files)
         
-        if response.status_code == 200:
+        if response.status_code in (200, 202):
             print("✅ Upload réussi!")
-            data = response.json()
+            job_id = response.json()['job_id']
+            print(f"   - Job: {job_id}")
+            
+            # Attendre la fin du traitement
+            while True:
+                job = requests.get(f'{API_URL}/jobs/{job_id}').json()
+                if job['status'] in ('done', 'error'):
+                    break
+                time.sleep(0.5)
+            
+            if job['status'] == 'error':
+                print(f"❌ Erreur de traitement: {job['error']}")
+                return False
+            
+            data = job['result']
             print(f"   - Fichier original: {data['original_file']}")
             print(f"   - Fichier traité: {data['processed_file']}")
             print(f"   - Colonnes détectées: {len(data['columns_info']['columns'])}")
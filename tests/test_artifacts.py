@@ -0,0 +1,179 @@
+import os
+import gzip
+import hashlib
+import importlib
+import pytest
+from flask import Flask
+from src.services.artifacts import ArtifactIndex, INDEX_DIRNAME
+
+CONTENT = bytes(range(256)) * 40
+TEXT = b''.join(b'%d,Payment %d,ADVICEPRO\n' % (i, i) for i in range(500))
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ArtifactIndex(str(tmp_path / 'processed'))
+
+
+def _write(index, name, content=CONTENT):
+    path = os.path.join(index.folder, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def test_register_and_get(index):
+    path = _write(index, 'processed_data.xlsx')
+
+    etag = index.register(path)
+    artifact = index.get('processed_data.xlsx')
+
+    assert etag == hashlib.sha256(CONTENT).hexdigest()
+    assert artifact.etag == etag
+    assert artifact.size == len(CONTENT)
+    assert artifact.path == path
+
+
+def test_etag_kept_on_disk(index):
+    index.register(_write(index, 'processed_data.xlsx'))
+
+    # Nouvel index (autre processus) : empreinte relue dans .artifacts/
+    other = ArtifactIndex(index.folder)
+    assert os.path.exists(os.path.join(index.folder, INDEX_DIRNAME, 'processed_data.xlsx.json'))
+    assert other.get('processed_data.xlsx').etag == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_replaced_file_is_reindexed(index):
+    index.register(_write(index, 'processed_data.xlsx'))
+
+    partial = _write(index, '.partial', b'new content')
+    os.replace(partial, os.path.join(index.folder, 'processed_data.xlsx'))
+
+    assert index.get('processed_data.xlsx').etag == hashlib.sha256(b'new content').hexdigest()
+
+
+def test_gzip_copy_of_text_files(index):
+    index.register(_write(index, 'processed_data.csv', TEXT))
+    index.register(_write(index, 'processed_data.xlsx'))
+
+    artifact = index.get('processed_data.csv')
+    assert artifact.gzip_path == os.path.join(index.folder, INDEX_DIRNAME, 'processed_data.csv.gz')
+    with gzip.open(artifact.gzip_path) as f:
+        assert f.read() == TEXT
+    # Pas de copie pour les classeurs ni pour les fichiers texte trop petits
+    assert index.get('processed_data.xlsx').gzip_path is None
+    index.register(_write(index, 'processed_data.csv', b'a,b\n'))
+    assert index.get('processed_data.csv').gzip_path is None
+
+
+def test_gzip_copy_follows_replaced_file(index):
+    index.register(_write(index, 'processed_data.ndjson', TEXT))
+
+    os.replace(_write(index, '.partial', TEXT * 2), os.path.join(index.folder, 'processed_data.ndjson'))
+
+    with gzip.open(index.get('processed_data.ndjson').gzip_path) as f:
+        assert f.read() == TEXT * 2
+
+
+def test_unregistered_file_is_hashed_once(index):
+    _write(index, 'processed_old.xlsx')
+
+    assert index.get('processed_old.xlsx').etag == hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.mark.parametrize('name', ['missing.xlsx', '', '.artifacts', '../processed_data.xlsx', 'sub/processed_data.xlsx'])
+def test_get_rejects_missing_and_internal_names(index, name):
+    _write(index, 'processed_data.xlsx')
+
+    assert index.get(name) is None
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, index):
+    # Le module des routes crée ses dossiers (uploads, processed, cache) dans le dossier courant
+    monkeypatch.chdir(tmp_path)
+    excel = importlib.import_module('src.routes.excel')
+    monkeypatch.setattr(excel, 'artifact_index', index)
+    app = Flask(__name__)
+    app.register_blueprint(excel.excel_bp, url_prefix='/api/excel')
+    return app.test_client()
+
+
+def test_download_etag_and_revalidation(client, index):
+    etag = index.register(_write(index, 'processed_data.xlsx'))
+
+    response = client.get('/api/excel/download/processed_data.xlsx')
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert response.headers['ETag'] == f'"{etag}"'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert 'no-cache' in response.headers['Cache-Control']
+
+    response = client.get('/api/excel/download/processed_data.xlsx', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_download_content_addressed(client, index):
+    etag = index.register(_write(index, 'processed_data.xlsx'))
+
+    response = client.get(f'/api/excel/download/processed_data.xlsx?v={etag}')
+
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age' in response.headers['Cache-Control']
+
+
+def test_download_range(client, index):
+    etag = index.register(_write(index, 'processed_data.xlsx'))
+
+    response = client.get('/api/excel/download/processed_data.xlsx', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == CONTENT[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(CONTENT)}'
+
+    # Reprise avec If-Range : fichier inchangé, seule la suite est envoyée
+    response = client.get('/api/excel/download/processed_data.xlsx',
+                          headers={'Range': 'bytes=1000-', 'If-Range': f'"{etag}"'})
+    assert response.status_code == 206
+    assert response.data == CONTENT[1000:]
+
+    # Fichier remplacé entre-temps : fichier complet
+    os.replace(_write(index, '.partial', b'other'), os.path.join(index.folder, 'processed_data.xlsx'))
+    response = client.get('/api/excel/download/processed_data.xlsx',
+                          headers={'Range': 'bytes=1000-', 'If-Range': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.data == b'other'
+
+
+def test_download_missing(client):
+    assert client.get('/api/excel/download/missing.xlsx').status_code == 404
+    assert client.get('/api/excel/download/.artifacts').status_code == 404
+
+
+def test_download_gzip(client, index):
+    etag = index.register(_write(index, 'processed_data.csv', TEXT))
+
+    response = client.get('/api/excel/download/processed_data.csv', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == TEXT
+    assert response.headers['ETag'] == f'"{etag}-gzip"'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.mimetype == 'text/csv'
+
+    response = client.get('/api/excel/download/processed_data.csv',
+                          headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'"{etag}-gzip"'})
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize('accept', [None, 'identity', 'gzip;q=0'])
+def test_download_without_gzip(client, index, accept):
+    etag = index.register(_write(index, 'processed_data.csv', TEXT))
+
+    response = client.get('/api/excel/download/processed_data.csv', headers={'Accept-Encoding': accept} if accept else {})
+
+    assert response.data == TEXT
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'] == f'"{etag}"'
+    assert response.headers['Vary'] == 'Accept-Encoding'
@@ -0,0 +1,51 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from src.services import columnar_cache
+
+pytest.importorskip('pyarrow')
+
+META = {field: None for field in columnar_cache.META_FIELDS}
+
+
+def _frame(rows=6):
+    return pd.DataFrame({
+        'Description': pd.Series([f'Payment {i}' if i % 3 else None for i in range(rows)], dtype='string[pyarrow]'),
+        'Currency': pd.Series(['USD', 'EUR'] * (rows // 2), dtype='category'),
+        'Amount': np.arange(rows, dtype=np.float32) * 1.5,
+        'Count': np.arange(rows, dtype=np.int16),
+        'Date': pd.date_range(datetime.datetime(2024, 1, 1), periods=rows),
+    })
+
+
+def _save(tmp_path, df):
+    path = tmp_path / 'data.xlsx'
+    path.write_bytes(b'classeur')
+    assert columnar_cache.save(str(path), None, df, {}, META)
+    return str(path)
+
+
+def test_load_keeps_dtypes_and_is_writable(tmp_path):
+    df = _frame()
+    path = _save(tmp_path, df)
+
+    loaded, _, meta = columnar_cache.load(path)
+
+    assert meta['format'] == 'arrow'
+    pd.testing.assert_frame_equal(loaded, df)
+    # Règles et conversions modifient le DataFrame en place
+    loaded.loc[0, 'Amount'] = 99
+    loaded.loc[1, 'Count'] = 7
+    loaded.loc[2, 'Description'] = 'Wire'
+    assert loaded['Amount'].iloc[0] == 99
+    assert loaded['Description'].iloc[2] == 'Wire'
+
+
+def test_preview_reads_first_rows(tmp_path):
+    path = _save(tmp_path, _frame(1000))
+
+    head, total_rows = columnar_cache.preview(path, nrows=5)
+
+    assert total_rows == 1000
+    pd.testing.assert_frame_equal(head, _frame(1000).head(5))
@@ -0,0 +1,57 @@
+import datetime
+import importlib
+import pytest
+from openpyxl import Workbook, load_workbook
+
+
+@pytest.fixture
+def excel(tmp_path, monkeypatch):
+    # Le module des routes crée ses dossiers (uploads, processed, cache) dans le dossier courant
+    monkeypatch.chdir(tmp_path)
+    excel = importlib.import_module('src.routes.excel')
+    monkeypatch.setattr(excel, 'PROCESSED_FOLDER', str(tmp_path))
+    return excel
+
+
+def _statement(path, sheets):
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, (rows, number_format) in sheets.items():
+        ws = wb.create_sheet(title)
+        ws.append(['Entity', 'Period', 'Description', 'Amount'])
+        for i in range(rows):
+            ws.append(['E1', datetime.datetime(2024, 1 + i % 12, 1), f'{title} payment {i}', 10.5 * i])
+            ws.cell(row=ws.max_row, column=2).number_format = number_format
+    wb.save(path)
+    return str(path)
+
+
+def _rows(path):
+    return list(load_workbook(path).active.iter_rows(values_only=True))
+
+
+def test_chunks_match_whole_files(excel, tmp_path):
+    sources = [
+        (_statement(tmp_path / 'a.xlsx', {'EUR': (7, 'mmm-yy')}), 'a.xlsx', None),
+        (_statement(tmp_path / 'b.xlsx', {'USD': (5, 'mmm-yy')}), 'b.xlsx', None),
+    ]
+
+    excel.consolidate_files(sources, str(tmp_path / 'whole.xlsx'))
+    details = excel.consolidate_files(sources, str(tmp_path / 'chunked.xlsx'), chunk_rows=2)
+
+    assert [entry['rows'] for entry in details['files']] == [7, 5]
+    assert _rows(tmp_path / 'chunked.xlsx') == _rows(tmp_path / 'whole.xlsx')
+
+
+def test_sheet_and_formats_of_each_source(excel, tmp_path):
+    path = _statement(tmp_path / 'multi.xlsx', {'EUR': (3, 'mmm-yy'), 'USD': (2, 'yyyy-mm')})
+    sources = [(path, 'eur', 'EUR'), (path, 'usd', 'USD')]
+
+    excel.consolidate_files(sources, str(tmp_path / 'out.xlsx'), chunk_rows=2)
+
+    ws = load_workbook(tmp_path / 'out.xlsx').active
+    rows = list(ws.iter_rows(min_row=2))
+    assert [row[0].value for row in rows] == ['eur'] * 3 + ['usd'] * 2
+    assert all(row[3].value.startswith(row[0].value.upper()) for row in rows)
+    # Format d'origine de la colonne Period : celui de la feuille de chaque ligne
+    assert [row[2].number_format for row in rows] == ['mmm-yy'] * 3 + ['yyyy-mm'] * 2
@@ -0,0 +1,92 @@
+import io
+import gzip
+import json
+import datetime
+import pandas as pd
+import pytest
+from src.services import exports
+from src.services.exports import write_export, iter_export, export_filename, content_type, check_format
+
+FRAME = pd.DataFrame({
+    'Description': [f'Relevé {i}' for i in range(25)],
+    'Amount': [i * 10.5 for i in range(25)],
+    'Date': pd.date_range('2024-01-01', periods=25, freq='D'),
+})
+
+
+def test_csv_round_trip_in_chunks(tmp_path):
+    path = tmp_path / 'processed_data.csv'
+
+    size = write_export(FRAME, path, exports.CSV, chunk_rows=7)
+
+    assert size == path.stat().st_size
+    text = path.read_text(encoding='utf-8')
+    # En-têtes écrits une seule fois, en tête du premier bloc
+    assert text.count('Description') == 1
+    pd.testing.assert_frame_equal(pd.read_csv(io.StringIO(text), parse_dates=['Date']), FRAME)
+
+
+def test_csv_of_empty_frame_keeps_headers():
+    assert b''.join(iter_export(FRAME.iloc[:0], exports.CSV)) == b'Description,Amount,Date\n'
+
+
+def test_ndjson_round_trip(tmp_path):
+    path = tmp_path / 'processed_data.ndjson'
+
+    write_export(FRAME, path, exports.NDJSON, chunk_rows=10)
+
+    lines = path.read_text(encoding='utf-8').splitlines()
+    assert len(lines) == len(FRAME)
+    assert json.loads(lines[3]) == {'Description': 'Relevé 3', 'Amount': 31.5, 'Date': '2024-01-04T00:00:00'}
+
+
+@pytest.mark.parametrize('output', [exports.CSV, exports.NDJSON])
+def test_gzip_matches_plain_export(tmp_path, output):
+    plain = b''.join(iter_export(FRAME, output, chunk_rows=4))
+    path = tmp_path / export_filename('processed_data.xlsx', output, compress=True)
+
+    write_export(FRAME, path, output, compress=True, chunk_rows=4)
+
+    assert path.name == f'processed_data.{output}.gz'
+    assert gzip.decompress(path.read_bytes()) == plain
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip('pyarrow')
+    df = FRAME.assign(Mixed=[1, 'a', datetime.date(2024, 1, 2), None, 2.5] * 5)
+    df[3] = True
+    path = tmp_path / 'processed_data.parquet'
+
+    write_export(df, path, exports.PARQUET)
+
+    result = pd.read_parquet(path)
+    assert list(result.columns) == ['Description', 'Amount', 'Date', 'Mixed', '3']
+    pd.testing.assert_frame_equal(result[['Description', 'Amount']], FRAME[['Description', 'Amount']])
+    # Colonne de types mélangés écrite en texte
+    assert result['Mixed'].tolist()[:4] == ['1', 'a', '2024-01-02', None]
+    assert b''.join(iter_export(df, exports.PARQUET))[:4] == b'PAR1'
+
+
+def test_export_filename_and_content_type():
+    assert export_filename('processed_data.xlsx', exports.XLSX) == 'processed_data.xlsx'
+    assert export_filename('processed_data.xlsx', exports.NDJSON) == 'processed_data.ndjson'
+    assert content_type('processed_data.csv') == 'text/csv'
+    assert content_type('processed_data.ndjson') == 'application/x-ndjson'
+    assert content_type('processed_data.csv.gz') == 'application/gzip'
+    assert content_type('processed_data.bin') == 'application/octet-stream'
+
+
+@pytest.mark.parametrize('output, compress', [
+    ('pdf', False),
+    (exports.XLSX, True),
+])
+def test_check_format_rejects(output, compress):
+    with pytest.raises(ValueError):
+        check_format(output, compress)
+
+
+def test_parquet_unavailable_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(exports, 'PARQUET_AVAILABLE', False)
+
+    with pytest.raises(ValueError, match='pyarrow'):
+        check_format(exports.PARQUET)
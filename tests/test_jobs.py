@@ -0,0 +1,22 @@
+import pytest
+from src.services import jobs
+
+
+@pytest.mark.parametrize('cpus, pool_size, tasks, requested, expected', [
+    # Hors du pool de jobs : tous les cœurs
+    (8, None, 10, None, 8),
+    (8, None, 3, None, 3),
+    # Dans un job : part de cœurs du job
+    (8, 2, 10, None, 4),
+    (8, 2, 10, 16, 4),
+    (8, 2, 10, 3, 3),
+    # Part inférieure à 2 : traitement en série
+    (8, 8, 10, None, 1),
+    (4, 3, 10, None, 1),
+    (8, None, 1, None, 1),
+])
+def test_inner_workers(monkeypatch, cpus, pool_size, tasks, requested, expected):
+    monkeypatch.setattr(jobs.os, 'cpu_count', lambda: cpus)
+    monkeypatch.setattr(jobs, '_job_pool_size', pool_size)
+
+    assert jobs.inner_workers(tasks, requested) == expected
@@ -0,0 +1,79 @@
+import json
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from src.services.json_records import to_records, iter_json, json_scalar
+
+
+def test_missing_and_infinite_values_are_null():
+    df = pd.DataFrame({
+        'Amount': [1.5, np.nan, np.inf, -np.inf],
+        'Count': pd.array([1, None, 3, 4], dtype='Int64'),
+        'Date': pd.to_datetime(['2024-01-15', None, '2024-01-16 10:30:00.250', '2024-02-01'], format='ISO8601'),
+    })
+
+    assert to_records(df) == [
+        {'Amount': 1.5, 'Count': 1, 'Date': '2024-01-15T00:00:00'},
+        {'Amount': None, 'Count': None, 'Date': None},
+        {'Amount': None, 'Count': 3, 'Date': '2024-01-16T10:30:00.250000'},
+        {'Amount': None, 'Count': 4, 'Date': '2024-02-01T00:00:00'},
+    ]
+
+
+def test_values_are_python_types():
+    df = pd.DataFrame({
+        'Flag': [True, False],
+        'Entity': pd.Categorical(['E1', None]),
+        'Mixed': [np.int64(7), datetime.date(2024, 1, 2)],
+        1: ['a', None],
+    })
+
+    records = to_records(df)
+
+    assert records == [
+        {'Flag': True, 'Entity': 'E1', 'Mixed': 7, '1': 'a'},
+        {'Flag': False, 'Entity': None, 'Mixed': '2024-01-02', '1': None},
+    ]
+    assert type(records[0]['Mixed']) is int
+    assert type(records[0]['Flag']) is bool
+
+
+@pytest.mark.parametrize('value, expected', [
+    (np.float64('nan'), None),
+    (float('inf'), None),
+    (np.int32(3), 3),
+    (pd.NaT, None),
+    (pd.NA, None),
+    (pd.Timestamp('2024-01-15 08:00'), '2024-01-15T08:00:00'),
+    (datetime.time(9, 30), '09:30:00'),
+    (pd.Period('2024-01', 'M'), '2024-01'),
+])
+def test_json_scalar(value, expected):
+    assert json_scalar(value) == expected
+
+
+@pytest.mark.parametrize('ndjson', [False, True])
+def test_iter_json_chunks(ndjson):
+    df = pd.DataFrame({'Description': [f'Relevé {i}' for i in range(7)], 'Amount': [i / 2 for i in range(6)] + [np.inf]})
+
+    chunks = list(iter_json(df, ndjson=ndjson, chunk_rows=3))
+    text = ''.join(chunks)
+
+    if ndjson:
+        assert len(chunks) == 3
+        records = [json.loads(line) for line in text.splitlines()]
+    else:
+        assert len(chunks) == 5
+        records = json.loads(text)
+    assert records == to_records(df)
+    assert records[-1] == {'Description': 'Relevé 6', 'Amount': None}
+    # Texte non ASCII conservé tel quel
+    assert 'Relevé' in text and '\\u' not in text
+
+
+def test_iter_json_empty_frame():
+    df = pd.DataFrame({'Amount': []})
+
+    assert ''.join(iter_json(df)) == '[]'
+    assert ''.join(iter_json(df, ndjson=True)) == ''
@@ -0,0 +1,101 @@
+import os
+import json
+import importlib
+import pytest
+from src.services.result_cache import ResultCache, cache_key, output_filename, file_sha256, RESULT_FILENAME
+from src.services.rules import DEFAULT_RULES_FILE
+
+
+def test_cache_key_follows_versions():
+    key = cache_key('abc', 2, 'rules-v1', 2)
+
+    assert key.startswith('abc-')
+    assert cache_key('abc', 2, 'rules-v1', 2) == key
+    assert cache_key('abc', 2, 'rules-v2', 2) != key
+    assert cache_key('abc', 2, 'rules-v1', 3) != key
+    assert cache_key('abd', 2, 'rules-v1', 2) != key
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('processed_data.xlsx', 'processed.xlsx'),
+    ('processed_data.csv.gz', 'processed.csv.gz'),
+    ('processed_data.parquet', 'processed.parquet'),
+])
+def test_output_filename(name, expected):
+    assert output_filename(name) == expected
+
+
+def _processed(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_put_and_get(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), max_bytes=10 ** 6)
+    cache.put('abc-1', _processed(tmp_path, 'processed_data.csv.gz', b'content'), {'columns_info': {'columns': ['a']}})
+
+    path, result = cache.get('abc-1')
+
+    assert os.path.basename(path) == 'processed.csv.gz'
+    assert open(path, 'rb').read() == b'content'
+    assert result == {'columns_info': {'columns': ['a']}}
+    assert cache.get('abc-2') is None
+
+
+def test_least_recently_used_entries_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), max_bytes=3500)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, _processed(tmp_path, 'processed.xlsx', b'x' * 1000), {})
+        # Dates de modification distinctes : ordre LRU déterministe
+        entry = os.path.join(cache.folder, key)
+        os.utime(entry, (os.path.getmtime(entry) - 10 * (3 - 'abc'.index(key)),) * 2)
+    cache.get('a')
+    cache.put('d', _processed(tmp_path, 'processed.xlsx', b'x' * 1000), {})
+
+    assert [key for key in 'abcd' if cache.get(key) is not None] == ['a', 'c', 'd']
+
+
+def test_incomplete_entry_ignored(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), max_bytes=10 ** 6)
+    os.makedirs(os.path.join(cache.folder, 'abc-1'))
+    with open(os.path.join(cache.folder, 'abc-1', RESULT_FILENAME), 'w') as f:
+        json.dump({}, f)
+
+    assert cache.get('abc-1') is None
+
+
+@pytest.fixture
+def excel(tmp_path, monkeypatch):
+    # Le module des routes crée ses dossiers (uploads, processed, cache) dans le dossier courant
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module('src.routes.excel')
+
+
+def test_processing_key_versions(excel, tmp_path, monkeypatch):
+    rules = tmp_path / 'rules.json'
+    rules.write_text(open(DEFAULT_RULES_FILE, encoding='utf-8').read(), encoding='utf-8')
+    monkeypatch.setenv('RULES_FILE', str(rules))
+    key = excel.processing_key('abc')
+
+    # Feuille, format et compression font partie de la clé
+    assert len({key, excel.processing_key('abc', 'USD'), excel.processing_key('abc', output='csv'),
+                excel.processing_key('abc', output='csv', compress=True)}) == 4
+
+    monkeypatch.setattr(excel, 'FORMAT_VERSION', excel.FORMAT_VERSION + 1)
+    assert excel.processing_key('abc') != key
+    monkeypatch.undo()
+    monkeypatch.setenv('RULES_FILE', str(rules))
+
+    # Fichier de règles modifié : nouvelle clé
+    definition = json.loads(rules.read_text(encoding='utf-8'))
+    definition['rules'][0]['name'] += ' (v2)'
+    rules.write_text(json.dumps(definition), encoding='utf-8')
+    os.utime(rules, ns=(0, os.stat(rules).st_mtime_ns + 10 ** 9))
+    assert excel.processing_key('abc') != key
+
+
+def test_file_sha256(tmp_path):
+    path = _processed(tmp_path, 'data.xlsx', b'abc')
+
+    assert file_sha256(path) == 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad'
@@ -0,0 +1,157 @@
+import copy
+import numpy as np
+import pandas as pd
+import pytest
+from src.services import rule_state
+from src.services.rules import RuleSet, apply_rule_set, apply_extractions
+
+DEFINITION = {
+    'columns': ['Reference', 'Nature'],
+    'extract': [
+        {
+            'name': 'Références',
+            'column': 'Description',
+            'target': 'Reference',
+            'case_sensitive': True,
+            'patterns': [
+                {'name': 'AE + 13 chiffres', 'regex': '\\b(AE\\d{13})\\b'},
+                {'name': 'Code pays + 10 chiffres ou plus', 'regex': '\\b([A-Z]{2}\\d{10,})\\b'}
+            ]
+        }
+    ],
+    'rules': [
+        {
+            'name': 'ADVICEPRO',
+            'when': [{'column': 'Description', 'contains': 'ADVICEPRO'}],
+            'create_columns': ['Descrip', 'Service'],
+            'set': {'Descrip': 'ADVICEPRO', 'Service': 'OHD'}
+        },
+        {
+            'name': 'USD → Import',
+            'when': [{'column': 'Currency', 'equals': 'USD'}],
+            'create_columns': ['Nature'],
+            'set': {'Nature': 'Import'}
+        }
+    ]
+}
+
+
+def _statement(rows=6):
+    descriptions = [
+        'Payment ADVICEPRO AE1602600010153',
+        'Office supplies',
+        'Wire FR1234567890123',
+        'ADVICEPRO fee',
+        'Transfer',
+        'Refund AE1602600010999',
+    ]
+    return pd.DataFrame({
+        'Description': [descriptions[i % len(descriptions)] for i in range(rows)],
+        'Currency': ['USD' if i % 2 else 'EUR' for i in range(rows)],
+        'Amount': [float(i * 100) for i in range(rows)],
+    })
+
+
+def _full(rule_set, df):
+    rule_hits = apply_rule_set(rule_set, df)
+    extraction_hits = apply_extractions(rule_set, df)
+    return rule_hits, extraction_hits
+
+
+def _values(df):
+    return df.astype(object).where(df.notna(), None).to_dict('list')
+
+
+def test_first_run_matches_full_evaluation():
+    rule_set = RuleSet(DEFINITION)
+    expected = _statement()
+    expected_hits = _full(rule_set, expected)
+
+    df = _statement()
+    rule_hits, extraction_hits, state, stats = rule_state.apply_incremental(rule_set, df)
+
+    assert (rule_hits, extraction_hits) == expected_hits
+    assert _values(df) == _values(expected)
+    assert stats['new_rows'] == len(df)
+
+
+def test_reprocess_evaluates_only_new_rows():
+    rule_set = RuleSet(DEFINITION)
+    _, _, state, _ = rule_state.apply_incremental(rule_set, _statement(6))
+
+    df = _statement(7)
+    rule_hits, _, _, stats = rule_state.apply_incremental(rule_set, df, state)
+
+    assert stats['new_rows'] == 1
+    # Description de la nouvelle ligne déjà connue : extraction reprise de l'état
+    assert stats['rules_evaluated'] == {'ADVICEPRO': 1, 'USD → Import': 1}
+    expected = _statement(7)
+    assert rule_hits == _full(rule_set, expected)[0]
+    assert _values(df) == _values(expected)
+
+
+def test_changed_rule_is_reevaluated():
+    _, _, state, _ = rule_state.apply_incremental(RuleSet(DEFINITION), _statement())
+
+    definition = copy.deepcopy(DEFINITION)
+    definition['rules'][0]['when'][0]['contains'] = 'Office'
+    rule_set = RuleSet(definition)
+    df = _statement()
+    rule_hits, _, _, stats = rule_state.apply_incremental(rule_set, df, state)
+
+    # Seule la règle modifiée est réévaluée (sur les lignes distinctes)
+    assert stats['rules_evaluated'] == {'ADVICEPRO': len(df)}
+    assert rule_hits == _full(rule_set, _statement())[0]
+
+
+def test_state_ignored_when_columns_change():
+    rule_set = RuleSet(DEFINITION)
+    _, _, state, _ = rule_state.apply_incremental(rule_set, _statement())
+
+    df = _statement().rename(columns={'Amount': 'Montant'})
+    _, _, _, stats = rule_state.apply_incremental(rule_set, df, state)
+
+    assert stats['new_rows'] == len(df)
+
+
+def test_column_hashes_distinguish_types():
+    hashes = rule_state.column_hashes(pd.Series([1, '1', 1.5, '1.5'], dtype=object))
+
+    assert len(set(hashes.tolist())) == 4
+
+
+def test_row_hashes_follow_content():
+    df = pd.DataFrame({'a': ['x', 'y', 'x'], 'b': [1, 2, 1]})
+
+    hashes = rule_state.row_hashes(df)
+
+    assert hashes.dtype == np.uint64
+    assert hashes[0] == hashes[2]
+    assert hashes[0] != hashes[1]
+
+
+def test_save_and_load(tmp_path):
+    path = rule_state.state_path(str(tmp_path / 'data.xlsx'), 'Relevé')
+    _, _, state, _ = rule_state.apply_incremental(RuleSet(DEFINITION), _statement())
+
+    assert rule_state.save(path, state)
+    loaded = rule_state.load(path)
+
+    assert loaded['columns'] == state['columns']
+    np.testing.assert_array_equal(loaded['keys'], state['keys'])
+
+
+@pytest.mark.parametrize('content', [b'', b'garbage', None])
+def test_load_invalid_state(tmp_path, content):
+    path = tmp_path / 'state.pkl'
+    if content is not None:
+        path.write_bytes(content)
+
+    assert rule_state.load(str(path)) is None
+
+
+def test_load_other_version(tmp_path):
+    path = str(tmp_path / 'state.pkl')
+    rule_state.save(path, {'version': rule_state.STATE_VERSION + 1})
+
+    assert rule_state.load(path) is None
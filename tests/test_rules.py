@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.services import jobs, rules
+from src.services.rules import KeywordMatcher, RuleSet, evaluate_rules
+
+DEFINITION = {
+    'rules': [
+        {
+            'name': 'ADVICEPRO',
+            'when': [{'column': 'Description', 'contains': 'ADVICEPRO'}],
+            'set': {'Service': 'OHD'}
+        },
+        {
+            'name': 'Frais',
+            'when': [{'column': 'Description', 'contains': 'fee'}, {'column': 'Amount', 'max': 100}],
+            'set': {'Nature': 'Frais'}
+        },
+        {
+            'name': 'USD → Import',
+            'when': [{'column': 'Currency', 'equals': 'USD'}],
+            'set': {'Nature': 'Import'}
+        }
+    ]
+}
+
+DESCRIPTIONS = pd.Series(
+    ['Payment ADVICEPRO', 'advicepro fee', 'Office', None, 42, 'Straße CAFÉ', 'Office', 'PROFEE'],
+    dtype=object
+)
+
+
+def _expected(series, keyword, case_sensitive):
+    return series.str.contains(keyword, case=case_sensitive, regex=False, na=False).to_numpy(dtype=bool)
+
+
+@pytest.mark.parametrize('automaton', [False, True])
+@pytest.mark.parametrize('case_sensitive', [False, True])
+def test_keyword_matcher(monkeypatch, automaton, case_sensitive):
+    if automaton:
+        pytest.importorskip('ahocorasick')
+    monkeypatch.setattr(rules, 'AHOCORASICK_AVAILABLE', automaton)
+    keywords = ['ADVICEPRO', 'advicepro', 'fee', 'office', 'PRO', 'café', 'ß']
+
+    matcher = KeywordMatcher(keywords, case_sensitive)
+    masks = matcher.match(DESCRIPTIONS)
+
+    assert (matcher.automaton is not None) == automaton
+    for keyword in keywords:
+        np.testing.assert_array_equal(masks[keyword], _expected(DESCRIPTIONS, keyword, case_sensitive))
+
+
+def _typed(dtype):
+    if dtype == 'string[pyarrow]':
+        pytest.importorskip('pyarrow')
+    # Catégories et chaînes Arrow : textes seulement
+    return DESCRIPTIONS.where(DESCRIPTIONS.map(lambda value: isinstance(value, str))).astype(dtype)
+
+
+@pytest.mark.parametrize('dtype', ['category', 'string[pyarrow]'])
+def test_keyword_matcher_dtypes(dtype):
+    series = _typed(dtype)
+
+    masks = KeywordMatcher(['office', 'fee', 'café']).match(series)
+
+    np.testing.assert_array_equal(masks['office'], [False, False, True, False, False, False, True, False])
+    np.testing.assert_array_equal(masks['fee'], [False, True, False, False, False, False, False, True])
+    np.testing.assert_array_equal(masks['café'], [False, False, False, False, False, True, False, False])
+
+
+@pytest.mark.parametrize('dtype', ['category', 'string[pyarrow]'])
+def test_conditions_and_extractions_on_dtypes(dtype):
+    definition = {
+        'extract': [{'name': 'Code', 'column': 'Description', 'target': 'Code',
+                     'patterns': [{'name': 'PRO', 'regex': '(\\w*PRO\\w*)'}, {'name': 'Mot', 'regex': '^(\\w+)'}]}],
+        'rules': [{'name': 'Paiement', 'when': [{'column': 'Description', 'regex': '^pay'}], 'set': {'Nature': 'P'}}]
+    }
+    rule_set = RuleSet(definition)
+    expected = _typed(object)
+    series = _typed(dtype)
+
+    values, matched_pattern = rule_set.extractions[0].match(series)
+
+    assert values.tolist() == rule_set.extractions[0].match(expected)[0].tolist()
+    assert matched_pattern.tolist() == [0, 0, 1, -1, -1, 1, 1, 0]
+    np.testing.assert_array_equal(rule_set.evaluate(pd.DataFrame({'Description': series}))['Paiement'],
+                                  [True, False, False, False, False, False, False, False])
+
+
+def test_amount_condition_on_text():
+    condition = rules.Condition({'column': 'Amount', 'min': 10, 'max': 100})
+    series = pd.Series(['5', '50', None, 'abc', '50', '150'], dtype='category')
+
+    np.testing.assert_array_equal(condition.evaluate(series, {}), [False, True, False, False, True, False])
+
+
+def _statement(rows):
+    return pd.DataFrame({
+        'Description': [['Payment ADVICEPRO', 'ADVICEPRO fee', 'Office', 'Bank fee'][i % 4] for i in range(rows)],
+        'Currency': ['USD' if i % 3 else 'EUR' for i in range(rows)],
+        'Amount': [float(i % 200) for i in range(rows)],
+        'Other': range(rows),
+    })
+
+
+def test_evaluate_rules_in_chunks(monkeypatch):
+    monkeypatch.setattr(rules, 'PARALLEL_MIN_ROWS', 10)
+    monkeypatch.setattr(rules, 'CHUNK_ROWS', 7)
+    monkeypatch.setattr(jobs.os, 'cpu_count', lambda: 2)
+    rule_set = RuleSet(DEFINITION)
+    df = _statement(50)
+
+    masks = evaluate_rules(rule_set, df, max_workers=2)
+
+    expected = rule_set.evaluate(df)
+    assert masks.keys() == expected.keys()
+    for name, mask in expected.items():
+        np.testing.assert_array_equal(masks[name], mask)
+
+
+def test_evaluate_rules_in_process_by_default(monkeypatch):
+    monkeypatch.setattr(rules, 'PARALLEL_MIN_ROWS', 10)
+    monkeypatch.setattr(rules, 'ProcessPoolExecutor', lambda *args, **kwargs: pytest.fail('pool lancé'))
+    monkeypatch.delenv('RULE_WORKERS', raising=False)
+
+    masks = evaluate_rules(RuleSet(DEFINITION), _statement(50))
+
+    assert masks['ADVICEPRO'].sum() == 26
+
+
+EXTRACTION = {
+    'extract': [{
+        'name': 'Références',
+        'column': 'Description',
+        'target': 'Reference',
+        'case_sensitive': True,
+        'patterns': [
+            {'name': 'AE + 13 chiffres', 'regex': '\\b(AE\\d{13})\\b'},
+            {'name': 'Code pays + 10 chiffres ou plus', 'regex': '\\b([A-Z]{2}\\d{10,})\\b'},
+            {'name': 'Sans groupe', 'regex': 'REF-\\d+'}
+        ]
+    }]
+}
+
+
+def test_extraction_priority_and_hits():
+    df = pd.DataFrame({'Description': [
+        # Les deux premiers motifs trouvent une valeur : le premier l'emporte
+        'Payment AE1602600010153',
+        'Wire FR1234567890123 AE1602600010999',
+        'Wire FR1234567890123',
+        'Office REF-42',
+        'ae1602600010153',
+        None,
+        'Payment AE1602600010153',
+    ]})
+    rule_set = RuleSet(EXTRACTION)
+
+    hits = rules.apply_extractions(rule_set, df)
+
+    assert hits == {'Références': {'AE + 13 chiffres': 3, 'Code pays + 10 chiffres ou plus': 1, 'Sans groupe': 1}}
+    assert df['Reference'].tolist() == [
+        'AE1602600010153', 'AE1602600010999', 'FR1234567890123', 'REF-42', '', '', 'AE1602600010153'
+    ]
+
+
+def test_disabled_extraction_and_missing_column():
+    definition = {'extract': [dict(EXTRACTION['extract'][0], enabled=False),
+                              dict(EXTRACTION['extract'][0], name='Autre', column='Libellé')]}
+    df = pd.DataFrame({'Description': ['Payment AE1602600010153']})
+
+    assert rules.apply_extractions(RuleSet(definition), df) == {}
+    assert 'Reference' not in df.columns
+
+
+def test_patterns_compiled_once():
+    rules.compile_pattern.cache_clear()
+    RuleSet(EXTRACTION)
+    RuleSet(EXTRACTION)
+
+    info = rules.compile_pattern.cache_info()
+    assert (info.misses, info.hits) == (3, 3)
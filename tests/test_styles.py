@@ -0,0 +1,45 @@
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import Cell
+from src.services.styles import (
+    WorkbookStyles, named_style_definition, HEADER, DATE, NUMERIC, BORDERED, PRESERVED, DATE_FORMAT
+)
+
+
+def test_style_registered_once():
+    wb = Workbook(write_only=True)
+    styles = WorkbookStyles(wb)
+
+    first = styles.style_array(DATE)
+    assert styles.style_array(DATE) is first
+    assert styles.style_array(PRESERVED, 'mmm-yy') != styles.style_array(PRESERVED, '0.00')
+    assert [name for name in wb.named_styles if name != 'Normal'] == [
+        'Date bordée', 'Format original mmm-yy', 'Format original 0.00'
+    ]
+
+
+def test_definitions_shared_between_workbooks():
+    # Définitions construites une fois par processus, styles nommés propres à chaque classeur
+    assert named_style_definition(NUMERIC) is named_style_definition(NUMERIC)
+    assert WorkbookStyles(Workbook()).style_array(BORDERED) == WorkbookStyles(Workbook()).style_array(BORDERED)
+
+
+def test_unknown_style():
+    with pytest.raises(ValueError):
+        WorkbookStyles(Workbook()).style_array('italique')
+
+
+def test_cells_reference_named_styles(tmp_path):
+    wb = Workbook(write_only=True)
+    styles = WorkbookStyles(wb)
+    ws = wb.create_sheet()
+    ws.append([Cell(ws, row=1, column=1, value='Date', style_array=styles.style_array(HEADER))])
+    ws.append([Cell(ws, row=1, column=1, value=45000, style_array=styles.style_array(DATE))])
+    wb.save(tmp_path / 'styles.xlsx')
+
+    ws = load_workbook(tmp_path / 'styles.xlsx').active
+    assert ws['A1'].style == 'En-tête tableau'
+    assert ws['A1'].font.bold
+    assert ws['A2'].style == 'Date bordée'
+    assert ws['A2'].number_format == DATE_FORMAT
+    assert ws['A2'].border.left.style == 'thin'
@@ -0,0 +1,62 @@
+import datetime
+import pandas as pd
+import pytest
+from src.services import type_inference
+from src.services.type_inference import infer_column, infer_schema, columns_of_type, DATE, NUMERIC, TEXT
+
+
+@pytest.mark.parametrize('col_name, values, expected_type, date_format', [
+    ('Booked', [datetime.datetime(2024, 1, 15), datetime.datetime(2024, 2, 1)], DATE, None),
+    ('Value day', ['2024-01-15', '2024-02-01', '2024-03-10 10:30:00'], DATE, 'ISO8601'),
+    ('Value day', ['15/01/2024', '5/1/2024', 'n/a'], TEXT, '%d/%m/%Y'),
+    ('Value day', ['15/01/2024', '5/1/2024', '01/03/2024'], DATE, '%d/%m/%Y'),
+    ('Total', [1500.0, 250.5, -3.0], NUMERIC, None),
+    ('Total', [True, False], TEXT, None),
+    # Codes numériques en texte : restent du texte
+    ('Account', ['0012', '0034', '0056'], TEXT, None),
+    # Noms connus
+    ('Transaction Date', ['not a date'], DATE, None),
+    ('Amount USD', ['1,5'], NUMERIC, None),
+    # Period garde son format d'origine
+    ('Period', [datetime.datetime(2024, 1, 1)], TEXT, None),
+])
+def test_infer_column(col_name, values, expected_type, date_format):
+    column = infer_column(col_name, pd.Series(values))
+
+    assert column['type'] == expected_type
+    assert column['date_format'] == date_format
+
+
+def test_text_dtypes_are_sampled_as_objects():
+    column = infer_column('Value day', pd.Series(['2024-01-15', '2024-02-01'], dtype='category'))
+
+    assert column['type'] == DATE
+    assert column['dtype'] == 'category'
+
+
+def test_schema_reuses_unchanged_columns(monkeypatch):
+    df = pd.DataFrame({'Description': ['Payment', 'Office'], 'Amount': [1.5, 2.5]})
+    previous = infer_schema(df)
+    df['Service'] = ['OHD', None]
+    df.loc[1, 'Description'] = None
+
+    inferred = []
+    infer = type_inference.infer_column
+    monkeypatch.setattr(type_inference, 'infer_column', lambda name, *args: inferred.append(name) or infer(name, *args))
+    schema = infer_schema(df, previous=previous)
+
+    # Colonne nouvelle ou modifiée (valeurs renseignées) réexaminée, les autres reprises
+    assert inferred == ['Description', 'Service']
+    assert schema['Amount'] is previous['Amount']
+    assert schema['Description']['non_null'] == 1
+    assert columns_of_type(schema, NUMERIC) == ['Amount']
+    assert columns_of_type(schema, TEXT) == ['Description', 'Service']
+
+
+def test_schema_reinfers_changed_dtype():
+    previous = infer_schema(pd.DataFrame({'Amount': ['1', '2']}))
+
+    schema = infer_schema(pd.DataFrame({'Amount': [1.0, 2.0]}), previous=previous)
+
+    assert schema['Amount']['type'] == NUMERIC
+    assert schema['Amount']['dtype'] == 'float64'
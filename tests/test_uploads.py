@@ -0,0 +1,128 @@
+import io
+import os
+import time
+import hashlib
+import zipfile
+import importlib
+import pytest
+from flask import Flask
+from src.services.uploads import UploadStore, UploadTooLarge, PARTIAL_SUFFIX
+
+CONTENT = b'PK' + bytes(range(256)) * 10
+
+
+class ChunkedStream(io.BytesIO):
+    """Flux de requête : lectures comptées pour vérifier la recopie par blocs"""
+
+    def __init__(self, content):
+        super().__init__(content)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path / 'uploads'), retention_seconds=3600)
+
+
+def test_save_streams_and_hashes(store, monkeypatch):
+    monkeypatch.setattr('src.services.uploads.UPLOAD_CHUNK_SIZE', 100)
+    stream = ChunkedStream(CONTENT)
+
+    filepath, size, digest = store.save(stream, 'job1', 'data.xlsx')
+
+    assert filepath == store.path('job1', 'data.xlsx')
+    assert open(filepath, 'rb').read() == CONTENT
+    assert (size, digest) == (len(CONTENT), hashlib.sha256(CONTENT).hexdigest())
+    assert stream.reads == len(CONTENT) // 100 + 2
+
+
+def test_size_cap_stops_early(store, monkeypatch):
+    monkeypatch.setattr('src.services.uploads.UPLOAD_CHUNK_SIZE', 100)
+    stream = ChunkedStream(CONTENT)
+
+    with pytest.raises(UploadTooLarge) as error:
+        store.save(stream, 'job1', 'data.xlsx', max_bytes=250)
+
+    # Lecture arrêtée au premier bloc qui dépasse, dossier du job supprimé
+    assert stream.reads == 3
+    assert not os.path.exists(os.path.join(store.folder, 'job1'))
+    assert str(error.value) == 'Fichier trop volumineux (maximum 0.244 Ko)'
+
+
+def test_same_name_in_parallel_jobs(store):
+    first, _, _ = store.save(io.BytesIO(b'first'), 'job1', 'data.xlsx')
+    second, _, _ = store.save(io.BytesIO(b'second'), 'job2', 'data.xlsx')
+
+    assert open(first, 'rb').read() == b'first'
+    assert open(second, 'rb').read() == b'second'
+    with pytest.raises(FileExistsError):
+        store.save(io.BytesIO(b'third'), 'job1', 'data.xlsx')
+
+
+def _archive(tmp_path, members):
+    path = tmp_path / 'batch.zip'
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return str(path)
+
+
+def test_extract_accepted_files(store, tmp_path):
+    path = _archive(tmp_path, {
+        'janvier/data.xlsx': b'one',
+        '../../evil.xlsx': b'two',
+        '__MACOSX/janvier/._data.xlsx': b'meta',
+        'notes.txt': b'text',
+        'vide/': b'',
+    })
+
+    extracted = store.extract(path, 'batch1', accept=lambda name: name.endswith('.xlsx'))
+
+    # Chemins de l'archive ignorés : chaque fichier dans son propre sous-dossier
+    assert [(os.path.relpath(filepath, store.folder), name, size) for filepath, name, size, _ in extracted] == [
+        (os.path.join('batch1', '0000', 'data.xlsx'), 'data.xlsx', 3),
+        (os.path.join('batch1', '0001', 'evil.xlsx'), 'evil.xlsx', 3),
+    ]
+    assert extracted[1][3] == hashlib.sha256(b'two').hexdigest()
+
+
+def test_extract_limits(store, tmp_path):
+    path = _archive(tmp_path, {'a.xlsx': b'x' * 10, 'b.xlsx': b'x' * 1000, 'c.xlsx': b'x'})
+    accept = lambda name: True
+
+    with pytest.raises(UploadTooLarge):
+        store.extract(path, 'batch1', accept, max_bytes=100)
+    with pytest.raises(ValueError):
+        store.extract(path, 'batch2', accept, max_files=2)
+
+
+def test_cleanup_removes_old_jobs(store):
+    old, _, _ = store.save(io.BytesIO(b'old'), 'old', 'data.xlsx')
+    store.save(io.BytesIO(b'new'), 'new', 'data.xlsx')
+    past = time.time() - 7200
+    os.utime(os.path.dirname(old), (past, past))
+
+    assert store.cleanup() == 1
+    assert sorted(os.listdir(store.folder)) == ['new']
+    assert not any(name.endswith(PARTIAL_SUFFIX) for name in os.listdir(os.path.join(store.folder, 'new')))
+
+
+def test_upload_route_rejects_large_files(tmp_path, monkeypatch, store):
+    # Le module des routes crée ses dossiers (uploads, processed, cache) dans le dossier courant
+    monkeypatch.chdir(tmp_path)
+    excel = importlib.import_module('src.routes.excel')
+    monkeypatch.setattr(excel, 'upload_store', store)
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = 1000
+    app.register_blueprint(excel.excel_bp, url_prefix='/api/excel')
+
+    response = app.test_client().post('/api/excel/upload', data={'file': (io.BytesIO(CONTENT), 'data.xlsx')},
+                                      content_type='multipart/form-data')
+
+    assert response.status_code == 413
+    assert 'Fichier trop volumineux' in response.get_json()['error']
+    assert os.listdir(store.folder) == []
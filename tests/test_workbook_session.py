@@ -0,0 +1,152 @@
+import os
+import datetime
+import pandas as pd
+import pytest
+from pandas.io.parsers import TextParser
+from openpyxl import Workbook, load_workbook
+from src.services import workbook_session, xlsx_reader
+from src.services.workbook_session import WorkbookSession, find_header, read_preview
+from src.services.xlsx_reader import UnsupportedWorkbook
+
+
+def _statement(path, rows=5):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Relevé'
+    ws.append(['Relevé bancaire'])
+    ws.append([])
+    ws.append(['Entity', 'Period', 'Description', 'Amount'])
+    for i in range(rows):
+        ws.append(['E1', datetime.datetime(2024, 1 + i % 12, 1), f'Payment {i}', 100.5 * i])
+        ws.cell(row=ws.max_row, column=2).number_format = 'mmm-yy'
+    wb.save(path)
+    return str(path)
+
+
+def test_single_parse(tmp_path, monkeypatch):
+    path = _statement(tmp_path / 'data.xlsx')
+    # Toutes les lectures de feuille (read_columns compris) passent par iter_rows
+    calls = []
+    iter_rows = xlsx_reader.iter_rows
+    monkeypatch.setattr(xlsx_reader, 'iter_rows', lambda *args, **kwargs: calls.append(args) or iter_rows(*args, **kwargs))
+
+    session = WorkbookSession(path)
+
+    assert len(calls) == 1
+    assert session.engine == 'xml'
+    assert session.header_row == 2
+    # Préambule aligné sur la largeur de la feuille, cellules vides : None
+    assert session.preamble_rows == [['Relevé bancaire', None, None, None], [None] * 4]
+    assert list(session.df.columns) == ['Entity', 'Period', 'Description', 'Amount']
+    assert len(session.df) == 5
+    assert session.column_formats['Period'] == 'mmm-yy'
+    assert len(session.raw_columns['Period']) == 5
+    # Ligne d'en-têtes gardée en mémoire : pas de nouvelle lecture
+    assert find_header(path).header_row == 2
+    assert len(calls) == 1
+
+
+def test_reader_fallback_order(tmp_path, monkeypatch):
+    path = _statement(tmp_path / 'data.xlsx')
+    tried = []
+
+    def failing(name):
+        def read(session):
+            tried.append(name)
+            raise UnsupportedWorkbook(name)
+        return read
+
+    def pandas_reader(session):
+        tried.append('pandas')
+        return WorkbookSession._read_columns_pandas(session)
+
+    monkeypatch.setattr(workbook_session, 'READERS', [
+        ('xml', failing('xml')), ('openpyxl', failing('openpyxl')), ('pandas', pandas_reader)
+    ])
+
+    session = WorkbookSession(path)
+
+    assert tried == ['xml', 'openpyxl', 'pandas']
+    assert session.engine == 'pandas'
+    assert len(session.df) == 5
+
+
+def test_preferred_engine(tmp_path, monkeypatch):
+    path = _statement(tmp_path / 'data.xlsx')
+
+    assert WorkbookSession(path, engine='openpyxl').engine == 'openpyxl'
+    monkeypatch.setenv('EXCEL_READER', 'pandas')
+    assert WorkbookSession(path).engine == 'pandas'
+    with pytest.raises(ValueError):
+        WorkbookSession(path, engine='xlrd')
+
+
+def test_engines_read_the_same_frame(tmp_path):
+    path = _statement(tmp_path / 'data.xlsx')
+
+    xml = WorkbookSession(path, engine='xml')
+    openpyxl = WorkbookSession(path, engine='openpyxl')
+
+    pd.testing.assert_frame_equal(xml.df, openpyxl.df)
+    assert xml.column_formats == openpyxl.column_formats
+
+
+def test_columnar_cache_reuse(tmp_path, monkeypatch):
+    path = _statement(tmp_path / 'data.xlsx')
+    first = WorkbookSession(path, cache=True)
+    assert not first.from_cache
+
+    # Copie à jour : le classeur n'est pas relu
+    monkeypatch.setattr(xlsx_reader, 'iter_rows', lambda *args, **kwargs: pytest.fail('classeur relu'))
+    second = WorkbookSession(path, cache=True)
+
+    assert second.from_cache
+    assert second.engine == 'columnar'
+    pd.testing.assert_frame_equal(second.df, first.df)
+    assert (second.header_row, second.preamble_rows, second.header_names) == \
+        (first.header_row, first.preamble_rows, first.header_names)
+    assert second.column_formats == first.column_formats
+
+
+def test_columnar_cache_ignored_when_file_changes(tmp_path):
+    path = _statement(tmp_path / 'data.xlsx')
+    WorkbookSession(path, cache=True)
+
+    _statement(tmp_path / 'data.xlsx', rows=8)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+    session = WorkbookSession(path, cache=True)
+
+    assert not session.from_cache
+    assert len(session.df) == 8
+
+
+def test_preview_row_count_matches_full_read(tmp_path):
+    path = _statement(tmp_path / 'data.xlsx', rows=40)
+    wb = load_workbook(path)
+    # Lignes vides mises en forme en fin de feuille : comptées par <dimension>
+    wb.active['D60'].number_format = '0.00'
+    wb.save(path)
+
+    preview = read_preview(path, nrows=3)
+
+    assert len(preview.df) == 3
+    assert preview.shape == WorkbookSession(path).df.shape
+
+
+@pytest.mark.parametrize('values', [
+    [1, 2.5, '', 'NA', -7],
+    [True, 'false', '', 'TRUE'],
+    [False, 0, 'x', 1.0, True],
+    [datetime.datetime(2024, 1, 2), '', datetime.datetime(2024, 2, 1)],
+    [' 3.5', 'abc', 'null', '12'],
+    [],
+])
+def test_frame_matches_text_parser(values):
+    # Préambule, en-têtes en double ou vides, valeurs de types mêlés
+    rows = [['Relevé'], ['Entity', 'Entity', '', 'Value']] + [['E1', '', None, value] for value in values]
+    width = max(len(row) for row in rows)
+    expected = TextParser([row + [''] * (width - len(row)) for row in rows], header=1, skip_blank_lines=False).read()
+
+    df = workbook_session._frame(xlsx_reader.to_columns(rows), 1)
+
+    pd.testing.assert_frame_equal(df, expected)
@@ -0,0 +1,165 @@
+import os
+import re
+import datetime
+import zipfile
+import pytest
+from openpyxl import Workbook, load_workbook
+from src.services import xlsx_reader
+from src.services.xlsx_reader import UnsupportedWorkbook, SheetNotFound
+
+SHEET_PART = 'xl/worksheets/sheet1.xml'
+
+
+def _workbook(path, rows, title='Relevé', extra_sheets=()):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = title
+    for row in rows:
+        ws.append(row)
+    for name in extra_sheets:
+        wb.create_sheet(name)
+    wb.save(path)
+    return path
+
+
+def _rewrite_sheet(path, transform, part=SHEET_PART):
+    """Réécrit le XML d'une feuille (ex. classeur sans <dimension>, lignes dans le désordre)"""
+    with zipfile.ZipFile(path) as source:
+        parts = {name: source.read(name) for name in source.namelist()}
+    parts[part] = transform(parts[part])
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for name, data in parts.items():
+            target.writestr(name, data)
+
+
+def _without_dimension(xml):
+    return re.sub(rb'<dimension[^>]*/>', b'', xml)
+
+
+def test_read_rows_matches_openpyxl(tmp_path):
+    rows = [
+        ['Description', 'Amount', 'Date', 'Flag'],
+        ['Payment ADVICEPRO', 1500, datetime.datetime(2024, 1, 15), True],
+        ['Office', 250.5, datetime.datetime(2024, 1, 16), False],
+        [None, None, None, None],
+        ['Wire', -3, None, None],
+    ]
+    path = _workbook(tmp_path / 'data.xlsx', rows)
+
+    values, formats = xlsx_reader.read_rows(path)
+
+    assert values == [
+        ['Description', 'Amount', 'Date', 'Flag'],
+        ['Payment ADVICEPRO', 1500, datetime.datetime(2024, 1, 15), True],
+        ['Office', 250.5, datetime.datetime(2024, 1, 16), False],
+        # Ligne vide conservée, cellules vides en fin de ligne supprimées
+        [],
+        ['Wire', -3],
+    ]
+    assert len(formats) == len(values)
+    assert formats[1][2] == load_workbook(path).active['C2'].number_format
+
+
+def test_iter_rows_stops_early(tmp_path):
+    path = _workbook(tmp_path / 'data.xlsx', [[i] for i in range(100)])
+
+    rows = xlsx_reader.iter_rows(path)
+    first = [next(rows)[0] for _ in range(3)]
+    rows.close()
+
+    assert first == [[0], [1], [2]]
+
+
+def test_missing_rows_are_empty(tmp_path):
+    path = _workbook(tmp_path / 'data.xlsx', [['a'], [None], [None], ['b']])
+
+    values, _ = xlsx_reader.read_rows(path)
+
+    assert values == [['a'], [], [], ['b']]
+
+
+def test_rows_out_of_order_raise(tmp_path):
+    path = _workbook(tmp_path / 'data.xlsx', [['a'], ['b'], ['c']])
+    _rewrite_sheet(path, lambda xml: xml.replace(b'<row r="3"', b'<row r="1"'))
+
+    with pytest.raises(UnsupportedWorkbook):
+        xlsx_reader.read_rows(path)
+
+
+def test_not_a_workbook(tmp_path):
+    path = tmp_path / 'data.xlsx'
+    path.write_bytes(b'not a zip')
+
+    with pytest.raises(UnsupportedWorkbook):
+        xlsx_reader.read_rows(path)
+
+
+def test_sheet_names_and_unknown_sheet(tmp_path):
+    path = _workbook(tmp_path / 'multi.xlsx', [['a']], title='EUR', extra_sheets=['USD', 'Vide'])
+
+    assert xlsx_reader.sheet_names(path) == ['EUR', 'USD', 'Vide']
+    with pytest.raises(SheetNotFound):
+        xlsx_reader.read_rows(path, 'GBP')
+
+
+def test_row_count_ignores_declared_dimension(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    for row in [['a'], ['b'], [None], ['d']]:
+        ws.append(row)
+    # Lignes seulement mises en forme : comprises dans <dimension>, sans valeur
+    ws['A10'].number_format = '0.00'
+    wb.save(tmp_path / 'data.xlsx')
+
+    assert xlsx_reader.row_count(tmp_path / 'data.xlsx') == 3
+
+
+def test_row_count_without_dimension(tmp_path, monkeypatch):
+    rows = [['Description', 'Amount']] + [[f'line {i}', i] if i % 10 else [None, None] for i in range(1, 501)]
+    path = _workbook(tmp_path / 'data.xlsx', rows)
+    _rewrite_sheet(path, _without_dimension)
+    # Petits blocs : lignes coupées entre deux blocs
+    monkeypatch.setattr(xlsx_reader, 'SCAN_CHUNK_SIZE', 97)
+
+    assert xlsx_reader.row_count(path) == sum(1 for values, _ in xlsx_reader.iter_rows(path) if values)
+
+
+def test_rows_removed_from_tree(tmp_path, monkeypatch):
+    path = _workbook(tmp_path / 'data.xlsx', [[i, f'line {i}'] for i in range(50)])
+    parsers = []
+    iterparse = xlsx_reader.ET.iterparse
+    monkeypatch.setattr(xlsx_reader.ET, 'iterparse', lambda *args, **kwargs: parsers.append(iterparse(*args, **kwargs)) or parsers[-1])
+
+    assert len(xlsx_reader.read_rows(path)[0]) == 50
+    # Arbre final : <sheetData> vide, les lignes lues n'y sont pas restées
+    assert len(parsers[0].root.find(xlsx_reader.SHEET_DATA_TAG)) == 0
+
+
+def test_to_columns():
+    rows = [['a', 'b'], [], ['c', 'd', 'e'], [1], [], []]
+
+    assert xlsx_reader.to_columns(rows) == [['a', '', 'c', 1], ['b', '', 'd', ''], ['', '', 'e', '']]
+    assert xlsx_reader.to_columns([[], []]) == []
+
+
+def test_read_columns_matches_read_rows(tmp_path):
+    path = _workbook(tmp_path / 'data.xlsx', [['Description', 'Amount'], [None], ['Office', 250.5, 'note'], [None]])
+
+    columns, formats = xlsx_reader.read_columns(path)
+
+    assert columns == xlsx_reader.to_columns(xlsx_reader.read_rows(path)[0])
+    assert columns == [['Description', '', 'Office'], ['Amount', '', 250.5], ['', '', 'note']]
+    assert formats == xlsx_reader.read_rows(path)[1]
+
+
+def test_sheet_size_is_unpacked_size(tmp_path):
+    path = _workbook(tmp_path / 'multi.xlsx', [[f'line {i}', i] for i in range(2000)], title='EUR', extra_sheets=['Vide'])
+
+    with zipfile.ZipFile(path) as archive:
+        unpacked = archive.getinfo(SHEET_PART).file_size
+    size = xlsx_reader.sheet_size(path)
+
+    # openpyxl écrit les textes dans la feuille (pas de chaînes partagées)
+    assert size == unpacked
+    assert size > 2 * os.path.getsize(path)
+    assert xlsx_reader.sheet_size(path, 'Vide') < size
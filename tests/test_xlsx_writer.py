@@ -0,0 +1,127 @@
+import pandas as pd
+from openpyxl import load_workbook
+from src.services.styles import NUMERIC, NUMERIC_FORMAT
+from src.services.xlsx_writer import write_formatted_workbook, write_consolidated_workbook, merge_preserved, text_lengths
+
+
+def test_consolidated_parts_keep_their_styles(tmp_path):
+    path = tmp_path / 'consolidation.xlsx'
+    columns = ['Fichier source', 'Period', 'Amount']
+    parts = [
+        (pd.DataFrame({'Fichier source': ['a.xlsx'], 'Period': [1.5], 'Amount': [10.0]}),
+         {'Period': ('0.00', None)}, {'Amount': NUMERIC}),
+        (pd.DataFrame({'Fichier source': ['b.xlsx'], 'Period': [2.5], 'Amount': [20.0]}),
+         {'Period': ('0.000', None)}, {}),
+    ]
+
+    assert write_consolidated_workbook(path, columns, iter(parts), 2, [14, 10, 10]) == (1, 3)
+
+    ws = load_workbook(path).active
+    # Formats et styles d'origine propres à chaque fichier
+    assert [ws['B2'].number_format, ws['B3'].number_format] == ['0.00', '0.000']
+    assert [ws['C2'].number_format, ws['C3'].number_format] == [NUMERIC_FORMAT, 'General']
+    assert [row for row in ws.iter_rows(values_only=True)] == [tuple(columns), ('a.xlsx', 1.5, 10), ('b.xlsx', 2.5, 20)]
+
+
+def _frame():
+    return pd.DataFrame({
+        'Description': ['Payment ADVICEPRO', 'Office', None, 'Wire'],
+        'Amount': [1500.0, 250.5, float('nan'), -3.0],
+        2024: ['a', 'b', 'c', 'd'],
+    })
+
+
+def test_write_formatted_workbook(tmp_path):
+    path = tmp_path / 'processed.xlsx'
+
+    positions = write_formatted_workbook(_frame(), path, preamble_rows=[['Relevé bancaire', None]],
+                                         column_styles={'Amount': NUMERIC}, chunk_rows=3)
+
+    assert positions == (2, 6)
+    ws = load_workbook(path).active
+    assert [row for row in ws.iter_rows(values_only=True)] == [
+        ('Relevé bancaire', None, None),
+        ('Description', 'Amount', 2024),
+        ('Payment ADVICEPRO', 1500, 'a'),
+        ('Office', 250.5, 'b'),
+        (None, None, 'c'),
+        ('Wire', -3, 'd'),
+    ]
+    assert ws['B3'].number_format == NUMERIC_FORMAT
+    assert ws['A2'].font.bold
+    assert ws.auto_filter.ref == 'A2:C6'
+    # Tableau du mode write_only : colonnes nommées d'après les en-têtes
+    table = ws.tables['TableauDonnees']
+    assert table.ref == 'A2:C6'
+    assert [column.name for column in table.tableColumns] == ['Description', 'Amount', '2024']
+    assert ws.column_dimensions['A'].width == len('Payment ADVICEPRO') + 3
+
+
+def test_chunk_size_does_not_change_output(tmp_path):
+    write_formatted_workbook(_frame(), tmp_path / 'one.xlsx', chunk_rows=1)
+    write_formatted_workbook(_frame(), tmp_path / 'all.xlsx')
+
+    one, whole = (load_workbook(tmp_path / name).active for name in ('one.xlsx', 'all.xlsx'))
+    assert list(one.iter_rows(values_only=True)) == list(whole.iter_rows(values_only=True))
+
+
+def test_empty_frame_has_no_table(tmp_path):
+    path = tmp_path / 'empty.xlsx'
+
+    write_formatted_workbook(pd.DataFrame(columns=['Description', 'Amount']), path)
+
+    ws = load_workbook(path).active
+    assert list(ws.iter_rows(values_only=True)) == [('Description', 'Amount')]
+    assert not ws.tables
+
+
+def test_preserved_values_merged_by_sheet_position(tmp_path):
+    # Lignes vides supprimées : l'index repère la ligne d'origine dans les valeurs brutes
+    df = pd.DataFrame({'Period': [45292.0, 45323.0, 45352.0], 'Amount': [1.0, 2.0, 3.0]}, index=[0, 2, 5])
+    raw = ['Jan-24', None, '', 0, 'Mar-24']
+    path = tmp_path / 'processed.xlsx'
+
+    write_formatted_workbook(df, path, preserved={'Period': ('0.0', raw)})
+
+    ws = load_workbook(path).active
+    # Valeur d'origine si elle est renseignée, sinon valeur du DataFrame (position hors des valeurs brutes comprise)
+    assert [row[0].value for row in ws.iter_rows(min_row=2)] == ['Jan-24', 45323, 45352]
+    assert {row[0].number_format for row in ws.iter_rows(min_row=2)} == {'0.0'}
+
+
+def test_merge_preserved_in_place():
+    df = pd.DataFrame({'Period': [1.0, 2.0], 'Amount': [3.0, 4.0]})
+
+    formats = merge_preserved(df, {'Period': ('mmm-yy', ['Jan-24', None]), 'Missing': ('0.00', [1])})
+
+    assert df['Period'].tolist() == ['Jan-24', 2.0]
+    assert formats == {'Period': ('mmm-yy', None), 'Missing': ('0.00', None)}
+    assert text_lengths(df) == {'Period': len('Period'), 'Amount': len('Amount')}
+
+
+def test_text_lengths_include_header_and_skip_empty_values():
+    df = pd.DataFrame({'Description': ['Payment ADVICEPRO', None, ''], 'N': [0, 12345, None], 'Flag': [False, None, None]})
+
+    assert text_lengths(df) == {'Description': 17, 'N': 7, 'Flag': 4}
+
+
+def test_width_sampled_above_threshold():
+    values = ['x' * (i % 7) for i in range(1000)] + ['y' * 40]
+    df = pd.DataFrame({'Description': values})
+
+    # Sous le seuil : toutes les lignes ; au-delà : échantillon fixe (même résultat d'un appel à l'autre)
+    assert text_lengths(df, sample_rows=len(df)) == {'Description': 40}
+    sampled = text_lengths(df, sample_rows=50)
+    assert sampled == text_lengths(df, sample_rows=50)
+    assert len('Description') <= sampled['Description'] <= 40
+
+
+def test_widths_bounds(tmp_path):
+    df = pd.DataFrame({'A': ['x'], 'Long': ['y' * 80], 'Mid': ['z' * 20]})
+    path = tmp_path / 'processed.xlsx'
+
+    write_formatted_workbook(df, path, preamble_rows=[[None, None, 'Relevé bancaire de la société exemple']])
+
+    widths = load_workbook(path).active.column_dimensions
+    # Minimum 12, maximum 50, lignes d'en-tête comprises
+    assert [widths[letter].width for letter in 'ABC'] == [12, 50, len('Relevé bancaire de la société exemple') + 3]